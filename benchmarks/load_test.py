@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Load test of the scoring server (models.server), client and server on this machine.
+
+python -m benchmarks.load_test --clients 16 --rows-per-request 10 --duration 10
+
+Trains a model on synthetic data, saves it as an Artifact, serves it from a separate process and sends requests from
+<clients> concurrent connections for <duration> seconds. Reports client side latency percentiles and throughput,
+and the server counters (/stats), including the mean number of requests scored per batch.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+from multiprocessing import Process
+from time import sleep
+from time import time
+
+try:
+    from http.client import HTTPConnection
+except ImportError:  # Python 2
+    from httplib import HTTPConnection
+
+import numpy as np
+import pandas as pd
+
+from lib.encoders import TargetEncoder
+from lib.feature_transformer import FeatureTransformer
+from models.artifact import Artifact
+from models.logistic_regression import LogisticRegression
+from models import server
+
+
+N_FEATURES = 10
+N_IDS = 1000
+
+
+def features(n_rows, random):
+    frame = pd.DataFrame(random.randn(n_rows, N_FEATURES), columns=['f{}'.format(i) for i in range(N_FEATURES)])
+    frame.insert(0, 'some_id', random.randint(0, N_IDS, n_rows).astype(np.float64))
+    return frame
+
+
+def build_artifact(path, n_rows=100000, seed=0):
+    random = np.random.RandomState(seed)
+    x = features(n_rows, random)
+    y = pd.Series((x['f0'] + x['some_id'] / N_IDS + random.randn(n_rows) > 1).astype(np.int32))
+    plan = FeatureTransformer.transform_plan(x)
+    x = FeatureTransformer.process(x, plan)
+    encoder = TargetEncoder(['some_id'], min_samples=5, smoothing=5)
+    matrix = pd.concat([x.drop('some_id', axis=1), encoder.fit_transform(x, y).add_prefix('tgt_enc_')], axis=1)
+    matrix, feature_min, feature_max = FeatureTransformer.scale(matrix)
+    model = LogisticRegression(solver='lbfgs')
+    model.fit(matrix.values, y.values)
+    Artifact(model, matrix.columns, {'tgt_enc_': encoder}, feature_min, feature_max, plan).save(path)
+
+
+def wait_for(port, timeout=30):
+    deadline = time() + timeout
+    while time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except (IOError, OSError):
+            sleep(0.1)
+    raise RuntimeError('Scoring server did not start on port {}'.format(port))
+
+
+def client(port, rows_per_request, duration, seed, latencies, errors):
+    random = np.random.RandomState(seed)
+    connection = HTTPConnection('127.0.0.1', port)
+    frame = features(rows_per_request, random)
+    body = json.dumps({'columns': list(frame.columns), 'rows': frame.values.tolist()})
+    headers = {'Content-Type': 'application/json'}
+    deadline = time() + duration
+    while time() < deadline:
+        start = time()
+        connection.request('POST', '/predict', body, headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+            errors.append(response.status)
+            continue
+        latencies.append(time() - start)
+    connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--rows-per-request', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=10.)
+    parser.add_argument('--port', type=int, default=server.DEFAULT_PORT)
+    parser.add_argument('--max-wait', type=float, default=server.MAX_WAIT)
+    parser.add_argument('--output', help='json file of the results')
+    args = parser.parse_args(argv)
+
+    path = tempfile.mkdtemp(prefix='mlshell-artifact-')
+    process = None
+    try:
+        build_artifact(path)
+        argv = [path, '--port', str(args.port), '--max-wait', str(args.max_wait)]
+        process = Process(target=server.main, args=(argv,))
+        process.daemon = True
+        process.start()
+        wait_for(args.port)
+
+        latencies, errors = [], []
+        threads = [
+            threading.Thread(target=client, args=(args.port, args.rows_per_request, args.duration, i, latencies,
+                                                  errors))
+            for i in range(args.clients)
+        ]
+        start = time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time() - start
+
+        connection = HTTPConnection('127.0.0.1', args.port)
+        connection.request('GET', '/stats')
+        server_stats = json.loads(connection.getresponse().read().decode('utf-8'))
+        latencies = np.array(latencies) * 1000
+        results = {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'requests_per_second': len(latencies) / elapsed,
+            'rows_per_second': len(latencies) * args.rows_per_request / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'server': server_stats,
+        }
+        print('[BENCH] {} clients x {} rows: {} requests/s, {} rows/s, p50 {}ms, p99 {}ms, {} errors'.format(
+            args.clients, args.rows_per_request, int(results['requests_per_second']),
+            int(results['rows_per_second']), round(results['p50_ms'], 2), round(results['p99_ms'], 2),
+            results['errors'],
+        ))
+        print('[BENCH] Server: {} requests per batch, p50 {}ms, p99 {}ms'.format(
+            round(server_stats['mean_batch_requests'], 1), round(server_stats['p50_ms'], 2),
+            round(server_stats['p99_ms'], 2),
+        ))
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump(results, output, indent=2)
+    finally:
+        if process is not None:
+            process.terminate()
+        shutil.rmtree(path, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
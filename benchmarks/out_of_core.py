@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of chunked (out-of-core) scoring against the in-memory pipeline, in time and peak memory.
+
+python -m benchmarks.out_of_core --rows 1m --chunk-size 100k --n-jobs 4
+
+Features of synthetic data are built and written to disk (utils.snapshot.save_frame), then processed, encoded,
+scaled and scored twice: loaded whole in memory (FeatureTransformer) and streamed by chunks (lib.chunked). Peak traced
+memory of the chunked run is bounded by the chunk size, the one of the in-memory run grows with the number of rows.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import SyntheticDataSet
+from benchmarks.synthetic import parse_size
+from lib.chunked import ChunkedPipeline
+from lib.chunked import FrameChunks
+from lib.encoders import TargetEncoder
+from lib.feature_constructor import FeatureConstructor
+from lib.feature_transformer import EXCLUDED_COLUMNS
+from lib.feature_transformer import FeatureTransformer
+from models.logistic_regression import LogisticRegression
+from utils import profiling
+from utils.snapshot import load_frame
+from utils.snapshot import save_frame
+
+
+ENCODED = ['some_id', 'other_id']
+# Rows the model is fitted on
+SAMPLE = 100000
+
+
+def build(path, n_rows, seed=0):
+    dataset = SyntheticDataSet(n_rows, seed)
+    features = FeatureConstructor.add_all_features(
+        FeatureConstructor.filter(FeatureConstructor.core_features(dataset)), dataset
+    )
+    # rank is the source of the target, not a feature
+    features = features.drop(['date', 'rank'], axis=1).reset_index(drop=True)
+    features['target'] = features['target'].astype(np.int32)
+    save_frame(path, features)
+
+
+def in_memory(path, model, columns):
+    features = load_frame(path)
+    y = features.pop('target')
+    features = FeatureTransformer.process(features, inplace=True)
+    encoded = FeatureTransformer.encode(features, TargetEncoder(ENCODED, min_samples=5, smoothing=5), 'tgt_enc_', y)
+    matrix = pd.concat([FeatureTransformer.strip(features), encoded.filter(like='tgt_enc_')], axis=1).fillna(0)
+    matrix, _, _ = FeatureTransformer.scale(matrix)
+    return model.predict_proba(matrix[columns].values)
+
+
+def fit_pipeline(chunks, n_jobs):
+    # transforms only depend on column dtypes, the first chunk is enough to plan them
+    plan = FeatureTransformer.transform_plan(chunks.read(*chunks.bounds()[0]).drop('target', axis=1))
+    pipeline = ChunkedPipeline(plan, {'tgt_enc_': TargetEncoder(ENCODED, min_samples=5, smoothing=5)},
+                               excluded=EXCLUDED_COLUMNS, n_jobs=n_jobs)
+    return pipeline.fit(chunks)
+
+
+def chunked(chunks, model, n_jobs, output):
+    return fit_pipeline(chunks, n_jobs).predict(chunks, model, output)
+
+
+def measure(name, function, *args):
+    profiling.reset()
+    profiling.enable()
+    try:
+        with profiling.span(name) as record:
+            result = function(*args)
+    finally:
+        profiling.disable()
+    print('[BENCH] {} - {}s, peak {}MB'.format(name, round(record.wall, 2), round(record.memory_peak / 2 ** 20, 1)))
+    return result, {'wall': round(record.wall, 4), 'peak_mb': round(record.memory_peak / 2 ** 20, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', default='1m', help='rows of synthetic data, e.g. 100k 1m')
+    parser.add_argument('--chunk-size', default='100k')
+    parser.add_argument('--n-jobs', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='json file of the results')
+    args = parser.parse_args(argv)
+
+    path = tempfile.mkdtemp(prefix='mlshell-chunks-')
+    try:
+        build(path + '/features', parse_size(args.rows), args.seed)
+        chunks = FrameChunks.from_directory(path + '/features', parse_size(args.chunk_size))
+        print('[BENCH] {} rows in {} chunks'.format(chunks.n_rows, len(chunks)))
+
+        # the model only needs to be the same for both runs, it is fitted on the first rows
+        pipeline = fit_pipeline(chunks, args.n_jobs)
+        head = chunks.read(0, min(chunks.n_rows, SAMPLE))
+        model = LogisticRegression(solver='lbfgs')
+        model.fit(pipeline.transform(FrameChunks.from_frame(head)), head['target'].values)
+
+        probas_memory, results_memory = measure('in_memory', in_memory, path + '/features', model, pipeline.columns)
+        probas_chunked, results_chunked = measure('chunked', chunked, chunks, model, args.n_jobs, path + '/probas.npy')
+        difference = float(np.abs(probas_memory - probas_chunked).max())
+        print('[BENCH] Peak memory / {}, max difference of probabilities {:.2e}'.format(
+            round(results_memory['peak_mb'] / max(results_chunked['peak_mb'], 0.1), 1), difference
+        ))
+        if args.output:
+            with open(args.output, 'w') as output:
+                json.dump({'in_memory': results_memory, 'chunked': results_chunked, 'difference': difference},
+                          output, indent=2)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the full feature and model pipeline on synthetic data, no MySQL needed.
+
+python -m benchmarks.pipeline --sizes 100k 1m --output bench.json --baseline benchmarks/baseline.json --threshold 0.2
+
+Each stage is timed (wall time) along with its peak traced memory and the footprint of the frame it returns
+(--compact enables compact dtypes, see utils.schema). Results are written as json, and compared to
+a baseline results file when given: the run fails (exit code 1) when a stage is slower than the baseline by more than
+<threshold> (relative). --update-baseline writes the results as the new baseline instead.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import platform
+import sys
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.synthetic import SyntheticDataSet
+from benchmarks.synthetic import parse_size
+from lib.feature_constructor import FeatureConstructor
+from lib.feature_transformer import FeatureTransformer
+from models.logistic_regression import LogisticRegression
+from utils import profiling
+from utils import schema
+
+
+# Stages faster than this are ignored by regression checks, their timing being mostly noise
+MIN_SECONDS = 0.05
+TEST_DURATION = 365
+
+
+class Timer:
+    """Runs pipeline stages as profiling spans and keeps their wall time, peak memory and the footprint of their
+    result (a frame, the first frame of a tuple or the tables of a DataSet).
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.results = OrderedDict()
+
+    def __call__(self, stage, function, *args, **kwargs):
+        with profiling.span(stage) as record:
+            result = function(*args, **kwargs)
+        self.results[stage] = {
+            'wall': round(record.wall, 4),
+            'peak_mb': round(record.memory_peak / 2 ** 20, 1) if record.memory_peak is not None else None,
+            'frame_mb': self.frame_mb(result),
+        }
+        print('[BENCH] {} - {}s'.format(stage, self.results[stage]['wall']))
+        return result
+
+    @staticmethod
+    def frame_mb(result):
+        if isinstance(result, tuple) and result:
+            result = result[0]
+        if isinstance(result, pd.DataFrame):
+            return round(schema.footprint(result) / 2 ** 20, 1)
+        if isinstance(result, dict) and all(isinstance(df, pd.DataFrame) for df in result.values()):
+            return round(sum(schema.footprint(df) for df in result.values()) / 2 ** 20, 1)
+        return None
+
+
+def run(n_rows, seed=0, memory=True, pushdown=False, compact=False):
+    profiling.reset()
+    profiling.enable(memory=memory)
+    if compact:
+        schema.enable()
+    timer = Timer(memory)
+    try:
+        filters = FeatureConstructor.filters() if pushdown else None
+        dataset = timer('generate', SyntheticDataSet, n_rows, seed, filters, compact)
+        features = timer('core_features', FeatureConstructor.core_features, dataset)
+        features = timer('filter', FeatureConstructor.filter, features)
+        features = timer('add_all_features', FeatureConstructor.add_all_features, features, dataset)
+
+        test_date = features['date'].sort_values().iloc[int(len(features) * 0.8)]
+        x_train, y_train, x_test, y_test = timer(
+            'split', FeatureTransformer.split, features, test_date, TEST_DURATION
+        )
+        # rank is the source of the target, not a feature
+        x_train, x_test = x_train.drop(['date', 'rank'], axis=1), x_test.drop(['date', 'rank'], axis=1)
+        plan = FeatureTransformer.transform_plan(x_train)
+        x_train = timer('process', FeatureTransformer.process, x_train, plan, inplace=True)
+        x_test = FeatureTransformer.process(x_test, plan, inplace=True)
+        gap = timer('race_gap', FeatureTransformer.race_gap, x_train)
+        rank = timer('race_rank', FeatureTransformer.race_rank, x_train)
+        target_encoded, _ = timer('target_encoding', FeatureTransformer.target_encoding, x_train, y_train, n_folds=5)
+        woe_encoded, _ = timer('woe_encoding', FeatureTransformer.woe_encoding, x_train, y_train, n_folds=5)
+
+        matrix = pd.concat(
+            [
+                FeatureTransformer.strip(x_train),
+                gap,
+                rank,
+                target_encoded.filter(like='tgt_enc_'),
+                woe_encoded.filter(like='woe_enc_'),
+            ],
+            axis=1,
+        ).fillna(0)
+        matrix, _, _ = timer('scale', FeatureTransformer.scale, matrix)
+        model = LogisticRegression()
+        timer('fit', model.fit, matrix.values, y_train.values)
+        timer('score', model.score, y_train.values, model.predict_proba(matrix.values))
+    finally:
+        profiling.disable()
+        schema.disable()
+    return timer.results
+
+
+def compare(results, baseline, threshold):
+    """Stages slower than in <baseline> by more than <threshold>, as (size, stage, baseline wall, wall) tuples.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if reference is None or result['wall'] < MIN_SECONDS:
+                continue
+            if result['wall'] > reference['wall'] * (1 + threshold):
+                regressions.append((size, stage, reference['wall'], result['wall']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', nargs='+', default=['100k'], help='numbers of rows, e.g. 100k 1m 10m 50m')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--baseline', help='results file to compare to')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown flagged as a regression')
+    parser.add_argument('--update-baseline', action='store_true', help='write results to --baseline')
+    parser.add_argument('--no-memory', action='store_true', help='skip memory tracing, faster and less intrusive')
+    parser.add_argument('--pushdown', action='store_true', help='push filters down to the (synthetic) queries')
+    parser.add_argument('--compact', action='store_true', help='compact dtypes for tables and feature frames')
+    args = parser.parse_args(argv)
+
+    results = OrderedDict()
+    for size in args.sizes:
+        print('[BENCH] Running pipeline on {} rows'.format(size))
+        results[size] = run(
+            parse_size(size), seed=args.seed, memory=not args.no_memory, pushdown=args.pushdown, compact=args.compact
+        )
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'seed': args.seed,
+            'pushdown': args.pushdown,
+            'compact': args.compact,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as stream:
+        json.dump(report, stream, indent=2)
+    print('[BENCH] Results written to {}'.format(args.output))
+
+    if args.baseline is None:
+        return 0
+    if args.update_baseline:
+        with open(args.baseline, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        print('[BENCH] Baseline {} updated'.format(args.baseline))
+        return 0
+    with open(args.baseline, 'r') as stream:
+        baseline = json.load(stream)['results']
+    regressions = compare(results, baseline, args.threshold)
+    for size, stage, reference, wall in regressions:
+        print('[BENCH] Regression {} / {}: {}s -> {}s (+{}%)'.format(
+            size, stage, reference, wall, int(round((wall / reference - 1) * 100))
+        ))
+    if not regressions:
+        print('[BENCH] No regression above {}% against {}'.format(int(args.threshold * 100), args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of incremental retraining (BinaryClassifier.update) against full refits, on a drifting synthetic stream.
+
+python -m benchmarks.retrain --rows 1m --days 10 --output retrain.json
+
+A model is fitted on the initial history, then every day new rows arrive: one copy of the model is refitted from
+scratch on the whole history, another is updated with update. Both are scored on the next day, the report holding
+retrain times, test AUC and log loss of both and their drift (update minus refit).
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import copy
+import json
+import sys
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+
+from benchmarks.synthetic import parse_size
+from models.gaussian_nb import GaussianNB
+from models.logistic_regression import MAX_ROWS
+from models.logistic_regression import LogisticRegression
+from models.random_forest_classifier import RandomForestClassifier
+
+
+MODELS = OrderedDict([
+    ('LogisticRegression', lambda: LogisticRegression(solver='lbfgs')),
+    ('GaussianNB', lambda: GaussianNB()),
+    ('RandomForestClassifier', lambda: RandomForestClassifier(n_estimators=40, max_depth=8, random_state=0)),
+])
+# Fit options of the updated models
+FIT_OPTIONS = {
+    'LogisticRegression': {'keep_rows': MAX_ROWS},
+}
+N_FEATURES = 20
+# Daily rows, as a share of the initial history
+DAILY_RATIO = 0.01
+
+
+def stream(n_rows, n_days, seed=0):
+    """(x, y) of the initial history then of each day, the true coefficients drifting slowly.
+    """
+    random = np.random.RandomState(seed)
+    coefficients = random.randn(N_FEATURES)
+    daily = max(int(n_rows * DAILY_RATIO), 1)
+    for size in [n_rows] + [daily] * (n_days + 1):
+        coefficients += random.randn(N_FEATURES) * 0.02
+        x = random.randn(size, N_FEATURES)
+        y = (x.dot(coefficients) + random.logistic(size=size) > 1.).astype(np.int32)
+        yield x, y
+
+
+def run(name, n_rows, n_days, seed=0):
+    days = stream(n_rows, n_days, seed)
+    x_history, y_history = next(days)
+    refitted = MODELS[name]()
+    refitted.fit(x_history, y_history)
+    updated = copy.deepcopy(refitted)
+    updated.fit(x_history, y_history, **FIT_OPTIONS.get(name, {}))
+    x_new, y_new = next(days)
+
+    results = []
+    for day, (x_next, y_next) in enumerate(days):
+        x_history, y_history = np.vstack([x_history, x_new]), np.concatenate([y_history, y_new])
+        start = time()
+        refitted.fit(x_history, y_history)
+        refit_time = time() - start
+        start = time()
+        updated.update(x_new, y_new)
+        update_time = time() - start
+
+        refit_scores = refitted.score(y_next, refitted.predict_proba(x_next))
+        update_scores = updated.score(y_next, updated.predict_proba(x_next))
+        results.append(OrderedDict([
+            ('day', day),
+            ('refit_time', round(refit_time, 4)),
+            ('update_time', round(update_time, 4)),
+            ('refit_auc', refit_scores['roc_auc_score']),
+            ('update_auc', update_scores['roc_auc_score']),
+            ('auc_drift', update_scores['roc_auc_score'] - refit_scores['roc_auc_score']),
+            ('log_loss_drift', update_scores['log_loss'] - refit_scores['log_loss']),
+        ]))
+        print('[BENCH] {} day {} - refit {}s, update {}s - AUC drift {:+.4f}'.format(
+            name, day, results[-1]['refit_time'], results[-1]['update_time'], results[-1]['auc_drift']
+        ))
+        x_new, y_new = x_next, y_next
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', default='100k', help='rows of the initial history, e.g. 100k 1m')
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--models', nargs='+', default=list(MODELS), choices=list(MODELS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='retrain_output.json')
+    args = parser.parse_args(argv)
+
+    report = OrderedDict()
+    for name in args.models:
+        results = run(name, parse_size(args.rows), args.days, args.seed)
+        report[name] = {
+            'days': results,
+            'speedup': round(sum(r['refit_time'] for r in results) / sum(r['update_time'] for r in results), 2),
+            'mean_auc_drift': float(np.mean([r['auc_drift'] for r in results])),
+        }
+        print('[BENCH] {} - update {}x faster than refit, mean AUC drift {:+.4f}'.format(
+            name, report[name]['speedup'], report[name]['mean_auc_drift']
+        ))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print('[BENCH] Results written to {}'.format(args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import re
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from lib.data_set import DataSet
+
+
+SIZES = {
+    '100k': 10 ** 5,
+    '1m': 10 ** 6,
+    '10m': 10 ** 7,
+    '50m': 5 * 10 ** 7,
+}
+START_DATE = pd.Timestamp('2008-01-01')
+N_DAYS = 10 * 365
+
+
+def parse_size(size):
+    size = size.lower()
+    if size in SIZES:
+        return SIZES[size]
+    for suffix, factor in [('k', 10 ** 3), ('m', 10 ** 6)]:
+        if size.endswith(suffix):
+            return int(float(size[:-1]) * factor)
+    return int(float(size))
+
+
+def generate(n_rows, seed=0):
+    """Seeded synthetic race data: one row per runner in table1, one row per race in table2.
+    Cardinalities scale with the number of rows like on production data: ~10 runners per race, each horse running
+    ~20 races, a few thousand jockeys, owners and coaches.
+    :return: dict of tables, keyed like DataSet
+    """
+    random = np.random.RandomState(seed)
+    n_races = max(n_rows // 10, 1)
+    # race of each runner, races being numbered in date order
+    race = np.sort(random.randint(0, n_races, n_rows)).astype(np.int32)
+    race_dates = START_DATE + pd.to_timedelta(np.sort(random.randint(0, N_DAYS, n_races)), unit='D')
+    # rank of runners within their race, in random order
+    rank = np.empty(n_rows, dtype=np.int32)
+    rank[np.lexsort((random.rand(n_rows), race))] = np.arange(n_rows) - np.searchsorted(race, race) + 1
+
+    def ids(n_distinct, skew=1.2):
+        # a few very active entities, a long tail of occasional ones
+        return (np.minimum(random.zipf(skew + 1, n_rows), 10 ** 12) * 7919 % n_distinct).astype(np.int32)
+
+    table1 = pd.DataFrame({
+        'some_id': race,
+        'date': race_dates.values[race],
+        'horse_id': random.randint(0, max(n_rows // 20, 1), n_rows).astype(np.int32),
+        'jockey_id': ids(max(n_rows // 500, 50)),
+        'owner_id': ids(max(n_rows // 100, 100)),
+        'coach_id': ids(max(n_rows // 1000, 30)),
+        'rank': rank,
+        'col': (random.rand(n_rows) < 0.95).astype(np.int32),
+        # DATA_BOUNDS columns, with a few out of bounds and missing values
+        'column1': np.where(random.rand(n_rows) < 0.02, np.nan, random.lognormal(8, 2, n_rows)),
+        'column2': random.lognormal(10, 1.5, n_rows),
+    })
+    table2 = pd.DataFrame({
+        'some_id': np.arange(n_races, dtype=np.int32),
+        'category_id': np.arange(n_races, dtype=np.int32),
+        'other_id': random.randint(0, 200, n_races).astype(np.int32),
+        'distance': random.choice([1000, 1200, 1600, 2000, 2400, 3000], n_races).astype(np.int32),
+    })
+    return {'table1': table1, 'table2': table2}
+
+
+class SyntheticClient:
+    """Stands in for utils.mysql.MySQL: answers "SELECT <columns> FROM <table>" queries from generated tables.
+    """
+
+    QUERY = re.compile(r'^\s*SELECT\s+(?P<columns>[\w\s,]+?)\s+FROM\s+(?P<table>\w+)\s*$', re.IGNORECASE | re.DOTALL)
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._database = None
+        self._lock = threading.Lock()
+
+    def query(self, query, env=None):
+        match = self.QUERY.match(query)
+        if match is None:
+            return self.query_sql(query)
+        columns = [c.strip() for c in match.group('columns').split(',')]
+        df = self.tables[match.group('table')][columns]
+        # dtypes of pandas.read_sql results
+        return pd.DataFrame(
+            {c: df[c].values.astype(np.int64) if df[c].dtype.kind in 'iu' else df[c].values for c in columns},
+            columns=columns,
+        )
+
+    def query_sql(self, query):
+        """Other queries (WHERE clauses, counts) run on an in-memory sqlite copy of the tables, dates being parsed
+        back from text.
+        """
+        with self._lock:
+            if self._database is None:
+                self._database = sqlite3.connect(':memory:', check_same_thread=False)
+                for table, df in self.tables.items():
+                    df.to_sql(table, self._database, index=False)
+            result = pd.read_sql(query, self._database)
+        dtypes = dict(kv for df in self.tables.values() for kv in df.dtypes.items())
+        for column in result.columns:
+            if column in dtypes and dtypes[column].kind == 'M':
+                result[column] = pd.to_datetime(result[column]).astype(dtypes[column])
+        return result
+
+
+class SyntheticDataSet(DataSet):
+    """DataSet over generated tables, no MySQL nor snapshot involved.
+    """
+
+    def __init__(self, n_rows, seed=0, filters=None, compact=None):
+        self.tables = generate(n_rows, seed)
+        super(SyntheticDataSet, self).__init__(
+            snapshot_dir=None, client=SyntheticClient(self.tables), filters=filters, compact=compact
+        )
+
+    def get_metadata(self):
+        return {table: list(df.columns) for table, df in self.tables.items()}
+
+    def get_schema(self):
+        return {
+            'some_id': 'id',
+            'horse_id': 'id',
+            'jockey_id': 'id',
+            'owner_id': 'id',
+            'coach_id': 'id',
+            'category_id': 'id',
+            'other_id': 'id',
+            'date': 'date',
+            'rank': 'count',
+            'distance': 'count',
+            'col': 'flag',
+            'column1': 'measure',
+            'column2': 'measure',
+        }
+
+    def get_joins(self):
+        return {'table2': ('some_id', 'table1')}
+
+    def get_watermarks(self):
+        return {}
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+
+from models.artifact import Artifact
+from utils.snapshot import decode
+from utils.snapshot import open_frame
+
+
+CHUNK_SIZE = 100000
+
+
+class FrameChunks:
+    """Row chunks of a frame too large for memory, read on demand: from a directory written by
+    utils.snapshot.save_frame (e.g. a DataSet snapshot), whose columns are memory-mapped, or from a DataFrame.
+
+    chunks = FrameChunks.from_directory('data/features', chunk_size=100000)
+    for start, stop in chunks.bounds():
+        chunk = chunks.read(start, stop)
+
+    """
+
+    def __init__(self, columns, n_rows, reader, chunk_size=CHUNK_SIZE):
+        self.columns = list(columns)
+        self.n_rows = n_rows
+        self.chunk_size = chunk_size
+        # function of (start, stop, columns) to a DataFrame of these rows
+        self._reader = reader
+
+    @classmethod
+    def from_directory(cls, path, chunk_size=CHUNK_SIZE):
+        meta, columns = open_frame(path)
+
+        def reader(start, stop, names):
+            # slices of the memory-mapped files are copied, only the chunk is read
+            data = {c: np.array(decode(columns[c][0][start:stop], columns[c][1])) for c in names}
+            return pd.DataFrame(data, index=pd.RangeIndex(start, stop), columns=names, copy=False)
+
+        return cls(meta['columns'], meta['n_rows'], reader, chunk_size)
+
+    @classmethod
+    def from_frame(cls, features, chunk_size=CHUNK_SIZE):
+        def reader(start, stop, names):
+            return features.iloc[start:stop][names].copy()
+
+        return cls(features.columns, len(features), reader, chunk_size)
+
+    def __len__(self):
+        return len(self.bounds())
+
+    def bounds(self):
+        return [(start, min(start + self.chunk_size, self.n_rows)) for start in range(0, self.n_rows, self.chunk_size)]
+
+    def read(self, start, stop, columns=None):
+        return self._reader(start, stop, self.columns if columns is None else list(columns))
+
+
+class ChunkedPipeline:
+    """Processing (TransformPlan), id encoding, min-max scaling and prediction of FrameChunks, chunk by chunk, so that
+    peak memory is bounded by <chunk_size> x <n_jobs> rows whatever the number of rows.
+
+    fit makes a single streaming pass over the training chunks: encoders are fitted with partial_fit (in-sample) and
+    min-max bounds of the model matrix accumulated, missing values counting as 0 like with fillna(0) before scale.
+    Chunks then go through the resulting Artifact (plan included), on <n_jobs> threads (numpy and sklearn release the
+    GIL), the output (probabilities or model matrix) being written to a memory-mapped .npy file.
+
+    pipeline = ChunkedPipeline(plan, {'tgt_enc_': TargetEncoder(['some_id'])}, excluded=EXCLUDED_COLUMNS, n_jobs=4)
+    pipeline.fit(FrameChunks.from_directory('data/train'))
+    x = pipeline.transform(FrameChunks.from_directory('data/train'), 'x_train.npy')
+    probas = pipeline.predict(FrameChunks.from_directory('data/history'), model, 'probas.npy')
+
+    """
+
+    def __init__(self, plan, encoders=None, excluded=(), target='target', n_jobs=1):
+        self.plan = plan
+        # prefix of the encoded columns: encoder
+        self.encoders = encoders or {}
+        self.target = target
+        self.n_jobs = n_jobs
+        encoded = [prefix + col for prefix, encoder in sorted(self.encoders.items()) for col in encoder.cols]
+        self.columns = [c for c in plan.columns if c not in excluded] + encoded
+        self.artifact = None
+
+    def fit(self, chunks):
+        """Fits encoders and scaling bounds on <chunks>, having the plan columns and a <target> column, in one pass.
+        """
+        raw_columns = [c for c in self.columns if c in self.plan.columns]
+        feature_min = np.full(len(raw_columns), np.inf)
+        feature_max = np.full(len(raw_columns), -np.inf)
+
+        def statistics(bounds):
+            chunk = chunks.read(*bounds, columns=self.plan.columns + [self.target])
+            y = chunk.pop(self.target).values
+            chunk = self.plan.apply(chunk, inplace=True)
+            block = chunk[raw_columns].values.astype(np.float64)
+            block[np.isnan(block)] = 0.
+            encoders = {prefix: e.statistics(chunk, y) for prefix, e in self.encoders.items()}
+            return block.min(axis=0), block.max(axis=0), encoders
+
+        for chunk_min, chunk_max, encoders in self._map(statistics, chunks.bounds()):
+            np.minimum(feature_min, chunk_min, out=feature_min)
+            np.maximum(feature_max, chunk_max, out=feature_max)
+            for prefix, encoder in self.encoders.items():
+                encoder.merge(*encoders[prefix])
+
+        feature_min = pd.Series(feature_min, index=raw_columns)
+        feature_max = pd.Series(feature_max, index=raw_columns)
+        for prefix, encoder in self.encoders.items():
+            for col in encoder.cols:
+                # in-sample encodings of the training rows are the values of seen categories
+                values = np.nan_to_num(encoder.values[col][:-1])
+                feature_min[prefix + col] = values.min() if len(values) else 0.
+                feature_max[prefix + col] = values.max() if len(values) else 0.
+        # Edge case: constant features, as in FeatureTransformer.scale
+        constant = feature_min == feature_max
+        feature_min[constant] = 0.
+        feature_max[constant] = 1.
+        self.artifact = Artifact(None, self.columns, self.encoders, feature_min, feature_max, self.plan)
+        return self
+
+    def transform(self, chunks, path=None, dtype=np.float64):
+        """Scaled model matrix of <chunks>, written to a memory-mapped .npy file at <path> (in memory when None).
+        """
+        out = self._output(path, (chunks.n_rows, len(self.columns)), dtype)
+
+        def transform(bounds):
+            out[bounds[0]:bounds[1]] = self._prepare(chunks, bounds)
+
+        for _ in self._map(transform, chunks.bounds()):
+            pass
+        return out
+
+    def predict(self, chunks, model, path=None):
+        """Probabilities of <model> (a BinaryClassifier) for <chunks>, written to a memory-mapped .npy file at <path>
+        (in memory when None).
+        """
+        out = self._output(path, (chunks.n_rows,), np.float64)
+
+        def predict(bounds):
+            out[bounds[0]:bounds[1]] = model.predict_proba(self._prepare(chunks, bounds))
+
+        for _ in self._map(predict, chunks.bounds()):
+            pass
+        return out
+
+    def _prepare(self, chunks, bounds):
+        if self.artifact is None:
+            raise ValueError('fit must be called first')
+        return self.artifact.prepare(chunks.read(*bounds, columns=self.plan.columns), inplace=True)
+
+    def _map(self, function, bounds):
+        """Results of <function> of each chunk bounds in order, computed on <n_jobs> threads, each reading its own
+        chunk so that only chunks being processed are in memory.
+        """
+        if self.n_jobs <= 1:
+            for chunk_bounds in bounds:
+                yield function(chunk_bounds)
+            return
+        # encoder indexes are built before being shared by threads
+        for encoder in self.encoders.values():
+            for col in encoder.cols:
+                if col in encoder.categories:
+                    encoder.index(col)
+        pool = ThreadPool(self.n_jobs)
+        try:
+            for result in pool.imap(function, bounds):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+    @staticmethod
+    def _output(path, shape, dtype):
+        if path is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
@@ -4,25 +4,172 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from multiprocessing.pool import ThreadPool
 from time import time
 
+from utils import profiling
+from utils import schema
+from utils.mysql import DEFAULT_ENV
 from utils.mysql import MySQL
+from utils.predicates import sql_literal
+from utils.predicates import where
+from utils.snapshot import SNAPSHOT_DIR
+from utils.snapshot import Snapshot
 
 
 class DataSet(dict):
+    """Tables listed in get_metadata, queried once and kept on disk as snapshots (see utils.snapshot).
+    Later instances only fetch rows past the snapshot high-water mark for tables listed in get_watermarks, other
+    tables are served from their snapshot as-is. Use force=True to rebuild snapshots from scratch, or
+    snapshot_dir=None to always query MySQL. Snapshots are read in memory, like freshly queried tables, unless <mmap>
+    where their numeric columns are memory-mapped read-only (in-place writes on them fail). Tables are fetched
+    concurrently, on at most <n_jobs> threads.
+    Queries go through <client>.query(query, env=env), any object with that method can stand in for MySQL (e.g.
+    benchmarks.synthetic.SyntheticClient).
 
-    def __init__(self):
+    <filters> (utils.predicates, e.g. FeatureConstructor.filters()) are pushed down to the queries: each predicate
+    becomes a WHERE clause of the table having its column, and tables joined to it (get_joins) only fetch rows whose
+    key is in the filtered table. With <report_savings>, rows and bytes saved are logged against an unfiltered fetch,
+    at the cost of a COUNT(*) query (a full scan) per filtered table.
+    <columns>, when given, restricts the columns fetched to these ones (SQL names), join keys and filtered columns
+    being kept.
+    With <compact> (defaults to utils.schema.enabled()), columns are cast to the compact dtypes of their logical type
+    in get_schema once all tables are loaded, ids shared by tables getting the same dictionary, and the footprint of
+    each table before > after is logged.
+    """
+
+    def __init__(self, env=DEFAULT_ENV, force=False, snapshot_dir=SNAPSHOT_DIR, n_jobs=4, client=MySQL, filters=None,
+                 columns=None, compact=None, mmap=False, report_savings=False):
         super(DataSet, self).__init__()
+        self.env = env
+        self.client = client
+        self.snapshot_dir = snapshot_dir
+        self.n_jobs = n_jobs
+        self.mmap = mmap
+        self.report_savings = report_savings
         self.metadata = self.get_metadata()
-        self.query()
+        self.watermarks = self.get_watermarks()
+        self.joins = self.get_joins()
+        self.filters = list(filters or [])
+        if columns is not None:
+            self.metadata = self.project(columns)
+        self.conditions = self.pushdown(self.filters)
+        self.schema = schema.Schema(self.get_schema())
+        self.compact = schema.enabled() if compact is None else compact
+        self.query(force=force)
+        if self.compact:
+            self.enforce_schema()
 
     def query(self, force=False):
         print('[INFO] Querying data:')
-        for table, columns in self.metadata.items():
-            ti = time()
-            self[table] = MySQL.query("SELECT {} FROM {}".format(', '.join(columns), table))
-            self[table].rename(columns={'id': '{}_id'.format(table[:-1])}, inplace=True)
-            print('[INFO] > {} - {}s'.format(table, round(time() - ti, 2)))
+        ti = time()
+        with profiling.span('Querying data') as parent:
+
+            def fetch(item):
+                table, columns = item
+                tt = time()
+                with profiling.span('Querying {}'.format(table), parent=parent) as record:
+                    df, status = self.query_table(table, columns, force=force)
+                    if record is not None:
+                        record.shape_out = list(df.shape)
+                return table, df, status, time() - tt
+
+            pool = ThreadPool(max(1, min(self.n_jobs, len(self.metadata))))
+            try:
+                for table, df, status, duration in pool.imap_unordered(fetch, list(self.metadata.items())):
+                    self[table] = df.rename(columns={'id': '{}_id'.format(table[:-1])})
+                    print('[INFO] > {} - {} - {}s'.format(table, status, round(duration, 2)))
+            finally:
+                pool.close()
+                pool.join()
+        print('[INFO] Querying data - {}s'.format(round(time() - ti, 2)))
+
+    def query_table(self, table, columns, force=False):
+        """Returns the table and a short status message on how it was obtained.
+        """
+        watermark = self.watermarks.get(table)
+        if watermark is not None and watermark not in columns:
+            columns = list(columns) + [watermark]
+        condition = self.conditions.get(table)
+        query = "SELECT {} FROM {}".format(', '.join(columns), table)
+        if condition is not None:
+            query += " WHERE {}".format(condition)
+        if self.snapshot_dir is None:
+            df = self.client.query(query, env=self.env)
+            return df, 'queried' + self.savings(table, condition, df)
+
+        snapshot = Snapshot(table, columns, self.env, watermark=watermark, root=self.snapshot_dir, condition=condition)
+        if force or not snapshot.exists():
+            df = self.client.query(query, env=self.env)
+            snapshot.save(df)
+            return df, 'snapshot built ({} rows)'.format(len(df)) + self.savings(table, condition, df)
+        if watermark is None:
+            return snapshot.load(self.mmap), 'loaded from snapshot (no watermark, use force=True to refresh)'
+
+        hwm = snapshot.high_water_mark()
+        if hwm is not None:
+            query += " {} {} > {}".format('AND' if condition is not None else 'WHERE', watermark, self.sql_literal(hwm))
+        delta = self.client.query(query, env=self.env)
+        if delta.empty:
+            return snapshot.load(self.mmap), 'snapshot up to date'
+        snapshot.append(delta)
+        return snapshot.load(self.mmap), '{} new rows appended to snapshot'.format(len(delta))
+
+    def enforce_schema(self):
+        before = {table: schema.footprint(df) for table, df in self.items()}
+        self.schema.enforce(self)
+        schema.memory_report(self, 'compact dtypes', before)
+
+    def project(self, columns):
+        """Metadata restricted to <columns>, join keys and columns of filters.
+        """
+        needed = set(columns) | set(predicate.column for predicate in self.filters)
+        needed |= set(key for key, _ in self.joins.values())
+        metadata = {}
+        for table, table_columns in self.metadata.items():
+            metadata[table] = [c for c in table_columns if c in needed]
+            print('[INFO] Projected {}: {} of {} columns'.format(table, len(metadata[table]), len(table_columns)))
+        return metadata
+
+    def pushdown(self, filters):
+        """WHERE condition of each table from <filters>: predicates on its columns, and for a joined table its key
+        being in the rows of the filtered table it is joined to. Joined tables refreshed incrementally from a snapshot
+        are not pruned, rows dropped once could be needed by rows of the other table added later.
+        """
+        predicates = {}
+        for predicate in filters:
+            tables = [predicate.table] if predicate.table is not None else [
+                table for table, columns in self.metadata.items() if predicate.column in columns
+            ]
+            if len(tables) != 1:
+                raise ValueError('Filter on {} matches tables {}, set its table'.format(predicate.column, tables))
+            if tables[0] in self.joins:
+                message = 'Filter on {} of joined table {} would drop rows of the left join, filter {} instead'
+                raise ValueError(message.format(predicate.column, tables[0], self.joins[tables[0]][1]))
+            predicates.setdefault(tables[0], []).append(predicate)
+
+        conditions = {table: where(table_predicates) for table, table_predicates in predicates.items()}
+        for table, (key, parent) in self.joins.items():
+            incremental = self.snapshot_dir is not None and self.watermarks.get(table) is not None
+            if parent in conditions and not incremental:
+                conditions[table] = '{} IN (SELECT {} FROM {} WHERE {})'.format(key, key, parent, conditions[parent])
+        for table, condition in sorted(conditions.items()):
+            print('[INFO] Pushed down to {}: {}'.format(table, condition))
+        return conditions
+
+    def savings(self, table, condition, df):
+        """Status of rows and (estimated) bytes saved by <condition> against an unfiltered fetch of <table>.
+        """
+        if condition is None or not self.report_savings:
+            return ''
+        total = int(self.client.query('SELECT COUNT(*) AS n FROM {}'.format(table), env=self.env)['n'].iloc[0])
+        saved = total - len(df)
+        row_bytes = df.memory_usage(index=False, deep=True).sum() / len(df) if len(df) else 0
+        return ' - {} of {} rows, {} rows (~{}MB) saved'.format(
+            len(df), total, saved, round(saved * row_bytes / 2 ** 20, 1)
+        )
+
+    sql_literal = staticmethod(sql_literal)
 
     def get_metadata(self):
         return {
@@ -37,3 +184,30 @@ class DataSet(dict):
                 #'col3',
             ],
         }
+
+    def get_schema(self):
+        """Logical type of columns (see utils.schema), by name after the id renaming of query. Columns not listed
+        keep the dtype they are queried with.
+        """
+        return {
+            'tabel_id': 'id',
+            'table_id': 'id',
+            'col1': 'measure',
+            'col2': 'measure',
+        }
+
+    def get_joins(self):
+        """Tables left-joined to another one as {table: (key, other table)}: with filters on the other table, only
+        rows whose key is in its filtered rows are fetched.
+        """
+        return {
+            'table2': ('some_id', 'tabel1'),
+        }
+
+    def get_watermarks(self):
+        """Monotonic column (auto-increment id, creation timestamp) per table, used for incremental refreshes.
+        """
+        return {
+            'tabel1': 'id',
+            'table2': 'id',
+        }
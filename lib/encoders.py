@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+
+
+# Missing ids are encoded as a category of their own
+NAN_CATEGORY = -99999
+
+
+class Encoder:
+    """Base of target-based encoders of id columns, fitted with a few bincounts over factorized ids.
+
+    The fitted state of a column is its categories, looked up through a hash index, and an array of encoded values
+    with the value of unseen categories last: transforming is a single gather. fit_transform with <n_folds> encodes
+    each row with statistics of the other folds only (out-of-fold), so that the target of a row doesn't leak into its
+    own encoding; fold statistics are the totals minus those of the fold, no refit needed. partial_fit fits on data
+    too large for memory, chunk by chunk, to the same state as fit on all rows.
+
+    encoder = TargetEncoder(['some_id'], min_samples=5, smoothing=5)
+    x_train_encoded = encoder.fit_transform(x_train, y_train, n_folds=5, n_jobs=4)
+    x_test_encoded = encoder.transform(x_test)
+    encoder.save('target_encoder.npz')
+
+    Subclasses implement encode, from per-category counts and positives to encoded values.
+    """
+
+    def __init__(self, cols, min_samples=1):
+        self.cols = list(cols)
+        self.min_samples = max(1, min_samples)
+        self.categories = {}
+        self.values = {}
+        self._indexes = {}
+        # running (counts, positives) of each column categories and overall (rows, positive rows) of partial_fit
+        self._statistics = {}
+        self._totals = [0, 0.]
+
+    def params(self):
+        return {'min_samples': self.min_samples}
+
+    def encode(self, counts, positives, n, n_positives):
+        """Encoded value of each category, and of unseen categories, from the number of rows and of positive rows of
+        each category (counts, positives) and overall (n, n_positives).
+        :return: array of len(counts) + 1 values, the last one for unseen categories
+        """
+        raise NotImplementedError
+
+    def fit(self, X, y, n_jobs=1):
+        self.fit_transform(X, y, n_jobs=n_jobs, transform=False)
+        return self
+
+    def fit_transform(self, X, y, n_folds=None, n_jobs=1, seed=0, transform=True):
+        """Fits the encoder on all rows and encodes them, in-sample or out-of-fold with <n_folds> random folds.
+        Columns are processed on <n_jobs> threads.
+        :return: DataFrame of the encoded columns, named like the encoded ones
+        """
+        y = np.asarray(y, dtype=np.float64)
+        folds = None
+        if n_folds is not None:
+            folds = np.random.RandomState(seed).permutation(len(y)) % n_folds
+
+        def fit_column(col):
+            codes, categories = pd.factorize(self._fill_missing(X[col].values))
+            counts = np.bincount(codes, minlength=len(categories)).astype(np.float64)
+            positives = np.bincount(codes, weights=y, minlength=len(categories))
+            self._set(col, categories, self.encode(counts, positives, len(y), y.sum()))
+            if not transform:
+                return None
+            if folds is None:
+                return self.values[col][codes]
+            encoded = np.empty(len(y), dtype=np.float64)
+            for fold in range(n_folds):
+                rows = np.flatnonzero(folds == fold)
+                fold_counts = np.bincount(codes[rows], minlength=len(categories))
+                fold_positives = np.bincount(codes[rows], weights=y[rows], minlength=len(categories))
+                values = self.encode(
+                    counts - fold_counts, positives - fold_positives, len(y) - len(rows), y.sum() - y[rows].sum()
+                )
+                encoded[rows] = values[codes[rows]]
+            return encoded
+
+        pool = ThreadPool(min(n_jobs, len(self.cols))) if n_jobs > 1 and len(self.cols) > 1 else None
+        try:
+            encoded = pool.map(fit_column, self.cols) if pool is not None else [fit_column(c) for c in self.cols]
+        finally:
+            if pool is not None:
+                pool.close()
+        if transform:
+            return pd.DataFrame(dict(zip(self.cols, encoded)), index=X.index, columns=self.cols)
+
+    def statistics(self, X, y):
+        """Categories, rows and positive rows per category of each column in (X, y), e.g. a chunk of a larger set.
+        """
+        y = np.asarray(y, dtype=np.float64)
+        statistics = {}
+        for col in self.cols:
+            codes, categories = pd.factorize(self._fill_missing(X[col].values))
+            statistics[col] = (
+                categories,
+                np.bincount(codes, minlength=len(categories)).astype(np.float64),
+                np.bincount(codes, weights=y, minlength=len(categories)),
+            )
+        return statistics, len(y), y.sum()
+
+    def partial_fit(self, X, y):
+        return self.merge(*self.statistics(X, y))
+
+    def merge(self, statistics, n, n_positives):
+        """Adds <statistics> of a chunk of rows (see statistics) to those of previous chunks and encodes categories
+        from the totals. Categories keep their order of appearance, as with fit on all chunks at once.
+        """
+        self._totals[0] += n
+        self._totals[1] += n_positives
+        for col in self.cols:
+            categories, counts, positives = statistics[col]
+            if col in self._statistics:
+                positions = self.index(col).get_indexer(categories)
+                new = positions < 0
+                positions[new] = len(self.categories[col]) + np.arange(new.sum())
+                categories = np.append(self.categories[col], categories[new])
+                total_counts, total_positives = [np.append(s, np.zeros(new.sum())) for s in self._statistics[col]]
+                total_counts[positions] += counts
+                total_positives[positions] += positives
+                counts, positives = total_counts, total_positives
+            self._statistics[col] = (counts, positives)
+            self._set(col, categories, self.encode(counts, positives, *self._totals))
+        return self
+
+    def transform(self, X):
+        """DataFrame of the encoded columns, named like the encoded ones, unseen categories getting the value of
+        unseen categories.
+        """
+        if not self.values:
+            raise ValueError('fit must be called before transform')
+        encoded = {
+            col: self.values[col][self.index(col).get_indexer(self._fill_missing(X[col].values))] for col in self.cols
+        }
+        return pd.DataFrame(encoded, index=X.index, columns=self.cols)
+
+    def index(self, col):
+        if col not in self._indexes:
+            self._indexes[col] = pd.Index(self.categories[col])
+        return self._indexes[col]
+
+    def _set(self, col, categories, values):
+        self.categories[col] = np.asarray(categories)
+        self.values[col] = values
+        self._indexes.pop(col, None)
+
+    @staticmethod
+    def _fill_missing(values):
+        missing = pd.isnull(values)
+        if not missing.any():
+            return values
+        return np.where(missing, NAN_CATEGORY, values)
+
+    def save(self, path):
+        arrays = {}
+        for col in self.cols:
+            arrays['{}.categories'.format(col)] = self.categories[col]
+            arrays['{}.values'.format(col)] = self.values[col]
+        arrays['config'] = np.array(json.dumps({
+            'encoder': type(self).__name__,
+            'cols': self.cols,
+            'params': self.params(),
+        }))
+        with open(path, 'wb') as stream:
+            np.savez(stream, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as arrays:
+            config = json.loads(str(arrays['config']))
+            encoder = ENCODERS[config['encoder']](config['cols'], **config['params'])
+            for col in encoder.cols:
+                encoder._set(col, arrays['{}.categories'.format(col)], arrays['{}.values'.format(col)])
+        return encoder
+
+
+class TargetEncoder(Encoder):
+    """Smoothed target mean of each category: with n rows in the category, the category mean weighted by
+    1 / (1 + exp(-(n - min_samples) / smoothing)) (0 when n <= min_samples) and the overall mean by the rest.
+    """
+
+    def __init__(self, cols, min_samples=1, smoothing=1):
+        Encoder.__init__(self, cols, min_samples)
+        self.smoothing = smoothing
+
+    def params(self):
+        return {'min_samples': self.min_samples, 'smoothing': self.smoothing}
+
+    def encode(self, counts, positives, n, n_positives):
+        prior = n_positives / n if n else np.nan
+        corrected = counts - self.min_samples
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            coefficient = (corrected > 0) / (1 + np.exp(-corrected / self.smoothing))
+            means = np.where(counts > 0, positives / counts, 0.)
+        return np.append(prior * (1 - coefficient) + means * coefficient, prior)
+
+
+class WeightOfEvidenceEncoder(Encoder):
+    """Weight of evidence of each category, ln(P(X = category | Y = 1) / P(X = category | Y = 0)), for a binary
+    target. 0 (no information) for categories with less than min_samples rows or no positive or no negative row.
+    """
+
+    def encode(self, counts, positives, n, n_positives):
+        negatives = counts - positives
+        with np.errstate(invalid='ignore', divide='ignore'):
+            positive_shares = positives / n_positives
+            negative_shares = negatives / (n - n_positives)
+            undefined = (counts < self.min_samples) | (positives == 0) | (negatives == 0)
+            values = np.where(undefined, 0., np.log(positive_shares / negative_shares))
+        return np.append(values, 0.)
+
+
+ENCODERS = {
+    'TargetEncoder': TargetEncoder,
+    'WeightOfEvidenceEncoder': WeightOfEvidenceEncoder,
+}
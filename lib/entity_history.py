@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from multiprocessing import cpu_count
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+
+from utils import grouped
+from utils import schema
+from utils.shared import SharedArrays
+from utils.shared import attach
+
+
+ENTITIES = ['horse', 'jockey', 'owner', 'coach']
+KINDS = ['race_counts', 'last_race', 'last_n_races', 'last_n_days']
+
+
+class EntityHistory:
+    """Past performance features of entities (horse, jockey, ...), computed in a single pass per entity.
+
+    Rows are sorted once by (<entity>_id, date) and aggregated per race day, then all features are derived from the
+    day-level arrays with grouped cumulative sums and written back by row position:
+    * race_counts:  <entity>_n_wins, <entity>_n_races, sqrt of wins / races on previous days
+    * last_race:    <entity>_last_race, wins on the previous race day
+    * last_n_races: <entity>_last_<suffix>_races, wins over the <window> previous race days, one per item of <windows>
+    * last_n_days:  <entity>_last_<suffix>_days, wins over previous race days in the last <days> days, one per item of
+                    <periods> (none by default)
+    Rows with a null id or date get NaN, like the left merges this replaces. The result has a fresh RangeIndex.
+
+    Entities are independent and can be computed in parallel on <n_jobs> workers (-1 for all cores), either processes
+    (default) receiving only the date, target and id columns through shared memory, or threads. Results are the same
+    as the serial computation (n_jobs=1). New columns are float <dtype>, float32 when compact dtypes are enabled
+    (utils.schema) and float64 otherwise by default.
+
+    EntityHistory(['horse', 'jockey'], windows={'n': 3, '10': 10}, periods={'90': 90}).transform(features)
+
+    """
+
+    def __init__(self, entities=ENTITIES, windows=None, periods=None, kinds=KINDS, target='target', n_jobs=1,
+                 backend='processes', dtype=None):
+        self.entities = list(entities)
+        self.windows = self.named({'n': 3} if windows is None else windows)
+        self.periods = self.named({} if periods is None else periods)
+        self.kinds = list(kinds)
+        self.target = target
+        self.n_jobs = cpu_count() if n_jobs == -1 else n_jobs
+        if backend not in ('processes', 'threads'):
+            raise ValueError('Unknown backend {}, use processes or threads'.format(backend))
+        self.backend = backend
+        self.dtype = schema.float_dtype() if dtype is None else dtype
+
+    @staticmethod
+    def named(sizes):
+        """{suffix: size} from a dict or a list of sizes, suffixes being used in column names.
+        """
+        return OrderedDict(sorted(sizes.items()) if isinstance(sizes, dict) else [(str(w), w) for w in sizes])
+
+    def columns(self):
+        """Names of the new columns, grouped by kind then entity (the order of FeatureConstructor.add_all_features).
+        """
+        columns = []
+        for kind in self.kinds:
+            for entity in self.entities:
+                columns += self.entity_columns(entity, kind)
+        return columns
+
+    def entity_columns(self, entity, kind):
+        if kind == 'race_counts':
+            return ['{}_n_wins'.format(entity), '{}_n_races'.format(entity)]
+        if kind == 'last_race':
+            return ['{}_last_race'.format(entity)]
+        if kind == 'last_n_races':
+            return ['{}_last_{}_races'.format(entity, suffix) for suffix in self.windows]
+        if kind == 'last_n_days':
+            return ['{}_last_{}_days'.format(entity, suffix) for suffix in self.periods]
+        raise ValueError('Unknown kind of history feature {}'.format(kind))
+
+    def compute(self, features):
+        """New columns only, as a DataFrame aligned by position with <features>.
+        """
+        n_jobs = min(self.n_jobs, len(self.entities))
+        dates, target = features['date'].values, features[self.target].values
+        computed = {}
+        if n_jobs <= 1:
+            for entity in self.entities:
+                computed.update(self.compute_entity(entity, features['{}_id'.format(entity)].values, dates, target))
+        elif self.backend == 'threads':
+            pool = ThreadPool(n_jobs)
+            try:
+                for columns in pool.map(
+                    lambda entity: self.compute_entity(entity, features['{}_id'.format(entity)].values, dates, target),
+                    self.entities,
+                ):
+                    computed.update(columns)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            with SharedArrays() as shared:
+                dates, target = shared.share('date', dates), shared.share('target', target)
+                tasks = [
+                    (self, entity, shared.share(entity, features['{}_id'.format(entity)].values), dates, target)
+                    for entity in self.entities
+                ]
+                pool = Pool(n_jobs)
+                try:
+                    for columns in pool.map(_compute_shared_entity, tasks):
+                        computed.update(columns)
+                finally:
+                    pool.close()
+                    pool.join()
+        return pd.DataFrame(computed, columns=self.columns())
+
+    def transform(self, features):
+        """<features> with the new columns attached in one step (existing ones are replaced).
+        """
+        new = self.compute(features)
+        kept = features[[c for c in features.columns if c not in new.columns]].reset_index(drop=True)
+        return pd.concat([kept, new], axis=1)
+
+    def compute_entity(self, entity, ids, dates, target):
+        """New columns of one entity, from arrays of ids, dates and target.
+        """
+        n = len(ids)
+        rows, (id_codes, date_codes) = grouped.sort_by_keys(ids, dates)
+        target = np.nan_to_num(np.asarray(target)[rows].astype(np.float64))
+
+        # aggregation per (entity, race day)
+        day_starts = grouped.group_starts(id_codes, date_codes)
+        day = grouped.group_index(day_starts)
+        day_wins = np.bincount(day, weights=target)
+        day_races = np.bincount(day).astype(np.float64)
+        entity_starts = grouped.group_starts(id_codes[day_starts])
+
+        values = OrderedDict()
+        if 'race_counts' in self.kinds:
+            values['{}_n_wins'.format(entity)] = np.sqrt(grouped.grouped_cumsum(day_wins, entity_starts, True))
+            values['{}_n_races'.format(entity)] = np.sqrt(grouped.grouped_cumsum(day_races, entity_starts, True))
+        if 'last_race' in self.kinds:
+            values['{}_last_race'.format(entity)] = grouped.grouped_shift(day_wins, entity_starts)
+        if 'last_n_races' in self.kinds:
+            for suffix, window in self.windows.items():
+                values['{}_last_{}_races'.format(entity, suffix)] = grouped.rolling(
+                    day_wins, entity_starts, length=window, exclusive=True
+                )['sum']
+        if 'last_n_days' in self.kinds and self.periods:
+            day_dates = pd.to_datetime(np.asarray(dates)[rows][day_starts]).values
+            for suffix, days in self.periods.items():
+                values['{}_last_{}_days'.format(entity, suffix)] = grouped.rolling(
+                    day_wins, entity_starts, times=day_dates, period=pd.Timedelta(days=days).to_timedelta64(),
+                    exclusive=True,
+                )['sum']
+
+        # back to rows, by position
+        columns = {}
+        for column, day_values in values.items():
+            columns[column] = np.full(n, np.nan, dtype=self.dtype)
+            columns[column][rows] = day_values[day]
+        return columns
+
+
+def history_columns(entities=ENTITIES, windows=None, periods=None, **kwargs):
+    """New columns for EntityHistory arguments, see utils.decorators.compute_or_skip.
+    """
+    return EntityHistory(entities, windows, periods).columns()
+
+
+def history_inputs(entities=ENTITIES, **kwargs):
+    """Columns read for EntityHistory arguments, see utils.decorators.compute_or_skip.
+    """
+    return ['date', 'target'] + ['{}_id'.format(entity) for entity in entities]
+
+
+def _compute_shared_entity(task):
+    history, entity, ids, dates, target = task
+    return history.compute_entity(entity, attach(ids), attach(dates), attach(target))
@@ -4,11 +4,20 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import numpy as np
+from collections import OrderedDict
+
 import pandas as pd
 
+from lib.entity_history import ENTITIES
+from lib.entity_history import EntityHistory
+from lib.entity_history import history_columns
+from lib.entity_history import history_inputs
+from lib.feature_graph import FeatureGraph
 from utils.decorators import compute_or_skip
 from utils.decorators import log_execution_time
+from utils.predicates import Equals
+from utils.predicates import Range
+from utils.predicates import mask
 
 
 # These bounds are based on (visual) data exploration
@@ -16,6 +25,10 @@ DATA_BOUNDS = {
     'column1': (1, 5 * 1e5),
     'column2': (0, 1e6),
 }
+# Kinds of history features (see lib.entity_history) computed by add_<entity>_<kind> methods
+HISTORY_KINDS = ['race_counts', 'last_race', 'last_n_races']
+# Race days of add_<entity>_last_n_races features, also used by history_kernel and add_history_features
+LAST_N_RACES = 3
 
 
 class FeatureConstructor:
@@ -28,14 +41,21 @@ class FeatureConstructor:
         return features
 
     @classmethod
-    @log_execution_time('Filtering data')
-    def filter(cls, features):
-        mask = features['col'] == 1
-        for (column, (l, h)) in DATA_BOUNDS.items():
-            values = features[column].fillna(0)
-            mask &= (values >= l) & (values < h)
+    def filters(cls, start_date=None, end_date=None):
+        """Predicates of filter, also to be pushed down to queries with DataSet(filters=...): DATA_BOUNDS (missing
+        values counting as 0), col == 1 and dates in [<start_date>, <end_date>) when given.
+        """
+        predicates = [Equals('col', 1)]
+        for column, (l, h) in sorted(DATA_BOUNDS.items()):
+            predicates.append(Range(column, l, h, fill=0))
+        if start_date is not None or end_date is not None:
+            predicates.append(Range('date', start_date, end_date))
+        return predicates
 
-        filtered = features[mask]
+    @classmethod
+    @log_execution_time('Filtering data')
+    def filter(cls, features, start_date=None, end_date=None):
+        filtered = features[mask(features, cls.filters(start_date, end_date))]
         print(
             '[INFO] Data size {} > {} (-{}%)'.format(
                 features.shape[0],
@@ -46,132 +66,155 @@ class FeatureConstructor:
         return filtered
 
     @classmethod
-    def add_all_features(cls, features, dataset):
-        features = cls.add_target(features)                                     # Label - value to predict
-        features = cls.add_horse_race_counts(features)                          # Race counts for horses
-        features = cls.add_jockey_race_counts(features)                         # Race counts for jockeys
-        features = cls.add_owner_race_counts(features)                          # Race counts for owners
-        features = cls.add_coach_race_counts(features)                          # Race counts for coaches
-        features = cls.add_horse_last_race(features, 'horse')                   # Last race result for horses
-        features = cls.add_jockey_last_race(features, 'jockey')                 # Last race result for jockeys
-        features = cls.add_owner_last_race(features, 'owner')                   # Last race result for owners
-        features = cls.add_coach_last_race(features, 'coach')                   # Last race result for coaches
-        features = cls.add_horse_last_n_races(features, 'horse')                # Last n races results for horses
-        features = cls.add_jockey_last_n_races(features, 'jockey')              # Last n races results for jockeys
-        features = cls.add_owner_last_n_races(features, 'owner')                # Last n races results for owners
-        features = cls.add_coach_last_n_races(features, 'coach')                # Last n races results for coaches
-        return features
+    def add_all_features(cls, features, dataset, n_jobs=1):
+        return cls.add_features(features, n_jobs=n_jobs)
+
+    @classmethod
+    def add_features(cls, features, columns=None, n_jobs=1, explain=False):
+        """<features> with the feature <columns> (all features when None) and only what they need, as planned by the
+        feature graph: history features of an entity share one sort, entities run on <n_jobs> processes (see
+        history_kernel), features are loaded from or kept in the FeatureCache when enabled and new columns are
+        attached at once. <explain> prints the plan first.
+        """
+        plan = cls.feature_graph().plan(features.columns, columns)
+        if explain:
+            plan.explain(len(features))
+        return plan.run(features, n_jobs=n_jobs)
+
+    @classmethod
+    def feature_graph(cls):
+        """lib.feature_graph.FeatureGraph of the feature methods, in the column order of add_all_features.
+        """
+        graph = FeatureGraph()
+        graph.add(cls.add_target)                                               # Label - value to predict
+        for kind in HISTORY_KINDS:                                              # Race counts and results
+            for entity in ENTITIES:
+                graph.add(
+                    getattr(cls, 'add_{}_{}'.format(entity, kind)),
+                    group=('history', entity),
+                    param=kind,
+                    sort=['{}_id'.format(entity), 'date'],
+                )
+        graph.kernel('history', cls.history_kernel)
+        return graph
+
+    @classmethod
+    def history_kernel(cls, features, groups, n_jobs=1):
+        """New history columns of <groups> ({entity: kinds}), entities with the same kinds being computed together
+        on <n_jobs> processes, like add_history_features.
+        """
+        entities = OrderedDict()
+        for entity, kinds in groups.items():
+            entities.setdefault(tuple(kinds), []).append(entity)
+        return pd.concat(
+            [
+                EntityHistory(names, {'n': LAST_N_RACES}, kinds=list(kinds), n_jobs=n_jobs).compute(features)
+                for kinds, names in entities.items()
+            ],
+            axis=1,
+        )
 
     @classmethod
-    @compute_or_skip(['target'])
+    @compute_or_skip(history_columns, inputs=history_inputs)
+    @log_execution_time('Adding history features')
+    def add_history_features(cls, features, entities=ENTITIES, windows=None, periods=None, n_jobs=1, force=False):
+        """Race counts, last race result and last n races results for all <entities> in one pass per entity,
+        entities being computed in parallel on <n_jobs> processes, see lib.entity_history.EntityHistory.
+        Same values as the add_<entity>_... methods below, last n races being the last LAST_N_RACES unless <windows>.
+        """
+        windows = {'n': LAST_N_RACES} if windows is None else windows
+        return EntityHistory(entities, windows, periods, n_jobs=n_jobs).transform(features)
+
+    @classmethod
+    @compute_or_skip(['target'], inputs=['rank'], cost=0.01)
     def add_target(cls, features, force=False):
         features = features.assign(target=features['rank'] <= 3)
         return features
 
     @classmethod
-    @compute_or_skip(['horse_n_wins', 'horse_n_races'])
+    @compute_or_skip(['horse_n_wins', 'horse_n_races'], inputs=['date', 'horse_id', 'target'], cost=0.5)
     @log_execution_time('Adding race counts for horses')
     def add_horse_race_counts(cls, features, force=False):
         return cls.add_race_counts(features, 'horse')
 
     @classmethod
-    @compute_or_skip(['jockey_n_wins', 'jockey_n_races'])
+    @compute_or_skip(['jockey_n_wins', 'jockey_n_races'], inputs=['date', 'jockey_id', 'target'], cost=0.5)
     @log_execution_time('Adding race counts for jockeys')
     def add_jockey_race_counts(cls, features, force=False):
         return cls.add_race_counts(features, 'jockey')
 
     @classmethod
-    @compute_or_skip(['owner_n_wins', 'owner_n_races'])
+    @compute_or_skip(['owner_n_wins', 'owner_n_races'], inputs=['date', 'owner_id', 'target'], cost=0.5)
     @log_execution_time('Adding race counts for owners')
     def add_owner_race_counts(cls, features, force=False):
         return cls.add_race_counts(features, 'owner')
 
     @classmethod
-    @compute_or_skip(['coach_n_wins', 'coach_n_races'])
+    @compute_or_skip(['coach_n_wins', 'coach_n_races'], inputs=['date', 'coach_id', 'target'], cost=0.5)
     @log_execution_time('Adding race counts for coaches')
     def add_coach_race_counts(cls, features, force=False):
         return cls.add_race_counts(features, 'coach')
 
     @classmethod
     def add_race_counts(cls, features, instance_name):
-        counts = features[['date', '{}_id'.format(instance_name), 'target']].copy()
-        counts['{}_n_wins'.format(instance_name)] = counts['target']
-        counts['{}_n_races'.format(instance_name)] = 1
-        counts.drop('target', axis=1, inplace=True)
-        counts = counts.groupby(by=['{}_id'.format(instance_name), 'date']).sum()
-        counts = counts.groupby(level=[0]).cumsum()
-        counts = np.sqrt(counts.groupby(level=[0]).shift(periods=1, axis=0).fillna(0))
-        counts = counts.reset_index()
-        features = features.merge(counts, how='left', on=['{}_id'.format(instance_name), 'date'])
-        return features
+        return EntityHistory([instance_name], kinds=['race_counts']).transform(features)
 
     @classmethod
-    @compute_or_skip(['horse_last_race'])
+    @compute_or_skip(['horse_last_race'], inputs=['date', 'horse_id', 'target'], cost=0.2)
     @log_execution_time('Adding last race result for horses')
     def add_horse_last_race(cls, features, force=False):
         return cls.last_race_result(features, 'horse')
 
     @classmethod
-    @compute_or_skip(['jockey_last_race'])
+    @compute_or_skip(['jockey_last_race'], inputs=['date', 'jockey_id', 'target'], cost=0.2)
     @log_execution_time('Adding last race result for jockeys')
     def add_jockey_last_race(cls, features, force=False):
         return cls.last_race_result(features, 'jockey')
 
     @classmethod
-    @compute_or_skip(['owner_last_race'])
+    @compute_or_skip(['owner_last_race'], inputs=['date', 'owner_id', 'target'], cost=0.2)
     @log_execution_time('Adding last race result for owners')
     def add_owner_last_race(cls, features, force=False):
         return cls.last_race_result(features, 'owner')
 
     @classmethod
-    @compute_or_skip(['coach_last_race'])
+    @compute_or_skip(['coach_last_race'], inputs=['date', 'coach_id', 'target'], cost=0.2)
     @log_execution_time('Adding last race result for coaches')
     def add_coach_last_race(cls, features, force=False):
         return cls.last_race_result(features, 'coach')
 
     @classmethod
     def last_race_result(cls, features, instance_name):
-        counts = features[['date', '{}_id'.format(instance_name), 'target']].copy()
-        counts['{}_last_race'.format(instance_name)] = counts['target']
-        counts.drop('target', axis=1, inplace=True)
-        counts = counts.groupby(by=['{}_id'.format(instance_name), 'date']).sum()
-        counts = counts.groupby(level=[0]).shift(periods=1, axis=0).fillna(0)
-        counts = counts.reset_index()
-        features = features.merge(counts, how='left', on=['{}_id'.format(instance_name), 'date'])
-        return features
+        return EntityHistory([instance_name], kinds=['last_race']).transform(features)
 
     @classmethod
-    @compute_or_skip(['horse_last_n_races'])
-    @log_execution_time('Adding last 3 races result for horses')
+    @compute_or_skip(['horse_last_n_races'], inputs=['date', 'horse_id', 'target'], cost=0.5)
+    @log_execution_time('Adding last {} races result for horses'.format(LAST_N_RACES))
     def add_horse_last_n_races(cls, features, force=False):
-        return cls.last_n_wins(features, 'horse', 3)
+        return cls.last_n_wins(features, 'horse', LAST_N_RACES)
 
     @classmethod
-    @compute_or_skip(['jockey_last_n_races'])
-    @log_execution_time('Adding last 3 races result for jockeys')
+    @compute_or_skip(['jockey_last_n_races'], inputs=['date', 'jockey_id', 'target'], cost=0.5)
+    @log_execution_time('Adding last {} races result for jockeys'.format(LAST_N_RACES))
     def add_jockey_last_n_races(cls, features, force=False):
-        return cls.last_n_wins(features, 'jockey', 3)
+        return cls.last_n_wins(features, 'jockey', LAST_N_RACES)
 
     @classmethod
-    @compute_or_skip(['owner_last_n_races'])
-    @log_execution_time('Adding last 3 races result for owners')
+    @compute_or_skip(['owner_last_n_races'], inputs=['date', 'owner_id', 'target'], cost=0.5)
+    @log_execution_time('Adding last {} races result for owners'.format(LAST_N_RACES))
     def add_owner_last_n_races(cls, features, force=False):
-        return cls.last_n_wins(features, 'owner', 3)
+        return cls.last_n_wins(features, 'owner', LAST_N_RACES)
 
     @classmethod
-    @compute_or_skip(['coach_last_n_races'])
-    @log_execution_time('Adding last 3 races result for coaches')
+    @compute_or_skip(['coach_last_n_races'], inputs=['date', 'coach_id', 'target'], cost=0.5)
+    @log_execution_time('Adding last {} races result for coaches'.format(LAST_N_RACES))
     def add_coach_last_n_races(cls, features, force=False):
-        return cls.last_n_wins(features, 'coach', 3)
+        return cls.last_n_wins(features, 'coach', LAST_N_RACES)
 
     @classmethod
     def last_n_wins(cls, features, instance_name, window):
-        counts = features[['date', '{}_id'.format(instance_name), 'target']].copy()
-        counts['{}_last_n_races'.format(instance_name)] = counts['target']
-        counts.drop('target', axis=1, inplace=True)
-        counts = counts.groupby(by=['{}_id'.format(instance_name), 'date']).sum()
-        counts = counts.groupby(level=[0]).apply(lambda x: x.rolling(window=window, min_periods=1).sum())
-        counts = counts.groupby(level=[0]).shift(periods=1, axis=0).fillna(0)
-        counts = counts.reset_index()
-        features = features.merge(counts, how='left', on=['{}_id'.format(instance_name), 'date'])
-        return features
+        return EntityHistory([instance_name], windows={'n': window}, kinds=['last_n_races']).transform(features)
+
+    @classmethod
+    def last_n_days_wins(cls, features, instance_name, days):
+        return EntityHistory([instance_name], periods={str(days): days}, kinds=['last_n_days']).transform(features)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import pandas as pd
+
+from utils.decorators import fresh_index
+from utils.decorators import log_execution_time
+
+
+# Cost per row of sorting rows by a key, the unit of feature costs
+SORT_COST = 1.
+
+
+class Feature:
+    """Feature method as a node of the graph: <outputs> columns computed from <inputs> columns, at a relative <cost>
+    per row (sort excluded). Features of the same <group> (kernel name, key) are computed together by the group kernel
+    from their <param>, sharing the sort of rows by <sort> columns. Methods are decorated with compute_or_skip.
+    """
+
+    def __init__(self, name, method, outputs, inputs, cost=1., group=None, param=None, sort=None):
+        self.name = name
+        self.method = method
+        self.outputs = list(outputs)
+        self.inputs = list(inputs)
+        self.cost = cost
+        self.group = group
+        self.param = param
+        self.sort = list(sort) if sort is not None else None
+
+
+class Task:
+    """Features computed by a single call: one feature, or the features of a group sharing a sort.
+    """
+
+    def __init__(self, features):
+        self.features = features
+        self.group = features[0].group
+        self.sort = features[0].sort
+        self.outputs = [c for f in features for c in f.outputs]
+        self.inputs = sorted(set(c for f in features for c in f.inputs))
+
+    def name(self):
+        if self.group is None:
+            return self.features[0].name
+        return '{} {} ({})'.format(self.group[0], self.group[1], ', '.join(str(f.param) for f in self.features))
+
+    def cost(self, shared=True):
+        """Relative cost per row, the sort being paid once when <shared> or by each feature otherwise.
+        """
+        sorts = 0 if self.sort is None else (1 if shared else len(self.features))
+        return sorts * SORT_COST + sum(f.cost for f in self.features)
+
+
+class FeatureGraph:
+    """Registry of feature methods decorated with utils.decorators.compute_or_skip, whose declared feature names,
+    inputs and cost make the nodes of the graph, and planner of the features to compute for a set of columns.
+
+    graph = FeatureGraph()
+    graph.add(FeatureConstructor.add_target)
+    graph.add(FeatureConstructor.add_horse_last_race, group=('history', 'horse'), param='last_race',
+              sort=['horse_id', 'date'])
+    graph.kernel('history', FeatureConstructor.history_kernel)    # history features of all groups {entity: kinds}
+    plan = graph.plan(features.columns, ['horse_last_race'])
+    plan.explain(len(features))
+    features = plan.run(features)
+
+    """
+
+    def __init__(self):
+        self.features = OrderedDict()
+        # column: name of the feature computing it
+        self.producers = {}
+        # kernel name: function of (features, {key: params of the group features}, n_jobs) to the new columns of
+        # every group of a stage, which share the kernel call
+        self.kernels = {}
+
+    def add(self, method, group=None, param=None, sort=None):
+        outputs = method.feature_names() if callable(method.feature_names) else method.feature_names
+        inputs = method.inputs() if callable(method.inputs) else method.inputs
+        if inputs is None:
+            raise ValueError('Feature method {} must declare its inputs'.format(method.__name__))
+        feature = Feature(method.__name__, method, outputs, inputs, method.cost, group, param, sort)
+        for column in feature.outputs:
+            if column in self.producers:
+                raise ValueError('Column {} is computed by {} and {}'.format(
+                    column, self.producers[column], feature.name
+                ))
+            self.producers[column] = feature.name
+        self.features[feature.name] = feature
+        return self
+
+    def kernel(self, name, function):
+        self.kernels[name] = function
+        return self
+
+    def columns(self):
+        return list(self.producers)
+
+    def plan(self, columns, requested=None, force=False):
+        """FeaturePlan computing <requested> columns (all of the graph when None) for a frame of <columns>: the
+        features producing them and, transitively, their missing inputs. Columns already in the frame are kept unless
+        <force>.
+        """
+        available = set(columns)
+        selected = OrderedDict()
+
+        def visit(name, path):
+            if name in path:
+                raise ValueError('Cycle in feature graph: {}'.format(' > '.join(path + [name])))
+            if name in selected:
+                return
+            feature = self.features[name]
+            for column in feature.inputs:
+                if column not in available:
+                    if column not in self.producers:
+                        message = 'Column {} needed by {} is neither in the frame nor computed by a feature'
+                        raise ValueError(message.format(column, name))
+                    visit(self.producers[column], path + [name])
+            selected[name] = feature
+
+        for column in self.columns() if requested is None else requested:
+            if column in available and not force:
+                continue
+            if column not in self.producers:
+                raise ValueError('No feature computes column {}'.format(column))
+            visit(self.producers[column], [])
+
+        # stage of a feature: after the stages of the features computing its inputs
+        levels = {}
+        for name, feature in selected.items():
+            levels[name] = 1 + max(
+                [levels[self.producers[c]] for c in feature.inputs if self.producers.get(c) in selected] + [-1]
+            )
+        stages = []
+        for level in range(max(levels.values()) + 1 if levels else 0):
+            tasks = OrderedDict()
+            for name, feature in selected.items():
+                if levels[name] == level:
+                    tasks.setdefault(feature.group or name, []).append(feature)
+            stages.append([Task(features) for features in tasks.values()])
+        # new columns in graph order, whatever the order they are computed in
+        outputs = [c for f in self.features.values() if f.name in selected for c in f.outputs]
+        return FeaturePlan(self, stages, outputs)
+
+
+class FeaturePlan:
+    """Stages of tasks computing features, tasks of a stage being independent. Tasks are given only their input
+    columns and return only new columns, all attached to the frame in a single final step.
+    """
+
+    def __init__(self, graph, stages, outputs):
+        self.graph = graph
+        self.stages = stages
+        self.outputs = outputs
+
+    def cost(self, shared=True):
+        return sum(task.cost(shared) for stage in self.stages for task in stage)
+
+    def explain(self, n_rows=None):
+        """Prints the stages, tasks and estimated costs, relative costs per row in row sorts (and in millions of row
+        sorts for <n_rows> rows).
+        """
+        print('[INFO] Feature plan: {} new columns, {} tasks in {} stages'.format(
+            len(self.outputs), sum(len(stage) for stage in self.stages), len(self.stages)
+        ))
+        print('[INFO] Estimated cost per row: {} ({} without shared sorts){}'.format(
+            round(self.cost(), 2),
+            round(self.cost(shared=False), 2),
+            '' if n_rows is None else ', {}M for {} rows'.format(round(self.cost() * n_rows / 1e6, 2), n_rows),
+        ))
+        for i, stage in enumerate(self.stages):
+            print('[INFO] Stage {}{}:'.format(i + 1, ', in parallel' if len(stage) > 1 else ''))
+            for task in stage:
+                print('[INFO]   {} - cost {}{} - {} > {}'.format(
+                    task.name(),
+                    round(task.cost(), 2),
+                    '' if task.sort is None else ', one sort by {}'.format(' / '.join(task.sort)),
+                    ', '.join(task.inputs),
+                    ', '.join(task.outputs),
+                ))
+
+    @log_execution_time('Computing planned features')
+    def run(self, features, n_jobs=1):
+        """<features> with the planned columns. Features of a stage computed by the same kernel are given to it in a
+        single call along with <n_jobs> (e.g. EntityHistory processes), other tasks of the stage running on <n_jobs>
+        threads. Group features go through the FeatureCache like direct calls of their methods: cached ones are
+        loaded instead of computed, computed ones are kept. The result has a fresh RangeIndex, like the methods give.
+        """
+        computed = {}
+
+        def frame(columns):
+            return pd.DataFrame(
+                {c: computed[c] if c in computed else features[c].values for c in columns}, columns=columns
+            )
+
+        def run_task(task):
+            result = task.features[0].method(frame(task.inputs))
+            # positional values, whatever the index of the result
+            return {c: np.asarray(result[c]) for c in task.outputs}
+
+        def run_kernel(name, tasks):
+            groups, keys = OrderedDict(), {}
+            for task in tasks:
+                for feature in task.features:
+                    keys[feature.name], columns, _ = feature.method.lookup(frame(feature.inputs))
+                    if columns is not None:
+                        print('[INFO] Feature(s) of {} loaded from cache.'.format(feature.name))
+                        computed.update((c, columns[c].values) for c in feature.outputs)
+                    else:
+                        groups.setdefault(task.group[1], []).append(feature)
+            if not groups:
+                return
+            inputs = sorted(set(c for group in groups.values() for f in group for c in f.inputs))
+            params = OrderedDict((key, [f.param for f in group]) for key, group in groups.items())
+            message = 'Computing {} features of {}'.format(name, ', '.join(str(key) for key in groups))
+            result = log_execution_time(message)(self.graph.kernels[name])(frame(inputs), params, n_jobs)
+            for group in groups.values():
+                for feature in group:
+                    columns = {c: np.asarray(result[c]) for c in feature.outputs}
+                    computed.update(columns)
+                    if keys[feature.name] is not None:
+                        feature.method.store(keys[feature.name], pd.DataFrame(columns, columns=feature.outputs))
+
+        pool = ThreadPool(n_jobs) if n_jobs > 1 else None
+        try:
+            for stage in self.stages:
+                kernels = OrderedDict()
+                for task in stage:
+                    if task.group is not None:
+                        kernels.setdefault(task.group[0], []).append(task)
+                tasks = [task for task in stage if task.group is None]
+                results = pool.map(run_task, tasks) if pool is not None and len(tasks) > 1 else map(run_task, tasks)
+                for columns in results:
+                    computed.update(columns)
+                for name, kernel_tasks in kernels.items():
+                    run_kernel(name, kernel_tasks)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if not self.outputs:
+            return fresh_index(features)
+        new = pd.DataFrame({c: computed[c] for c in self.outputs}, columns=self.outputs)
+        kept = features[[c for c in features.columns if c not in computed]].reset_index(drop=True)
+        return pd.concat([kept, new], axis=1)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from lib.entity_history import ENTITIES
+from lib.entity_history import EntityHistory
+from utils import grouped
+
+
+class EntityState:
+    """Running history of every known id of one entity, one row per id:
+    date of the last race day, total wins and races up to that day (included), races on that day and a ring buffer of
+    wins on the last <depth> race days (most recent last).
+    """
+
+    def __init__(self, depth, ids=None, last_date=None, wins=None, races=None, last_races=None, ring=None):
+        self.depth = depth
+        self.ids = pd.Index([] if ids is None else ids)
+        n = len(self.ids)
+        self.last_date = np.full(n, np.datetime64('NaT'), dtype='datetime64[ns]') if last_date is None else last_date
+        self.wins = np.zeros(n) if wins is None else wins
+        self.races = np.zeros(n) if races is None else races
+        self.last_races = np.zeros(n) if last_races is None else last_races
+        self.ring = np.zeros((n, depth)) if ring is None else ring
+
+    def arrays(self):
+        return {
+            'ids': np.asarray(self.ids),
+            'last_date': self.last_date,
+            'wins': self.wins,
+            'races': self.races,
+            'last_races': self.last_races,
+            'ring': self.ring,
+        }
+
+    def extend(self, ids):
+        """State with rows (zeros) appended for <ids> not known yet.
+        """
+        new = pd.Index(ids).unique().difference(self.ids)
+        if not len(new):
+            return self
+        grown = EntityState(self.depth, self.ids.append(new))
+        n = len(self.ids)
+        for name, values in self.arrays().items():
+            if name != 'ids':
+                getattr(grown, name)[:n] = values
+        return grown
+
+
+class FeatureStore:
+    """Persistent per-entity state to compute history features (race counts, last race and last n races results) of
+    new races in O(new rows), without going over the full history again. Values are the same as the ones
+    EntityHistory (i.e. FeatureConstructor.add_all_features) would compute on the full history.
+
+    store = FeatureStore().update(history)    # history with target
+    store.transform(upcoming_races)           # features of new races, before results are known
+    store.update(results)                     # once results are in
+    store.save('store.npz'); FeatureStore.load('store.npz')
+
+    Races can be featurized on the last race day of the store or later, not before. Results must be added in date
+    order, results of the last race day can still be completed.
+    """
+
+    def __init__(self, entities=ENTITIES, windows=None, target='target'):
+        self.history = EntityHistory(entities, windows, kinds=['race_counts', 'last_race', 'last_n_races'])
+        self.entities = self.history.entities
+        self.windows = self.history.windows
+        self.target = target
+        self.depth = max(list(self.windows.values()) + [1]) + 1
+        self.states = {entity: EntityState(self.depth) for entity in self.entities}
+
+    def columns(self):
+        return self.history.columns()
+
+    def compute(self, features):
+        """History features of <features> rows from the current state, aligned by position with <features>.
+        """
+        computed = {}
+        for entity in self.entities:
+            computed.update(self.compute_entity(features, entity))
+        return pd.DataFrame(computed, columns=self.columns())
+
+    def transform(self, features):
+        new = self.compute(features)
+        kept = features[[c for c in features.columns if c not in new.columns]].reset_index(drop=True)
+        return pd.concat([kept, new], axis=1)
+
+    def compute_entity(self, features, entity):
+        state = self.states[entity]
+        ids = features['{}_id'.format(entity)].values
+        dates = pd.to_datetime(features['date'].values).values
+        # unknown ids (-1) pick an extra zero row, i.e. an entity with no history
+        positions = state.ids.get_indexer(ids)
+        last_date = np.append(state.last_date, np.datetime64('NaT'))[positions]
+        if (dates < last_date).any():
+            raise ValueError('Cannot compute {} history features before the last race day of the store'.format(entity))
+        same_day = dates == last_date
+        ring = np.vstack([state.ring, np.zeros((1, self.depth))])[positions]
+        # state before the race day of each row: the last ring slot is dropped when the row is on the last race day
+        window_end = np.where(same_day, self.depth - 1, self.depth)
+        last_races = np.append(state.last_races, 0.)[positions]
+        wins = np.append(state.wins, 0.)[positions] - np.where(same_day, ring[:, -1], 0.)
+        races = np.append(state.races, 0.)[positions] - np.where(same_day, last_races, 0.)
+
+        values = {
+            '{}_n_wins'.format(entity): np.sqrt(wins),
+            '{}_n_races'.format(entity): np.sqrt(races),
+            '{}_last_race'.format(entity): ring[np.arange(len(ids)), window_end - 1],
+        }
+        slots = np.arange(self.depth)[None, :]
+        for suffix, window in self.windows.items():
+            in_window = (slots < window_end[:, None]) & (slots >= window_end[:, None] - window)
+            values['{}_last_{}_races'.format(entity, suffix)] = np.where(in_window, ring, 0.).sum(axis=1)
+
+        valid = ~pd.isnull(ids) & ~pd.isnull(dates)
+        for column in values:
+            values[column] = np.where(valid, values[column], np.nan)
+        return values
+
+    def update(self, features):
+        """Adds race results (rows of <features> with target) to the state.
+        """
+        for entity in self.entities:
+            self.states[entity] = self.update_entity(self.states[entity], features, entity)
+        return self
+
+    def update_entity(self, state, features, entity):
+        ids = features['{}_id'.format(entity)].values
+        rows, (id_codes, date_codes) = grouped.sort_by_keys(ids, features['date'].values)
+        if not len(rows):
+            return state
+        target = np.nan_to_num(features[self.target].values[rows].astype(np.float64))
+        day_starts = grouped.group_starts(id_codes, date_codes)
+        day = grouped.group_index(day_starts)
+        day_wins = np.bincount(day, weights=target)
+        day_races = np.bincount(day).astype(np.float64)
+        day_ids = ids[rows][day_starts]
+        day_dates = pd.to_datetime(features['date'].values[rows][day_starts]).values
+
+        state = state.extend(day_ids)
+        positions = state.ids.get_indexer(day_ids)
+        last_date = state.last_date[positions]
+        if (day_dates < last_date).any():
+            raise ValueError('Cannot add {} results older than the last race day of the store'.format(entity))
+
+        # results completing the last race day of the state
+        same_day = day_dates == last_date
+        same = positions[same_day]
+        state.ring[same, -1] += day_wins[same_day]
+        state.last_races[same] += day_races[same_day]
+
+        # new race days, each entity ring is shifted by its number of new days then filled with them
+        new = positions[~same_day]
+        wins, races, dates = day_wins[~same_day], day_races[~same_day], day_dates[~same_day]
+        n_new = np.bincount(new, minlength=len(state.ids))
+        touched = np.flatnonzero(n_new)
+        source = np.arange(self.depth)[None, :] + n_new[touched][:, None]
+        state.ring[touched] = np.where(
+            source < self.depth,
+            state.ring[touched[:, None], np.minimum(source, self.depth - 1)],
+            0.,
+        )
+        if len(new):
+            # entity days are contiguous and sorted by date: rank from the last day of the entity gives the ring slot
+            ends = np.r_[new[1:] != new[:-1], True]
+            last_of_group = np.flatnonzero(ends)[grouped.group_index(np.r_[True, ends[:-1]])]
+            slot = self.depth - 1 - (last_of_group - np.arange(len(new)))
+            kept = slot >= 0
+            state.ring[new[kept], slot[kept]] = wins[kept]
+            state.last_date[new[ends]] = dates[ends]
+            state.last_races[new[ends]] = races[ends]
+
+        state.wins += np.bincount(positions, weights=day_wins, minlength=len(state.ids))
+        state.races += np.bincount(positions, weights=day_races, minlength=len(state.ids))
+        return state
+
+    def save(self, path):
+        arrays = {
+            '{}.{}'.format(entity, name): values
+            for entity, state in self.states.items()
+            for name, values in state.arrays().items()
+        }
+        arrays['config'] = np.array(json.dumps({
+            'entities': self.entities,
+            'windows': list(self.windows.items()),
+            'target': self.target,
+        }))
+        with open(path, 'wb') as stream:
+            np.savez(stream, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as arrays:
+            config = json.loads(str(arrays['config']))
+            store = cls(config['entities'], dict(config['windows']), config['target'])
+            for entity in store.entities:
+                store.states[entity] = EntityState(
+                    store.depth,
+                    **{name: arrays['{}.{}'.format(entity, name)] for name in EntityState(1).arrays()}
+                )
+        return store
@@ -6,12 +6,18 @@ from __future__ import unicode_literals
 
 import numpy as np
 import pandas as pd
-from datetime import timedelta
-
-from mlencoders.target_encoder import TargetEncoder
-from mlencoders.weight_of_evidence_encoder import WeightOfEvidenceEncoder
 
+from lib.encoders import TargetEncoder
+from lib.encoders import WeightOfEvidenceEncoder
+from lib.transform_plan import DEFAULT_TRANSFORM
+from lib.transform_plan import TransformPlan
+from lib.walk_forward import WalkForward
+from utils import schema
 from utils.decorators import log_execution_time
+from utils.grouped import group_mean
+from utils.grouped import group_rank_pct
+from utils.grouped import group_starts
+from utils.grouped import sort_by_keys
 
 
 # Variables to be excluded from features, typically IDs and the target itself
@@ -20,9 +26,10 @@ EXCLUDED_COLUMNS = [
     'other_id',
     'target',
 ]
+# (transform name, fill value of missing values or None) from lib.transform_plan.TRANSFORMS, or a function of a Series
 DATA_TRANSFORMS = {
-    'column1':   lambda f: np.log(f.fillna(1)),
-    'column2':   np.log,
+    'column1':   ('log', 1),
+    'column2':   ('log', None),
 }
 
 
@@ -31,13 +38,25 @@ class FeatureTransformer:
     @classmethod
     @log_execution_time('Splitting train / test sets')
     def split(cls, features, test_date, test_duration):
-        columns = features.columns.difference(['target'])
-        X_train = features[features['date'] < test_date].copy()
-        X_test = features[
-            (features['date'] >= test_date) &
-            (features['date'] < test_date + timedelta(test_duration))
-        ].copy()
-        return X_train[columns], X_train['target'], X_test[columns], X_test['target']
+        train, test = next(WalkForward(features['date']).folds([test_date], test_duration, slices=False))
+        # rows in their original order
+        return cls.fold(features, np.sort(train)) + cls.fold(features, np.sort(test))
+
+    @classmethod
+    def walk_forward(cls, features, test_dates, test_duration, train_duration=None, gap=0):
+        """(X_train, Y_train, X_test, Y_test) of each of <test_dates>, see lib.walk_forward.WalkForward.
+        Rows are sorted by date once for all folds, folds being views of <features> when it is sorted by date.
+        """
+        walk = WalkForward(features['date'])
+        for train, test in walk.folds(test_dates, test_duration, train_duration=train_duration, gap=gap):
+            yield cls.fold(features, train) + cls.fold(features, test)
+
+    @classmethod
+    def fold(cls, features, rows):
+        """(X, Y) of <rows>, positions or slice, feature columns being taken at once.
+        """
+        columns = features.columns.get_indexer(features.columns.difference(['target']))
+        return features.iloc[rows, columns], features['target'].iloc[rows]
 
     @classmethod
     @log_execution_time('Stripping columns unused in model')
@@ -46,35 +65,60 @@ class FeatureTransformer:
 
     @classmethod
     def get_transform(cls, feature):
-        return DATA_TRANSFORMS.get(feature, lambda f: f.fillna(0))
+        return DATA_TRANSFORMS.get(feature, DEFAULT_TRANSFORM)
+
+    @classmethod
+    def transform_plan(cls, features, dtype=None):
+        """Transforms of <features> columns, compiled once to be reused by process on train and test sets. Float
+        columns are <dtype>, by default float32 when compact dtypes are enabled (utils.schema) and float64 otherwise.
+        """
+        dtype = schema.float_dtype() if dtype is None else dtype
+        return TransformPlan.fit(features, DATA_TRANSFORMS, excluded=EXCLUDED_COLUMNS, dtype=dtype)
 
     @classmethod
     @log_execution_time('Transforming columns')
-    def process(cls, features):
-        processed = features.copy()
-        for fea in processed.columns.difference(EXCLUDED_COLUMNS):
-            processed[fea] = cls.get_transform(fea)(processed[fea])
-        return processed
+    def process(cls, features, plan=None, inplace=False, dtype=None):
+        """Transformed <features>, by <plan> or a plan fitted on them (with float <dtype>, see transform_plan).
+        <inplace> modifies <features> instead of building a new frame.
+        """
+        plan = cls.transform_plan(features, dtype) if plan is None else plan
+        return plan.apply(features, inplace=inplace)
 
     @classmethod
     @log_execution_time('Target encoding')
-    def target_encoding(cls, X, Y=None, encoder=None):
+    def target_encoding(cls, X, Y=None, encoder=None, n_folds=None, n_jobs=1):
+        """Target encoded ids, by a new encoder fitted on (X, Y) when no <encoder> is given: in-sample, or out-of-fold
+        with <n_folds> folds so that a row target doesn't leak into its own encoding (see lib.encoders). A given
+        <encoder> is only applied, never refitted (Y is ignored), so that test targets don't leak into encodings.
+        """
         cols = ['some_id', 'other_id']
         if encoder is None:
-            encoder = TargetEncoder(cols=cols, min_samples=5, smoothing=5)
-            encoder.fit(X, Y)
-        encoded = encoder.transform(X).rename(columns={c: 'tgt_enc_{}'.format(c) for c in cols})
-        return pd.concat([X[cols], encoded], axis=1), encoder
+            encoder = TargetEncoder(cols, min_samples=5, smoothing=5)
+            return cls.encode(X, encoder, 'tgt_enc_', Y, n_folds, n_jobs), encoder
+        return cls.encode(X, encoder, 'tgt_enc_'), encoder
 
     @classmethod
     @log_execution_time('WOE encoding')
-    def woe_encoding(cls, X, Y=None, encoder=None):
+    def woe_encoding(cls, X, Y=None, encoder=None, n_folds=None, n_jobs=1):
+        """WOE encoded ids, fitted and applied like target_encoding.
+        """
         cols = ['some_id', 'other_id']
         if encoder is None:
-            encoder = WeightOfEvidenceEncoder(cols=cols, min_samples=5)
-            encoder.fit(X, Y)
-        encoded = encoder.transform(X).rename(columns={c: 'woe_enc_{}'.format(c) for c in cols})
-        return pd.concat([X[cols], encoded], axis=1), encoder
+            encoder = WeightOfEvidenceEncoder(cols, min_samples=5)
+            return cls.encode(X, encoder, 'woe_enc_', Y, n_folds, n_jobs), encoder
+        return cls.encode(X, encoder, 'woe_enc_'), encoder
+
+    @classmethod
+    def encode(cls, X, encoder, prefix, Y=None, n_folds=None, n_jobs=1):
+        """Encoded columns of X, prefixed with <prefix>, next to the original ones. <encoder> is fitted on (X, <Y>)
+        first when <Y> is given, otherwise it must be fitted already.
+        """
+        if Y is not None:
+            encoded = encoder.fit_transform(X, Y, n_folds=n_folds, n_jobs=n_jobs)
+        else:
+            encoded = encoder.transform(X)
+        encoded.columns = [prefix + c for c in encoded.columns]
+        return pd.concat([X[encoder.cols], encoded], axis=1)
 
     @classmethod
     @log_execution_time('Min-Max scaling')
@@ -87,30 +131,49 @@ class FeatureTransformer:
         return (features - feature_min) / (feature_max - feature_min), feature_min, feature_max
 
     @classmethod
-    def add_race_normalized_features(cls, features):
-        return pd.concat(
-            [
-                features,
-                cls.race_gap(features),
-                cls.race_rank(features),
-            ],
-            axis=1
-        )
+    def add_race_normalized_features(cls, features, columns=None):
+        return pd.concat([features, cls.race_normalized(features, columns=columns)], axis=1, copy=False)
+
+    @classmethod
+    def race_normalized(cls, features, columns=None, gap=True, rank=True):
+        """Gap to the category average (category_avg_<column>) and percentile rank in the category
+        (category_rank_<column>) of every feature, or of <columns> only.
+        Rows are sorted by category once, both statistics computed for all columns at once on the sorted block and
+        written to a single preallocated output block. Rows without category get NaN, like with pandas groupby.
+        Statistics are computed in float64, the output block being float32 when compact dtypes are enabled.
+        """
+        if columns is None:
+            columns = features.columns.difference(EXCLUDED_COLUMNS + ['category_id'])
+        columns = list(columns)
+        positions, (codes,) = sort_by_keys(features['category_id'].values)
+        starts = group_starts(codes)
+        # sorted row of each row, rows without category pointing past the end where a NaN is appended
+        rows = np.full(len(features), len(positions), dtype=np.int64)
+        rows[positions] = np.arange(len(positions))
+        values = np.empty((len(positions), len(columns)), dtype=np.float64, order='F')
+        for i, column in enumerate(columns):
+            values[:, i] = features[column].values[positions]
+
+        names, stats = [], []
+        if gap:
+            names += ['category_avg_' + c for c in columns]
+            stats.append(lambda: values - group_mean(values, starts))
+        if rank:
+            names += ['category_rank_' + c for c in columns]
+            stats.append(lambda: group_rank_pct(values, starts))
+        normalized = np.empty((len(features), len(names)), dtype=schema.float_dtype(), order='F')
+        for i, stat in enumerate(stats):
+            block = stat()
+            for j in range(len(columns)):
+                np.take(np.append(block[:, j], np.nan), rows, out=normalized[:, i * len(columns) + j])
+        return pd.DataFrame(normalized, index=features.index, columns=names, copy=False)
 
     @classmethod
     @log_execution_time('Gap to category average')
-    def race_gap(cls, features):
-        cols = features.columns.difference(EXCLUDED_COLUMNS)
-        avg_features = features[cols.insert(0, 'category_id')]
-        avg_features = avg_features[cols] - avg_features.groupby('category_id').transform('mean')
-        avg_features.columns = ['category_avg_' + c for c in avg_features.columns]
-        return avg_features
+    def race_gap(cls, features, columns=None):
+        return cls.race_normalized(features, columns=columns, rank=False)
 
     @classmethod
     @log_execution_time('Rank of features in category')
-    def race_rank(cls, features):
-        cols = features.columns.difference(EXCLUDED_COLUMNS)
-        rank_features = features[cols.insert(0, 'category_id')]
-        rank_features = rank_features.groupby('category_id').rank(pct=True)
-        rank_features.columns = ['category_rank_' + c for c in rank_features.columns]
-        return rank_features
+    def race_rank(cls, features, columns=None):
+        return cls.race_normalized(features, columns=columns, gap=False)
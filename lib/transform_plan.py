@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+# Named column transforms, as in-place numpy ufuncs (None leaves values as is)
+TRANSFORMS = {
+    'identity': None,
+    'log': np.log,
+    'log1p': np.log1p,
+    'sqrt': np.sqrt,
+}
+# (transform name, value missing values are filled with first or None to keep them)
+DEFAULT_TRANSFORM = ('identity', 0)
+
+
+class TransformPlan:
+    """Columns of a frame grouped by transform, compiled once (typically on the train set) and applied as is to any
+    frame with the same columns (the test set), so both go through the same path.
+
+    Numeric columns to transform are copied once into a single 2D float block, each group of columns sharing a
+    transform being then filled and transformed by one in-place numpy operation over the whole block. Columns without
+    possible missing values under the default transform (integers, booleans) are passed through untouched, callable
+    transforms and non-numeric columns fall back to a per-column call.
+
+    plan = TransformPlan.fit(x_train, transforms, excluded, dtype=np.float32)
+    x_train = plan.apply(x_train, inplace=True)
+    x_test = plan.apply(x_test)
+
+    """
+
+    def __init__(self, columns, block_columns, groups, fallbacks, dtype=np.float64):
+        self.columns = list(columns)
+        self.block_columns = list(block_columns)
+        # (transform name, fill value, boolean mask of the block columns in the group)
+        self.groups = groups
+        # column: callable or (name, fill) transform of columns out of the block, None to pass them through
+        self.fallbacks = fallbacks
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def fit(cls, features, transforms, excluded=(), default=DEFAULT_TRANSFORM, dtype=np.float64):
+        """Plan for <features>, each column transformed by its <transforms> entry or <default>, <excluded> columns
+        being passed through.
+        """
+        specs = OrderedDict()
+        fallbacks = {}
+        for column in features.columns:
+            transform = default if column not in transforms else transforms[column]
+            kind = features[column].dtype.kind
+            if column in excluded:
+                fallbacks[column] = None
+            elif callable(transform) or kind not in 'biuf' or (kind != 'f' and transform == default):
+                fallbacks[column] = transform
+            elif transform[0] not in TRANSFORMS:
+                raise ValueError('Unknown transform {} for column {}'.format(transform[0], column))
+            else:
+                specs[column] = tuple(transform)
+        block_columns = list(specs)
+        groups = [
+            (name, fill, np.array([specs[c] == (name, fill) for c in block_columns]))
+            for name, fill in sorted(set(specs.values()), key=lambda t: (t[0], str(t[1])))
+        ]
+        return cls(features.columns, block_columns, groups, fallbacks, dtype)
+
+    def transform_block(self, block):
+        """Applies the transforms in place to <block>, an array with one column per block column.
+        """
+        missing = np.isnan(block)
+        for name, fill, mask in self.groups:
+            if fill is not None:
+                np.copyto(block, fill, where=missing if mask.all() else missing & mask)
+            function = TRANSFORMS[name]
+            if function is not None:
+                function(block, out=block, where=mask)
+        return block
+
+    def apply(self, features, inplace=False):
+        """Transformed <features>, a new frame or <features> itself modified when <inplace>.
+        """
+        unknown = set(features.columns).symmetric_difference(self.columns)
+        if unknown:
+            raise ValueError('Columns differ from the fitted plan: {}'.format(sorted(unknown)))
+        # Fortran order: each column is contiguous and the block is wrapped by a DataFrame without copy
+        block = np.empty((len(features), len(self.block_columns)), dtype=self.dtype, order='F')
+        for i, column in enumerate(self.block_columns):
+            block[:, i] = features[column].values
+        self.transform_block(block)
+
+        if inplace:
+            processed = features
+            for i, column in enumerate(self.block_columns):
+                processed[column] = block[:, i]
+        else:
+            processed = pd.DataFrame(block, index=features.index, columns=self.block_columns, copy=False)
+        for position, column in enumerate(self.columns):
+            if column not in self.fallbacks:
+                continue
+            original = features[column]
+            values = self._fallback(original, self.fallbacks[column])
+            if not inplace:
+                processed.insert(position, column, values)
+            elif values is not original:
+                processed[column] = values
+        return processed
+
+    def config(self):
+        """The plan as a json serializable dict, see from_config. Callable transforms can't be serialized.
+        """
+        callables = sorted(c for c, transform in self.fallbacks.items() if callable(transform))
+        if callables:
+            raise ValueError('Callable transforms of columns {} can\'t be serialized'.format(callables))
+        return {
+            'columns': self.columns,
+            'block_columns': self.block_columns,
+            'groups': [[name, fill, mask.tolist()] for name, fill, mask in self.groups],
+            'fallbacks': {c: None if t is None else list(t) for c, t in self.fallbacks.items()},
+            'dtype': self.dtype.name,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['columns'],
+            config['block_columns'],
+            [(name, fill, np.array(mask, dtype=bool)) for name, fill, mask in config['groups']],
+            {c: None if t is None else tuple(t) for c, t in config['fallbacks'].items()},
+            config['dtype'],
+        )
+
+    @staticmethod
+    def _fallback(values, transform):
+        if transform is None:
+            return values
+        if callable(transform):
+            return transform(values)
+        name, fill = transform
+        # integers and booleans can't be missing
+        if fill is not None and values.dtype.kind not in 'biu':
+            values = values.fillna(fill)
+        return values if TRANSFORMS[name] is None else TRANSFORMS[name](values)
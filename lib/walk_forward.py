@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+
+class WalkForward:
+    """Walk-forward train / test folds over rows dated by <dates>, sorted once: fold boundaries are then found by
+    binary search and folds are positions of rows, never copies of them.
+
+    For a test date d, test rows are dated in [d, d + test_duration days) and train rows in
+    [d - gap - train_duration days, d - gap days), from the first date when <train_duration> is None (expanding window).
+    Rows with a missing date belong to no fold.
+
+    walk = WalkForward(features['date'])
+    for train, test in walk.folds(test_dates, test_duration=30, train_duration=365, gap=1):
+        model.fit(x[train], y[train])           # x, y numpy arrays, or features.iloc[train]
+
+    """
+
+    def __init__(self, dates):
+        dates = pd.to_datetime(pd.Series(dates)).values
+        valid = np.flatnonzero(~pd.isnull(dates))
+        order = np.argsort(dates[valid], kind='mergesort')
+        # positions of rows sorted by date, and their dates
+        self.order = valid[order]
+        self.dates = dates[self.order]
+        # the rows are already sorted: folds are contiguous and slices can be used instead of positions
+        self.is_sorted = len(self.order) == len(dates) and bool(np.all(self.order[1:] > self.order[:-1]))
+
+    def bounds(self, test_dates, test_duration, train_duration=None, gap=0):
+        """Ranges of each fold in date order, as arrays of train begin, train end, test begin and test end.
+        """
+        test_dates = pd.to_datetime(pd.Series(test_dates)).values
+        train_end = test_dates - days(gap)
+        train_begin = np.zeros(len(test_dates), dtype=np.int64)
+        if train_duration is not None:
+            train_begin = np.searchsorted(self.dates, train_end - days(train_duration))
+        return (
+            train_begin,
+            np.searchsorted(self.dates, train_end),
+            np.searchsorted(self.dates, test_dates),
+            np.searchsorted(self.dates, test_dates + days(test_duration)),
+        )
+
+    def folds(self, test_dates, test_duration, train_duration=None, gap=0, slices=None):
+        """(train, test) row positions of each fold, as views of the sorted positions, or as slices when <slices>
+        (defaulting to whether rows are sorted by date, slices then index the rows themselves).
+        """
+        slices = self.is_sorted if slices is None else slices
+        if slices and not self.is_sorted:
+            raise ValueError('Rows are not sorted by date, folds can\'t be slices')
+        for train_begin, train_end, test_begin, test_end in zip(
+                *self.bounds(test_dates, test_duration, train_duration, gap)):
+            if slices:
+                yield slice(train_begin, train_end), slice(test_begin, test_end)
+            else:
+                yield self.order[train_begin:train_end], self.order[test_begin:test_end]
+
+
+def days(n):
+    return pd.Timedelta(days=n).to_timedelta64()
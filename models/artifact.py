@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import joblib
+except ImportError:  # scikit-learn < 0.21 bundles it
+    from sklearn.externals import joblib
+
+from lib.encoders import Encoder
+from lib.transform_plan import TransformPlan
+
+
+class Artifact:
+    """Everything needed to score raw feature rows: the column transforms (lib.transform_plan.TransformPlan), id
+    encoders, the columns of the model matrix, min-max scaling bounds and the fitted model, as produced by the
+    training pipeline (FeatureTransformer process, encodings and scale), so that rows are scored the way training rows
+    were transformed. Without <plan>, rows must be transformed already.
+
+    Saved as a directory of files: the model with joblib, its numpy arrays (e.g. forest trees) stored uncompressed to
+    be memory-mapped on load, encoders as npz files and the rest (plan included) as json, so loading takes
+    milliseconds.
+
+    artifact = Artifact(model, matrix.columns, {'tgt_enc_': target_encoder}, feature_min, feature_max, plan)
+    artifact.save('data/artifacts/lr')
+    Artifact.load('data/artifacts/lr').predict(features)
+
+    """
+
+    def __init__(self, model, columns, encoders=None, feature_min=None, feature_max=None, plan=None):
+        self.model = model
+        self.columns = list(columns)
+        # prefix of the encoded columns: encoder
+        self.encoders = encoders or {}
+        # scaling bounds as returned by FeatureTransformer.scale
+        self.feature_min = self._bounds(feature_min)
+        self.feature_max = self._bounds(feature_max)
+        # TransformPlan fitted on the training rows
+        self.plan = plan
+
+    def _bounds(self, values):
+        if values is None:
+            return None
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values, index=self.columns)
+        return values.reindex(self.columns).astype(np.float64)
+
+    def prepare(self, features, inplace=False):
+        """Model matrix of raw <features>: plan columns transformed, encoded ids added, columns selected, missing values
+        set to 0 and scaled. <inplace> lets the plan transform <features> itself when it only has the plan columns.
+        """
+        if self.plan is not None:
+            if list(features.columns) == self.plan.columns:
+                features = self.plan.apply(features, inplace=inplace)
+            else:
+                transformed = self.plan.apply(features[self.plan.columns], inplace=True)
+                features = pd.concat([features[features.columns.difference(self.plan.columns)], transformed], axis=1)
+        columns = {}
+        for prefix, encoder in self.encoders.items():
+            encoded = encoder.transform(features)
+            for col in encoder.cols:
+                columns[prefix + col] = encoded[col].values
+        matrix = np.empty((len(features), len(self.columns)), dtype=np.float64)
+        for i, column in enumerate(self.columns):
+            matrix[:, i] = columns[column] if column in columns else features[column].values
+        matrix[np.isnan(matrix)] = 0.
+        if self.feature_min is not None:
+            matrix -= self.feature_min.values
+            matrix /= (self.feature_max - self.feature_min).values
+        return matrix
+
+    def predict(self, features):
+        return self.model.predict_proba(self.prepare(features))
+
+    def save(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        model = self.model
+        if hasattr(model, 'history_'):
+            # training rows kept for incremental updates (LogisticRegression) aren't needed to score
+            model = copy.copy(model)
+            del model.history_
+        joblib.dump(model, os.path.join(path, 'model.joblib'))
+        for i, (prefix, encoder) in enumerate(sorted(self.encoders.items())):
+            encoder.save(os.path.join(path, 'encoder_{}.npz'.format(i)))
+        with open(os.path.join(path, 'meta.json'), 'w') as stream:
+            json.dump({
+                'columns': self.columns,
+                'encoders': sorted(self.encoders),
+                'feature_min': None if self.feature_min is None else self.feature_min.tolist(),
+                'feature_max': None if self.feature_max is None else self.feature_max.tolist(),
+                'plan': None if self.plan is None else self.plan.config(),
+            }, stream)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Artifact saved in <path>, large model arrays being memory-mapped unless not <mmap>.
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as stream:
+            meta = json.load(stream)
+        model = joblib.load(os.path.join(path, 'model.joblib'), mmap_mode='r' if mmap else None)
+        encoders = {
+            prefix: Encoder.load(os.path.join(path, 'encoder_{}.npz'.format(i)))
+            for i, prefix in enumerate(meta['encoders'])
+        }
+        plan = None if meta.get('plan') is None else TransformPlan.from_config(meta['plan'])
+        return cls(model, meta['columns'], encoders, meta['feature_min'], meta['feature_max'], plan)
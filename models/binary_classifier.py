@@ -4,53 +4,107 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from sklearn import metrics
-
 import numpy as np
 import pandas as pd
 
 import json
 
+from utils.hashing import stable_hash
+from utils.metrics import BinaryMetrics
+
+
+# Number of rows training scores are computed on after an incremental update
+SCORE_SAMPLE = 100000
+
+
+def take_rows(x, rows):
+    """Rows of <x>, an array or a DataFrame, at positions <rows>.
+    """
+    return x.iloc[rows] if hasattr(x, 'iloc') else np.asarray(x)[rows]
+
+
+def concat_rows(x, other):
+    """Rows of <x> followed by the rows of <other>, both arrays or both DataFrames.
+    """
+    if hasattr(x, 'iloc'):
+        return pd.concat([x, other], ignore_index=True)
+    return np.concatenate([np.asarray(x), np.asarray(other)])
+
 
 class BinaryClassifier:
 
-    def __init__(self, **kwargs):
+    def __init__(self, n_jobs=-1, **kwargs):
         self.params = kwargs
         self.scores_train = {}
         self.scores_test = {}
         self.sklearn_class = self.__class__.__bases__[-1]
-        self.sklearn_class.__init__(self, n_jobs=-1, **kwargs)
+        if 'n_jobs' in self.sklearn_class().get_params(deep=False):
+            kwargs = dict(kwargs, n_jobs=n_jobs)
+        self.sklearn_class.__init__(self, **kwargs)
+        # part of the signature, hence of get_params, even for models that don't run in parallel (GaussianNB)
+        self.n_jobs = n_jobs
+
+    def fit(self, x, y, score_rows=None):
+        """Full fit on <x, y>, training scores being computed on a sample of <score_rows> rows (all when None).
+        """
+        self.sklearn_class.fit(self, x, y)
+        self.scores_train = self.score_sample(x, y, score_rows)
 
-    def fit(self, x, y):
+    def update(self, x, y, score_rows=SCORE_SAMPLE, **options):
+        """Incremental retrain with the new rows <x, y> only, the rows since the last fit or update, whatever the
+        model (see update_model of each model for <options>). Training scores are computed on a sample of
+        <score_rows> of the new rows.
+        """
+        if not hasattr(self, 'classes_'):
+            return self.fit(x, y, score_rows)
+        self.update_model(x, y, **options)
+        self.scores_train = self.score_sample(x, y, score_rows)
+
+    def update_model(self, x, y):
+        """Full fit on the new rows <x, y>, for models without incremental training.
+        """
         self.sklearn_class.fit(self, x, y)
-        self.scores_train = self.score(y, self.predict_proba(x), train=True)
+
+    def score_sample(self, x, y, size=None):
+        """Training scores on <size> random rows of <x, y>, or on all of them.
+        """
+        if size is not None and size < len(y):
+            rows = np.sort(np.random.RandomState(0).choice(len(y), size, replace=False))
+            x, y = take_rows(x, rows), np.asarray(y)[rows]
+        return self.score(y, self.predict_proba(x), train=True)
 
     def predict_proba(self, x):
         return self.sklearn_class.predict_proba(self, x)[:, 1]
 
-    def score(self, y, probas, train=False):
-        scores = {
-            method.__name__: method(y, probas)
-            for method in [self.roc_auc_score, self.f1_score, self.accuracy_score, self.log_loss]
-        }
+    def score(self, y, probas, train=False, weights=None, thresh=0.5):
+        """Metrics of utils.metrics.METRICS, computed from a single sort of <probas>.
+        """
+        scores = BinaryMetrics(y, probas, weights).scores(thresh)
         if not train:
             self.scores_test = scores
         return scores
 
+    def score_by_group(self, y, probas, groups, weights=None, thresh=0.5):
+        """DataFrame of metrics per value of <groups> (e.g. category_id), from the same single sort.
+        """
+        return BinaryMetrics(y, probas, weights, groups).table(thresh)
+
     def roc_auc_score(self, y, probas):
-        return metrics.roc_auc_score(y, probas)
+        return BinaryMetrics(y, probas).roc_auc_score()[0]
 
     def f1_score(self, y, probas, thresh=0.5):
-        return metrics.f1_score(y, probas >= thresh)
+        return BinaryMetrics(y, probas).scores(thresh)['f1_score']
 
     def accuracy_score(self, y, probas, thresh=0.5):
-        return metrics.accuracy_score(y, probas >= thresh)
+        return BinaryMetrics(y, probas).scores(thresh)['accuracy_score']
 
     def log_loss(self, y, probas):
-        return metrics.log_loss(y, probas)
+        return BinaryMetrics(y, probas).log_loss()[0]
 
     def hash(self):
-        return hash(json.dumps(self.params, sort_keys=True))
+        """Digest of the model class and params, stable across runs (see utils.hashing.stable_hash).
+        """
+        return stable_hash(self.__class__.__name__, self.params)
 
     def save_results(self):
         """Useful for a grid search for example.
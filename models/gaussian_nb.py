@@ -9,4 +9,8 @@ from models.binary_classifier import BinaryClassifier
 
 
 class GaussianNB(BinaryClassifier, naive_bayes.GaussianNB):
-    pass
+
+    def update_model(self, x, y):
+        """Updates class counts, means and variances with the new rows <x, y> only.
+        """
+        self.partial_fit(x, y)
@@ -4,9 +4,49 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import numpy as np
 from sklearn import linear_model
 from models.binary_classifier import BinaryClassifier
+from models.binary_classifier import concat_rows
+from models.binary_classifier import take_rows
+
+
+# Rows refitted by update at most, the most recent ones
+MAX_ROWS = 1000000
 
 
 class LogisticRegression(BinaryClassifier, linear_model.LogisticRegression):
-    pass
+
+    def fit(self, x, y, score_rows=None, keep_rows=0):
+        """Full fit on <x, y>, see BinaryClassifier.fit. The last <keep_rows> rows are kept to be refitted along with
+        the new rows of the next update, none by default.
+        """
+        BinaryClassifier.fit(self, x, y, score_rows)
+        if hasattr(self, 'history_'):
+            del self.history_
+        if keep_rows:
+            self._keep(x, np.asarray(y), keep_rows)
+
+    def update_model(self, x, y, max_rows=MAX_ROWS):
+        """Fit on the new rows <x, y> and the rows kept from the previous fit and updates, starting from the current
+        coefficients, which needs far fewer iterations than a fit from scratch. At most the last <max_rows> rows are
+        fitted and kept for the next update (a recent window of the history), so memory and time of updates are
+        bounded. liblinear can't warm start and fits from scratch.
+        """
+        y = np.asarray(y)
+        if hasattr(self, 'history_'):
+            x = concat_rows(self.history_[0], x)
+            y = np.concatenate([self.history_[1], y])
+        x, y = self._keep(x, y, max_rows)
+        self.warm_start = True
+        try:
+            linear_model.LogisticRegression.fit(self, x, y)
+        finally:
+            self.warm_start = False
+
+    def _keep(self, x, y, max_rows):
+        if len(y) > max_rows:
+            rows = np.arange(len(y) - max_rows, len(y))
+            x, y = take_rows(x, rows), y[rows]
+        self.history_ = x, y
+        return x, y
@@ -9,4 +9,36 @@ from models.binary_classifier import BinaryClassifier
 
 
 class RandomForestClassifier(BinaryClassifier, ensemble.RandomForestClassifier):
-    pass
+
+    def fit(self, x, y, score_rows=None):
+        # a full fit grows a new forest of the initial size, ages of the previous trees no longer apply
+        if hasattr(self, 'tree_ages'):
+            self.n_estimators = self.initial_size
+            del self.tree_ages, self.initial_size
+        BinaryClassifier.fit(self, x, y, score_rows)
+
+    def update_model(self, x, y, n_trees=None, max_trees=None, max_age=None):
+        """Adds <n_trees> trees (a quarter of the forest by default) trained on the new rows <x, y>, then retires the
+        oldest trees beyond <max_trees> (the initial forest size by default) and trees more than <max_age> updates old.
+        """
+        if not hasattr(self, 'tree_ages'):
+            self.initial_size = len(self.estimators_)
+            self.tree_ages = [0] * len(self.estimators_)
+        n_trees = n_trees if n_trees is not None else max(1, self.initial_size // 4)
+        max_trees = max_trees if max_trees is not None else self.initial_size
+
+        self.warm_start = True
+        self.n_estimators = len(self.estimators_) + n_trees
+        try:
+            ensemble.RandomForestClassifier.fit(self, x, y)
+        finally:
+            self.warm_start = False
+        self.tree_ages = [age + 1 for age in self.tree_ages] + [0] * n_trees
+
+        # trees are kept oldest first
+        keep = len(self.estimators_) - max_trees if len(self.estimators_) > max_trees else 0
+        if max_age is not None:
+            keep = max(keep, sum(age > max_age for age in self.tree_ages))
+        self.estimators_ = self.estimators_[keep:]
+        self.tree_ages = self.tree_ages[keep:]
+        self.n_estimators = len(self.estimators_)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import itertools
+import json
+import os
+import sqlite3
+from datetime import datetime
+from multiprocessing import Pool
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from utils.feature_cache import FeatureCache
+from utils.hashing import stable_hash
+from utils.shared import SharedArrays
+from utils.shared import attach
+
+
+SEARCH_DB = os.path.dirname(os.path.realpath(__file__)) + '/../data/search.sqlite'
+# Share of the training rows candidates are first fitted on when early stopping
+SAMPLE_RATIO = 0.2
+
+
+def dataset_fingerprint(*arrays):
+    return stable_hash([FeatureCache.fingerprint(np.asarray(a).ravel()) for a in arrays])
+
+
+def candidates(grid):
+    """(model class, params) of every combination of <grid>: {model class: {param: [values]}}.
+    """
+    for model_class, space in grid.items():
+        names = sorted(space)
+        for values in itertools.product(*[space[name] for name in names]):
+            yield model_class, dict(zip(names, values))
+
+
+class ResultStore:
+    """Search results in a sqlite table, one row per (model, params, dataset) key.
+    """
+
+    def __init__(self, path=SEARCH_DB):
+        if not os.path.isdir(os.path.dirname(os.path.realpath(path))):
+            os.makedirs(os.path.dirname(os.path.realpath(path)))
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, model TEXT, params TEXT, dataset TEXT, status TEXT, '
+            'scores_train TEXT, scores_test TEXT, fit_time REAL, created TEXT)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS results_dataset ON results (dataset, model)')
+        self.connection.commit()
+
+    def keys(self, dataset):
+        return {row[0] for row in self.connection.execute('SELECT key FROM results WHERE dataset = ?', (dataset,))}
+
+    def add(self, key, model, params, dataset, status, scores_train, scores_test, fit_time):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, model, json.dumps(params, sort_keys=True), dataset, status, json.dumps(scores_train),
+             json.dumps(scores_test), fit_time, datetime.now().isoformat()),
+        )
+        self.connection.commit()
+
+    def results(self, dataset=None):
+        """DataFrame of results, one column per test score.
+        """
+        query = 'SELECT * FROM results' + (' WHERE dataset = ?' if dataset is not None else '')
+        results = pd.read_sql(query, self.connection, params=(dataset,) if dataset is not None else None)
+        scores = pd.DataFrame([json.loads(s) for s in results['scores_test']], index=results.index)
+        return pd.concat([results.drop(['scores_train', 'scores_test'], axis=1), scores], axis=1)
+
+    def close(self):
+        self.connection.close()
+
+
+class Search:
+    """Grid search over BinaryClassifier models, evaluated on a test set, on a pool of <n_jobs> processes.
+
+    Train and test sets are shared with workers as memory-mapped files instead of being pickled to each of them.
+    Results are stored in a sqlite ResultStore keyed by a stable hash of the model, its params and a fingerprint of
+    the data, so an interrupted search resumes where it stopped and configs already evaluated are skipped.
+    With <early_stopping>, candidates are first fitted on SAMPLE_RATIO of the training rows, and those whose
+    <metric> is worse than the best sampled one by more than <early_stopping> are not fitted on all rows.
+
+    search = Search(n_jobs=4, early_stopping=0.02)
+    search.run({LogisticRegression: {'C': [0.1, 1, 10]}, RandomForestClassifier: {'max_depth': [5, 10]}},
+               x_train, y_train, x_test, y_test)
+    search.best()
+
+    """
+
+    def __init__(self, path=SEARCH_DB, n_jobs=1, metric='roc_auc_score', greater_is_better=True,
+                 early_stopping=None):
+        self.store = ResultStore(path)
+        self.n_jobs = n_jobs
+        self.metric = metric
+        self.sign = 1 if greater_is_better else -1
+        self.early_stopping = early_stopping
+        self.dataset = None
+
+    def run(self, grid, x_train, y_train, x_test, y_test):
+        arrays = [np.asarray(a, dtype=np.float64) for a in (x_train, y_train, x_test, y_test)]
+        self.dataset = dataset_fingerprint(*arrays)
+        done = self.store.keys(self.dataset)
+        todo = [
+            (key, model_class, params)
+            for key, model_class, params in (
+                (stable_hash(c.__name__, p, self.dataset), c, p) for c, p in candidates(grid)
+            )
+            if key not in done
+        ]
+        print('[INFO] Search: {} candidates to evaluate, {} already done'.format(len(todo), len(done)))
+        if not todo:
+            return self.results()
+
+        with SharedArrays() as shared:
+            handles = [shared.share(name, a) for name, a in zip(['x_train', 'y_train', 'x_test', 'y_test'], arrays)]
+            pool = Pool(self.n_jobs) if self.n_jobs > 1 else None
+            try:
+                if self.early_stopping is not None:
+                    todo = self._screen(pool, todo, handles, len(arrays[1]))
+                self._evaluate(pool, todo, handles, None, 'done')
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+        return self.results()
+
+    def _screen(self, pool, todo, handles, n_rows):
+        """Candidates worth fitting on all rows, the others being stored as stopped.
+        """
+        sampled = self._evaluate(pool, todo, handles, int(n_rows * SAMPLE_RATIO), None)
+        best = max(self.sign * r['scores_test'][self.metric] for r in sampled.values())
+        kept = []
+        for key, model_class, params in todo:
+            result = sampled[key]
+            if self.sign * result['scores_test'][self.metric] < best - self.early_stopping:
+                self.store.add(key, model_class.__name__, params, self.dataset, 'stopped', result['scores_train'],
+                               result['scores_test'], result['fit_time'])
+            else:
+                kept.append((key, model_class, params))
+        print('[INFO] Search: {} of {} candidates stopped early'.format(len(todo) - len(kept), len(todo)))
+        return kept
+
+    def _evaluate(self, pool, todo, handles, n_rows, status):
+        """Fits and scores <todo> candidates on <n_rows> training rows (all when None), storing results when
+        <status> is given.
+        """
+        tasks = [(key, model_class, params, handles, n_rows) for key, model_class, params in todo]
+        results = pool.imap_unordered(_evaluate, tasks) if pool is not None else (_evaluate(t) for t in tasks)
+        classes = {key: (model_class, params) for key, model_class, params in todo}
+        evaluated = {}
+        for i, result in enumerate(results):
+            evaluated[result['key']] = result
+            if status is not None:
+                model_class, params = classes[result['key']]
+                self.store.add(result['key'], model_class.__name__, params, self.dataset, status,
+                               result['scores_train'], result['scores_test'], result['fit_time'])
+            print('[INFO] > {}/{} {} {} - {} {:.4f} - {}s'.format(
+                i + 1, len(tasks), classes[result['key']][0].__name__, classes[result['key']][1], self.metric,
+                result['scores_test'][self.metric], round(result['fit_time'], 2)
+            ))
+        return evaluated
+
+    def results(self):
+        return self.store.results(self.dataset)
+
+    def best(self):
+        """Result row of the best fully evaluated candidate.
+        """
+        results = self.results()
+        results = results[results['status'] == 'done']
+        return results.loc[(self.sign * results[self.metric]).idxmax()]
+
+
+def _evaluate(task):
+    key, model_class, params, handles, n_rows = task
+    x_train, y_train, x_test, y_test = [attach(handle) for handle in handles]
+    if n_rows is not None and n_rows < len(y_train):
+        rows = np.sort(np.random.RandomState(0).choice(len(y_train), n_rows, replace=False))
+        x_train, y_train = x_train[rows], y_train[rows]
+    # candidates run in parallel, each model on a single core
+    model = model_class(n_jobs=1, **params)
+    start = time()
+    model.fit(x_train, y_train)
+    fit_time = time() - start
+    return {
+        'key': key,
+        'scores_train': model.scores_train,
+        'scores_test': model.score(y_test, model.predict_proba(x_test)),
+        'fit_time': fit_time,
+    }
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Local scoring server of a saved models.artifact.Artifact, over HTTP on localhost.
+
+python -m models.server data/artifacts/lr --port 8765
+
+POST /predict  {"columns": ["some_id", ...], "rows": [[...], ...]}  ->  {"probas": [...]}
+
+Rows are raw features, transformed by the artifact like training rows were (see Artifact.prepare).
+GET  /stats    request and row counts, throughput, p50 / p99 latency (ms), mean batch size
+
+Concurrent requests are micro-batched: requests arriving within <max_wait> seconds of each other (up to <max_batch>
+rows) are scored by a single vectorized Artifact.predict call.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import json
+import sys
+import threading
+from collections import deque
+from time import time
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from queue import Empty
+    from queue import Queue
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from Queue import Empty
+    from Queue import Queue
+    from SocketServer import ThreadingMixIn
+
+import numpy as np
+import pandas as pd
+
+from models.artifact import Artifact
+
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 10000
+MAX_WAIT = 0.002
+# Latencies kept for percentiles
+LATENCY_WINDOW = 10000
+
+
+class Request:
+
+    def __init__(self, features):
+        self.features = features
+        self.start = time()
+        self.done = threading.Event()
+        self.probas = None
+        self.error = None
+
+
+class Batcher:
+    """Scores queued requests by batches on a single thread, keeping latency and throughput counters.
+    """
+
+    def __init__(self, artifact, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.artifact = artifact
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = Queue()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        self.started = time()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def predict(self, features):
+        """Probabilities of <features> rows, blocking until their batch is scored.
+        """
+        request = Request(features)
+        self.queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.probas
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        n_rows = len(batch[0].features)
+        deadline = time() + self.max_wait
+        while n_rows < self.max_batch:
+            try:
+                request = self.queue.get(timeout=max(deadline - time(), 0))
+            except Empty:
+                break
+            batch.append(request)
+            n_rows += len(request.features)
+        return batch, n_rows
+
+    def _run(self):
+        while True:
+            batch, _ = self._collect()
+            try:
+                self._score(batch)
+            except Exception:
+                # a faulty request fails alone
+                for request in batch:
+                    try:
+                        self._score([request])
+                    except Exception as error:
+                        request.error = error
+                        with self._lock:
+                            self.counters['errors'] += 1
+            end = time()
+            for request in batch:
+                request.done.set()
+            scored = [r for r in batch if r.error is None]
+            with self._lock:
+                self.latencies.extend(end - r.start for r in scored)
+                self.counters['requests'] += len(scored)
+                self.counters['rows'] += sum(len(r.features) for r in scored)
+                self.counters['batches'] += 1
+
+    def _score(self, batch):
+        if len(batch) == 1:
+            features = batch[0].features
+        else:
+            features = pd.concat([r.features for r in batch], ignore_index=True)
+        probas = self.artifact.predict(features)
+        offset = 0
+        for request in batch:
+            request.probas = probas[offset:offset + len(request.features)]
+            offset += len(request.features)
+
+    def stats(self):
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            stats = dict(self.counters)
+        elapsed = time() - self.started
+        stats.update({
+            'uptime': elapsed,
+            'requests_per_second': stats['requests'] / elapsed,
+            'rows_per_second': stats['rows'] / elapsed,
+            'mean_batch_requests': stats['requests'] / stats['batches'] if stats['batches'] else None,
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        })
+        return stats
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keep-alive connections
+    protocol_version = 'HTTP/1.1'
+    # small responses are sent at once rather than held back until the previous one is acknowledged (Python 3)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._reply(404, {'error': 'unknown path {}'.format(self.path)})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+            features = pd.DataFrame(body['rows'], columns=body['columns'], dtype=np.float64)
+        except (ValueError, KeyError, TypeError) as error:
+            return self._reply(400, {'error': str(error)})
+        try:
+            probas = self.server.batcher.predict(features)
+        except Exception as error:
+            return self._reply(500, {'error': str(error)})
+        self._reply(200, {'probas': probas.tolist()})
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'error': 'unknown path {}'.format(self.path)})
+        self._reply(200, self.server.batcher.stats())
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ScoringServer(ThreadingMixIn, HTTPServer):
+    """HTTP server scoring rows with <artifact>, one thread per connection, predictions micro-batched by a Batcher.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, artifact, port=DEFAULT_PORT, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        HTTPServer.__init__(self, ('127.0.0.1', port), Handler)
+        self.batcher = Batcher(artifact, max_batch, max_wait)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('artifact', help='directory of a saved Artifact')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='rows per batch')
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT, help='seconds waited to fill a batch')
+    args = parser.parse_args(argv)
+
+    start = time()
+    artifact = Artifact.load(args.artifact)
+    print('[INFO] Artifact loaded in {}s'.format(round(time() - start, 3)))
+    server = ScoringServer(artifact, args.port, args.max_batch, args.max_wait)
+    print('[INFO] Scoring on http://127.0.0.1:{}/predict'.format(args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
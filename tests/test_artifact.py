@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.encoders import TargetEncoder
+from lib.feature_transformer import FeatureTransformer
+from models.artifact import Artifact
+from models.logistic_regression import LogisticRegression
+
+
+def make_rows(n_rows, seed=0):
+    random = np.random.RandomState(seed)
+    x = pd.DataFrame({
+        'some_id': random.randint(0, 50, n_rows),
+        'other_id': random.randint(0, 10, n_rows),
+        'column1': random.lognormal(3, 1, n_rows),
+        'column2': random.lognormal(5, 2, n_rows),
+        'column3': random.randn(n_rows),
+        'n_races': random.randint(0, 20, n_rows),
+    })
+    x.loc[random.rand(n_rows) < 0.1, 'column1'] = np.nan
+    x.loc[random.rand(n_rows) < 0.1, 'column3'] = np.nan
+    y = pd.Series((np.log(x['column2']) + random.randn(n_rows) > 5).astype(np.int32))
+    return x, y
+
+
+def test_artifact_scores_raw_rows_like_training_rows(tmpdir):
+    x, y = make_rows(2000)
+    plan = FeatureTransformer.transform_plan(x)
+    encoder = TargetEncoder(['some_id', 'other_id'], min_samples=5, smoothing=5)
+
+    def matrix(rows, fit):
+        rows = FeatureTransformer.process(rows, plan)
+        encoded = encoder.fit_transform(rows, y) if fit else encoder.transform(rows)
+        return pd.concat([FeatureTransformer.strip(rows), encoded.add_prefix('tgt_enc_')], axis=1).fillna(0)
+
+    train, feature_min, feature_max = FeatureTransformer.scale(matrix(x, fit=True))
+    model = LogisticRegression(solver='lbfgs')
+    model.fit(train.values, y.values)
+    Artifact(model, train.columns, {'tgt_enc_': encoder}, feature_min, feature_max, plan).save(str(tmpdir))
+    artifact = Artifact.load(str(tmpdir))
+
+    x_test, _ = make_rows(500, seed=1)
+    test, _, _ = FeatureTransformer.scale(matrix(x_test, fit=False), feature_min, feature_max)
+    expected = model.predict_proba(test.values)
+    np.testing.assert_allclose(artifact.predict(x_test), expected)
+    # columns in another order, along with columns the model doesn't use
+    shuffled = x_test[x_test.columns[::-1]].assign(target=0)
+    np.testing.assert_allclose(artifact.predict(shuffled), expected)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from models.gaussian_nb import GaussianNB
+from models.logistic_regression import LogisticRegression
+from models.random_forest_classifier import RandomForestClassifier
+
+
+def make_rows(n_rows, seed=0):
+    random = np.random.RandomState(seed)
+    x = pd.DataFrame(random.randn(n_rows, 4), columns=['a', 'b', 'c', 'd'])
+    y = (x['a'] + x['b'] + random.logistic(size=n_rows) > 0).astype(np.int32).values
+    return x, y
+
+
+def test_score_sample_takes_rows_of_dataframes():
+    x, y = make_rows(1000)
+    model = LogisticRegression(solver='lbfgs')
+    model.fit(x, y, score_rows=100)
+    scores = model.score_sample(x, y, size=100)
+    assert scores == model.scores_train
+    assert 0.5 < scores['roc_auc_score'] <= 1.
+
+
+def test_update_takes_new_rows_of_dataframes():
+    x, y = make_rows(1200)
+    for model in [LogisticRegression(solver='lbfgs'), GaussianNB(), RandomForestClassifier(n_estimators=8)]:
+        model.fit(x.iloc[:1000], y[:1000])
+        model.update(x.iloc[1000:], y[1000:], score_rows=50)
+        assert model.predict_proba(x).shape == (1200,)
+
+
+def test_logistic_regression_update_refits_on_kept_rows():
+    x, y = make_rows(1200)
+    model = LogisticRegression(solver='lbfgs')
+    model.fit(x.iloc[:1000], y[:1000], keep_rows=1000)
+    model.update(x.iloc[1000:], y[1000:])
+    refitted = LogisticRegression(solver='lbfgs')
+    refitted.fit(x, y)
+    assert len(model.history_[1]) == 1200
+    assert np.allclose(model.coef_, refitted.coef_, atol=1e-3)
+
+
+def test_logistic_regression_keeps_rows_on_request_only():
+    x, y = make_rows(1200)
+    model = LogisticRegression(solver='lbfgs')
+    model.fit(x, y)
+    assert not hasattr(model, 'history_')
+    model.fit(x.iloc[:1000], y[:1000], keep_rows=500)
+    assert len(model.history_[1]) == 500
+    model.update(x.iloc[1000:], y[1000:], max_rows=600)
+    recent = LogisticRegression(solver='lbfgs')
+    recent.fit(x.iloc[600:], y[600:])
+    np.testing.assert_array_equal(model.history_[0].values, x.iloc[600:].values)
+    assert np.allclose(model.coef_, recent.coef_, atol=1e-3)
+    model.fit(x, y)
+    assert not hasattr(model, 'history_')
+
+
+def test_random_forest_fit_resets_tree_ages():
+    x, y = make_rows(600)
+    model = RandomForestClassifier(n_estimators=8, random_state=0)
+    model.fit(x.iloc[:500], y[:500])
+    model.update(x.iloc[500:], y[500:])
+    assert len(model.tree_ages) == 8
+    model.fit(x, y)
+    assert not hasattr(model, 'tree_ages')
+    assert len(model.estimators_) == 8
+    model.update(x.iloc[500:], y[500:], n_trees=4, max_trees=12)
+    assert model.tree_ages == [1] * 8 + [0] * 4
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.encoders import Encoder
+from lib.encoders import TargetEncoder
+from lib.encoders import WeightOfEvidenceEncoder
+
+
+COLS = ['some_id', 'other_id']
+
+
+def make_rows(n_rows=3000, seed=0):
+    random = np.random.RandomState(seed)
+    X = pd.DataFrame({
+        'some_id': random.randint(0, 200, n_rows).astype(np.float64),
+        'other_id': random.randint(0, 30, n_rows),
+    })
+    X.loc[random.rand(n_rows) < 0.05, 'some_id'] = np.nan
+    y = pd.Series((random.rand(n_rows) < 0.3).astype(np.int32))
+    return X, y
+
+
+@pytest.mark.parametrize('name, params', [
+    ('TargetEncoder', {'min_samples': 5, 'smoothing': 5}),
+    ('WeightOfEvidenceEncoder', {'min_samples': 5}),
+])
+def test_matches_mlencoders(name, params):
+    mlencoders = pytest.importorskip('mlencoders.{}'.format(
+        'target_encoder' if name == 'TargetEncoder' else 'weight_of_evidence_encoder'
+    ))
+    X, y = make_rows()
+    X_test, _ = make_rows(500, seed=1)
+    # unseen categories
+    X_test.loc[:20, 'some_id'] = 1000
+    expected = getattr(mlencoders, name)(cols=COLS, **params)
+    expected.fit(X, y)
+    encoder = {'TargetEncoder': TargetEncoder, 'WeightOfEvidenceEncoder': WeightOfEvidenceEncoder}[name](COLS, **params)
+    encoder.fit(X, y)
+    for x in [X, X_test]:
+        np.testing.assert_allclose(encoder.transform(x)[COLS].values, mapped(expected, x))
+
+
+def mapped(encoder, X):
+    """Values of a fitted mlencoders encoder for <X>, as its transform gives them (which fails on recent pandas).
+    """
+    from mlencoders.base_encoder import NAN_CATEGORY
+    return np.column_stack([
+        X[col].fillna(NAN_CATEGORY).map(encoder._mapping[col]['value']).fillna(encoder._imputed).values
+        for col in COLS
+    ])
+
+
+def test_partial_fit_matches_fit():
+    X, y = make_rows()
+    fitted = TargetEncoder(COLS, min_samples=5, smoothing=5).fit(X, y)
+    partial = TargetEncoder(COLS, min_samples=5, smoothing=5)
+    for start in range(0, len(y), 700):
+        partial.partial_fit(X.iloc[start:start + 700], y.iloc[start:start + 700])
+    np.testing.assert_allclose(partial.transform(X).values, fitted.transform(X).values)
+
+
+def test_out_of_fold_encodings_use_other_folds_only():
+    X, y = make_rows()
+    n_folds = 4
+    encoded = TargetEncoder(COLS, min_samples=5, smoothing=5).fit_transform(X, y, n_folds=n_folds)
+    folds = np.random.RandomState(0).permutation(len(y)) % n_folds
+    for fold in range(n_folds):
+        rows = folds == fold
+        other = TargetEncoder(COLS, min_samples=5, smoothing=5).fit(X[~rows], y[~rows])
+        np.testing.assert_allclose(encoded[rows].values, other.transform(X[rows]).values)
+
+
+def test_save_load(tmpdir):
+    X, y = make_rows()
+    encoder = WeightOfEvidenceEncoder(COLS, min_samples=5).fit(X, y)
+    path = str(tmpdir.join('encoder.npz'))
+    encoder.save(path)
+    np.testing.assert_array_equal(Encoder.load(path).transform(X).values, encoder.transform(X).values)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.entity_history import EntityHistory
+
+
+def make_features(n_rows=3000, seed=0):
+    random = np.random.RandomState(seed)
+    features = pd.DataFrame({
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(random.randint(0, 200, n_rows), unit='D'),
+        'horse_id': random.randint(0, 150, n_rows).astype(np.float64),
+        'jockey_id': random.randint(0, 40, n_rows),
+        'target': random.rand(n_rows) < 0.3,
+    })
+    # rows without id get NaN, like with the left merges
+    features.loc[random.rand(n_rows) < 0.02, 'horse_id'] = np.nan
+    return features
+
+
+# Previous groupby / merge implementations of lib.feature_constructor, the reference values
+
+
+def race_counts(features, entity):
+    counts = features[['date', '{}_id'.format(entity), 'target']].copy()
+    counts['{}_n_wins'.format(entity)] = counts['target'].astype(np.float64)
+    counts['{}_n_races'.format(entity)] = 1.
+    counts = counts.drop('target', axis=1).groupby(by=['{}_id'.format(entity), 'date']).sum()
+    counts = counts.groupby(level=[0]).cumsum()
+    counts = np.sqrt(counts.groupby(level=[0]).shift(periods=1).fillna(0))
+    return features.merge(counts.reset_index(), how='left', on=['{}_id'.format(entity), 'date'])
+
+
+def last_race(features, entity):
+    counts = features[['date', '{}_id'.format(entity), 'target']].copy()
+    counts['{}_last_race'.format(entity)] = counts['target'].astype(np.float64)
+    counts = counts.drop('target', axis=1).groupby(by=['{}_id'.format(entity), 'date']).sum()
+    counts = counts.groupby(level=[0]).shift(periods=1).fillna(0)
+    return features.merge(counts.reset_index(), how='left', on=['{}_id'.format(entity), 'date'])
+
+
+def last_n_races(features, entity, window):
+    counts = features[['date', '{}_id'.format(entity), 'target']].copy()
+    counts['{}_last_n_races'.format(entity)] = counts['target'].astype(np.float64)
+    counts = counts.drop('target', axis=1).groupby(by=['{}_id'.format(entity), 'date']).sum()
+    counts = counts.groupby(level=[0]).transform(lambda x: x.rolling(window=window, min_periods=1).sum())
+    counts = counts.groupby(level=[0]).shift(periods=1).fillna(0)
+    return features.merge(counts.reset_index(), how='left', on=['{}_id'.format(entity), 'date'])
+
+
+def last_n_days(features, entity, days):
+    # not in the previous implementations: wins on the previous race days of the last <days> days, with pandas
+    counts = features[['date', '{}_id'.format(entity), 'target']].copy()
+    counts['target'] = counts['target'].astype(np.float64)
+    counts = counts.groupby(by=['{}_id'.format(entity), 'date']).sum().reset_index(level=0)
+    wins = counts.groupby('{}_id'.format(entity))['target'].rolling('{}D'.format(days), min_periods=0, closed='neither')
+    counts = wins.sum().rename('{}_last_{}_days'.format(entity, days)).reset_index()
+    return features.merge(counts, how='left', on=['{}_id'.format(entity), 'date'])
+
+
+def reference(features, entities):
+    for entity in entities:
+        features = race_counts(features, entity)
+    for entity in entities:
+        features = last_race(features, entity)
+    for entity in entities:
+        features = last_n_races(features, entity, 3)
+    return features
+
+
+def assert_same_history(history, expected):
+    assert list(history.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_array_equal(history[column].values, expected[column].values, err_msg=column)
+
+
+def test_matches_groupby_implementation():
+    features = make_features()
+    entities = ['horse', 'jockey']
+    history = EntityHistory(entities, kinds=['race_counts', 'last_race', 'last_n_races']).transform(features)
+    assert_same_history(history, reference(features, entities))
+
+
+def test_parallel_backends_match_serial():
+    features = make_features(seed=1)
+    kinds = ['race_counts', 'last_race', 'last_n_races']
+    serial = EntityHistory(['horse', 'jockey'], kinds=kinds).compute(features)
+    for backend in ['threads', 'processes']:
+        parallel = EntityHistory(['horse', 'jockey'], kinds=kinds, n_jobs=2, backend=backend).compute(features)
+        assert_same_history(parallel, serial)
+
+
+def test_last_n_days_match_pandas_rolling():
+    features = make_features(seed=2)
+    entities = ['horse', 'jockey']
+    history = EntityHistory(entities, periods=[1, 30, 90], kinds=['last_n_days']).transform(features)
+    expected = features
+    for entity in entities:
+        for days in [1, 30, 90]:
+            expected = last_n_days(expected, entity, days)
+    assert_same_history(history, expected)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.feature_constructor import FeatureConstructor
+from utils.feature_cache import FeatureCache
+
+
+def memory_mapped(values):
+    while values is not None and not isinstance(values, np.memmap):
+        values = getattr(values, 'base', None)
+    return values is not None
+
+
+def test_cache_hits_are_memory_mapped(tmpdir):
+    features = pd.DataFrame({'rank': np.random.RandomState(0).randint(1, 10, 1000)})
+    cache = FeatureCache.enable(str(tmpdir))
+    try:
+        computed = FeatureConstructor.add_target(features)
+        key, columns, meta = FeatureConstructor.add_target.lookup(features)
+        loaded = FeatureConstructor.add_target(features)
+    finally:
+        FeatureCache.disable()
+    assert cache.stats() == {'add_target': {'hits': 2, 'misses': 1}}
+    assert list(columns.columns) == ['target']
+    assert memory_mapped(columns['target'].values)
+    assert list(loaded.columns) == list(computed.columns)
+    for column in computed.columns:
+        np.testing.assert_array_equal(loaded[column].values, computed[column].values)
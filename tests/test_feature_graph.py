@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.entity_history import ENTITIES
+from lib.feature_constructor import HISTORY_KINDS
+from lib.feature_constructor import FeatureConstructor
+from utils.feature_cache import FeatureCache
+
+
+def make_features(n_rows=2000, seed=0):
+    """Rows as given by FeatureConstructor.filter: a subset of the rows, with their original index.
+    """
+    random = np.random.RandomState(seed)
+    features = pd.DataFrame({
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(random.randint(0, 100, n_rows), unit='D'),
+        'rank': random.randint(1, 12, n_rows),
+        'column1': random.randn(n_rows),
+    })
+    for entity, n_ids in zip(ENTITIES, [100, 30, 50, 20]):
+        features['{}_id'.format(entity)] = random.randint(0, n_ids, n_rows)
+    return features[random.rand(n_rows) < 0.8]
+
+
+def method_calls(features):
+    """Features of add_all_features, by direct calls of the feature methods in the order of the graph.
+    """
+    features = FeatureConstructor.add_target(features)
+    for kind in HISTORY_KINDS:
+        for entity in ENTITIES:
+            features = getattr(FeatureConstructor, 'add_{}_{}'.format(entity, kind))(features)
+    return features
+
+
+def assert_same_features(features, expected):
+    assert features.index.equals(pd.RangeIndex(len(expected)))
+    assert list(features.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_array_equal(features[column].values, expected[column].values)
+
+
+def test_all_paths_give_the_same_features_and_a_range_index():
+    features = make_features()
+    expected = method_calls(features)
+    assert_same_features(expected, expected)
+    assert_same_features(FeatureConstructor.add_all_features(features, None), expected)
+    assert_same_features(FeatureConstructor.add_all_features(features, None, n_jobs=2), expected)
+    history = FeatureConstructor.add_history_features(FeatureConstructor.add_target(features))
+    assert_same_features(history[expected.columns], expected)
+    # all features found in the frame
+    skipped = FeatureConstructor.add_all_features(expected.set_index(features.index), None)
+    assert_same_features(skipped, expected)
+
+
+def test_cached_features_have_a_range_index(tmpdir):
+    features = make_features()
+    expected = method_calls(features)
+    FeatureCache.enable(str(tmpdir))
+    try:
+        computed = FeatureConstructor.add_all_features(features, None)
+        planned = FeatureConstructor.add_all_features(features, None, n_jobs=2)
+        called = method_calls(features)
+        stats = FeatureCache.active().stats()
+    finally:
+        FeatureCache.disable()
+    assert all(counts['hits'] == 2 and counts['misses'] == 1 for counts in stats.values())
+    for result in [computed, planned, called]:
+        assert_same_features(result, expected)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.feature_constructor import FeatureConstructor
+from lib.feature_store import FeatureStore
+from tests.test_entity_history import make_features
+
+
+ENTITIES = ['horse', 'jockey']
+WINDOWS = {'n': 3, '5': 5}
+
+
+def expected_history(features):
+    """History features of add_history_features (the values of add_all_features) on the full history.
+    """
+    history = FeatureConstructor.add_history_features(features, ENTITIES, WINDOWS)
+    return history[FeatureStore(ENTITIES, WINDOWS).columns()]
+
+
+def assert_same_rows(computed, expected, rows):
+    assert list(computed.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_allclose(computed[column].values, expected[column].values[rows], err_msg=column)
+
+
+def test_daily_updates_match_full_history(tmpdir):
+    features = make_features(seed=2)
+    expected = expected_history(features)
+    days = np.sort(features['date'].unique())
+    start = np.flatnonzero(features['date'].values < days[100])
+    store = FeatureStore(ENTITIES, WINDOWS).update(features.iloc[start])
+    for i, day in enumerate(days[100:]):
+        rows = np.flatnonzero(features['date'].values == day)
+        # races of the day are featurized before their results are known
+        assert_same_rows(store.compute(features.iloc[rows]), expected, rows)
+        store.update(features.iloc[rows])
+        if i == 50:
+            # later days computed from the saved state
+            store.save(str(tmpdir.join('store.npz')))
+            store = FeatureStore.load(str(tmpdir.join('store.npz')))
+
+
+def test_partially_loaded_day_is_completed():
+    features = make_features(seed=3)
+    expected = expected_history(features)
+    days = np.sort(features['date'].unique())
+    store = FeatureStore(ENTITIES, WINDOWS).update(features[features['date'].values < days[120]])
+    for day in days[120:]:
+        rows = np.flatnonzero(features['date'].values == day)
+        first, last = rows[:len(rows) // 2], rows[len(rows) // 2:]
+        store.update(features.iloc[first])
+        # features of the day don't depend on its results, loaded or not
+        assert_same_rows(store.compute(features.iloc[rows]), expected, rows)
+        store.update(features.iloc[last])
+    # the last day completed, the store is the one of the full history
+    full = FeatureStore(ENTITIES, WINDOWS).update(features)
+    later = features.iloc[:200].assign(date=days[-1] + np.timedelta64(1, 'D'))
+    pd.testing.assert_frame_equal(store.compute(later), full.compute(later))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.feature_transformer import FeatureTransformer
+
+
+COLUMNS = ['column1', 'column3', 'n_races']
+
+
+def make_races(n_rows=3000, seed=0):
+    """Rows of races (category_id), some without category, with tied and missing values, under a filtered index.
+    """
+    random = np.random.RandomState(seed)
+    features = pd.DataFrame({
+        'category_id': random.randint(0, 300, n_rows).astype(np.float64),
+        'some_id': random.randint(0, 100, n_rows),
+        'column1': np.round(random.randn(n_rows), 1),
+        'column3': random.lognormal(0, 1, n_rows),
+        'n_races': random.randint(0, 5, n_rows),
+    }, index=np.arange(n_rows) * 2)
+    features.loc[random.rand(n_rows) < 0.05, 'category_id'] = np.nan
+    features.loc[random.rand(n_rows) < 0.1, 'column1'] = np.nan
+    # a category with no value
+    features.loc[features['category_id'] == 0, 'column3'] = np.nan
+    return features
+
+
+# Previous groupby implementations of lib.feature_transformer, the reference values
+
+
+def race_gap(features, cols):
+    avg_features = features[cols.insert(0, 'category_id')]
+    avg_features = avg_features[cols] - avg_features.groupby('category_id').transform('mean')
+    avg_features.columns = ['category_avg_' + c for c in avg_features.columns]
+    return avg_features
+
+
+def race_rank(features, cols):
+    rank_features = features[cols.insert(0, 'category_id')]
+    rank_features = rank_features.groupby('category_id').rank(pct=True)
+    rank_features.columns = ['category_rank_' + c for c in rank_features.columns]
+    return rank_features
+
+
+def assert_same_features(features, expected):
+    assert features.index.equals(expected.index)
+    assert list(features.columns) == list(expected.columns)
+    for column in expected.columns:
+        np.testing.assert_allclose(features[column].values, expected[column].values, atol=1e-12, err_msg=column)
+
+
+def test_race_normalized_matches_groupby():
+    features = make_races()
+    cols = pd.Index(COLUMNS)
+    assert_same_features(FeatureTransformer.race_gap(features, COLUMNS), race_gap(features, cols))
+    assert_same_features(FeatureTransformer.race_rank(features, COLUMNS), race_rank(features, cols))
+    assert_same_features(
+        FeatureTransformer.race_normalized(features, COLUMNS),
+        pd.concat([race_gap(features, cols), race_rank(features, cols)], axis=1),
+    )
+
+
+def test_race_normalized_of_all_features():
+    features = make_races(seed=1)
+    # every column but the excluded ones and the category
+    cols = pd.Index(sorted(COLUMNS))
+    assert_same_features(
+        FeatureTransformer.race_normalized(features),
+        pd.concat([race_gap(features, cols), race_rank(features, cols)], axis=1),
+    )
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import grouped
+
+
+STATS = ['sum', 'count', 'mean', 'min', 'max']
+
+
+def make_rows(n_rows=3000, seed=0):
+    """Grouped rows sorted by (group, date), with NaN values, rows without group and several rows on the same days.
+    """
+    random = np.random.RandomState(seed)
+    rows = pd.DataFrame({
+        'group': random.randint(0, 60, n_rows).astype(np.float64),
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(random.randint(0, 400, n_rows), unit='D'),
+        'value': np.round(random.randn(n_rows), 1),
+    })
+    rows.loc[random.rand(n_rows) < 0.15, 'value'] = np.nan
+    rows.loc[random.rand(n_rows) < 0.02, 'group'] = np.nan
+    positions, (codes, _) = grouped.sort_by_keys(rows['group'].values, rows['date'].values)
+    return rows.iloc[positions].reset_index(drop=True), grouped.group_starts(codes)
+
+
+def pandas_rolling(rolled, stat):
+    # windows with no value: sum and count are 0 (min_periods=0), other stats NaN
+    return getattr(rolled, stat)().values
+
+
+@pytest.mark.parametrize('length', [1, 3, 7, 50])
+@pytest.mark.parametrize('exclusive', [False, True])
+def test_rolling_rows_match_pandas(length, exclusive):
+    rows, starts = make_rows()
+    values = rows['value']
+    if exclusive:
+        # previous rows only: windows of the values shifted by one row within groups
+        values = values.groupby(rows['group']).shift(1)
+    results = grouped.rolling(rows['value'].values, starts, STATS, length=length, exclusive=exclusive)
+    for stat in STATS:
+        rolled = values.groupby(rows['group']).rolling(length, min_periods=0)
+        np.testing.assert_allclose(results[stat], pandas_rolling(rolled, stat), atol=1e-9, err_msg=stat)
+
+
+@pytest.mark.parametrize('days', [1, 30, 90])
+def test_rolling_days_match_pandas(days):
+    rows, starts = make_rows(seed=1)
+    period = pd.Timedelta(days=days).to_timedelta64()
+    results = grouped.rolling(rows['value'].values, starts, STATS, times=rows['date'].values, period=period)
+    # rows of the same day: windows end at the row, like in pandas
+    values = rows.set_index('date')['value']
+    for stat in STATS:
+        rolled = values.groupby(rows['group'].values).rolling('{}D'.format(days), min_periods=0)
+        np.testing.assert_allclose(results[stat], pandas_rolling(rolled, stat), atol=1e-9, err_msg=stat)
+
+
+@pytest.mark.parametrize('days', [1, 30, 90])
+def test_exclusive_rolling_days_of_race_days_match_pandas(days):
+    # one row per (group, day), as EntityHistory aggregates rows before last_n_days windows
+    rows, _ = make_rows(seed=2)
+    rows = rows.drop_duplicates(['group', 'date']).reset_index(drop=True)
+    starts = grouped.group_starts(pd.factorize(rows['group'].values)[0])
+    period = pd.Timedelta(days=days).to_timedelta64()
+    results = grouped.rolling(
+        rows['value'].values, starts, STATS, times=rows['date'].values, period=period, exclusive=True
+    )
+    values = rows.set_index('date')['value']
+    for stat in STATS:
+        rolled = values.groupby(rows['group'].values).rolling('{}D'.format(days), min_periods=0, closed='neither')
+        np.testing.assert_allclose(results[stat], pandas_rolling(rolled, stat), atol=1e-9, err_msg=stat)
+
+
+def test_rolling_rows_and_days():
+    rows, starts = make_rows(seed=3)
+    period = pd.Timedelta(days=60).to_timedelta64()
+    both = grouped.rolling(rows['value'].values, starts, STATS, length=5, times=rows['date'].values, period=period)
+    by_rows = grouped.rolling(rows['value'].values, starts, ['count'], length=5)
+    by_days = grouped.rolling(rows['value'].values, starts, ['count'], times=rows['date'].values, period=period)
+    np.testing.assert_array_equal(both['count'], np.minimum(by_rows['count'], by_days['count']))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+from sklearn import metrics
+
+from utils.metrics import BinaryMetrics
+
+
+def make_scores(n_rows=2000, seed=0):
+    random = np.random.RandomState(seed)
+    y = (random.rand(n_rows) < 0.3).astype(np.int32)
+    # rounded probabilities, many ties
+    probas = np.clip(np.round(0.3 * y + random.rand(n_rows) * 0.7, 2), 0., 1.)
+    weights = random.rand(n_rows) * 2
+    groups = random.randint(0, 4, n_rows)
+    return y, probas, weights, groups
+
+
+def sklearn_scores(y, probas, weights=None, thresh=0.5):
+    predicted = (probas >= thresh).astype(np.int32)
+    return {
+        'roc_auc_score': metrics.roc_auc_score(y, probas, sample_weight=weights),
+        'log_loss': metrics.log_loss(y, probas, sample_weight=weights),
+        'f1_score': metrics.f1_score(y, predicted, sample_weight=weights),
+        'accuracy_score': metrics.accuracy_score(y, predicted, sample_weight=weights),
+        'precision_score': metrics.precision_score(y, predicted, sample_weight=weights),
+        'recall_score': metrics.recall_score(y, predicted, sample_weight=weights),
+    }
+
+
+def assert_scores_match(scores, expected):
+    for name, value in expected.items():
+        assert np.isclose(scores[name], value), name
+
+
+def test_scores_match_sklearn():
+    y, probas, _, _ = make_scores()
+    for thresh in [0.3, 0.5, 0.8]:
+        assert_scores_match(BinaryMetrics(y, probas).scores(thresh), sklearn_scores(y, probas, thresh=thresh))
+
+
+def test_weighted_scores_match_sklearn():
+    y, probas, weights, _ = make_scores(seed=1)
+    assert_scores_match(BinaryMetrics(y, probas, weights).scores(), sklearn_scores(y, probas, weights))
+
+
+def test_group_scores_match_sklearn_per_group():
+    y, probas, weights, groups = make_scores(seed=2)
+    table = BinaryMetrics(y, probas, weights, groups).table()
+    for group in np.unique(groups):
+        rows = groups == group
+        assert_scores_match(table.loc[group], sklearn_scores(y[rows], probas[rows], weights[rows]))
+
+
+def test_best_f1_matches_sklearn_curve():
+    y, probas, _, _ = make_scores(seed=3)
+    precision, recall, thresholds = metrics.precision_recall_curve(y, probas)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))[:-1]
+    scores = BinaryMetrics(y, probas).scores()
+    assert np.isclose(scores['best_f1_score'], f1.max())
+    assert np.isclose(scores['best_f1_threshold'], thresholds[f1 == f1.max()].max())
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from utils.predicates import Equals
+from utils.predicates import Range
+from utils.predicates import mask
+from utils.predicates import sql_literal
+from utils.predicates import where
+
+
+def test_sql_literal_of_numpy_scalars():
+    assert sql_literal(np.float64(1.5)) == '1.5'
+    assert sql_literal(np.float32(0.5)) == '0.5'
+    assert sql_literal(np.int64(3)) == '3'
+    assert sql_literal(np.int32(-2)) == '-2'
+    assert sql_literal(np.bool_(True)) == '1'
+    assert sql_literal(np.datetime64('2015-01-02')) == "'2015-01-02 00:00:00'"
+    assert sql_literal(pd.Series([2.5])[0]) == '2.5'
+
+
+def test_sql_literal_of_python_values():
+    assert sql_literal(1) == '1'
+    assert sql_literal(0.1) == '0.1'
+    assert sql_literal("it's") == "'it''s'"
+
+
+def test_where_selects_the_rows_of_mask():
+    random = np.random.RandomState(0)
+    frame = pd.DataFrame({
+        'col': random.randint(0, 3, 1000),
+        'column1': np.where(random.rand(1000) < 0.1, np.nan, random.randn(1000) * 10),
+    })
+    predicates = [
+        Equals('col', np.int64(1)),
+        Range('column1', np.float64(-5.5), np.float64(12.25), fill=np.float64(0.)),
+    ]
+    database = sqlite3.connect(':memory:')
+    frame.reset_index().to_sql('frame', database, index=False)
+    rows = pd.read_sql('SELECT "index" FROM frame WHERE {}'.format(where(predicates)), database)['index']
+    assert sorted(rows) == list(np.flatnonzero(mask(frame, predicates)))
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from lib.feature_transformer import EXCLUDED_COLUMNS
+from lib.feature_transformer import FeatureTransformer
+from lib.transform_plan import TransformPlan
+
+
+def make_features(n_rows=1000, seed=0):
+    random = np.random.RandomState(seed)
+    features = pd.DataFrame({
+        'some_id': random.randint(0, 100, n_rows).astype(np.float64),
+        'column1': random.lognormal(3, 1, n_rows),
+        'column2': random.lognormal(5, 2, n_rows),
+        'column3': random.randn(n_rows),
+        'n_races': random.randint(0, 20, n_rows),
+        'flag': random.rand(n_rows) < 0.5,
+        'name': np.where(random.rand(n_rows) < 0.1, None, 'a').astype(object),
+        'target': random.rand(n_rows) < 0.3,
+    }, index=np.arange(n_rows) + 10)
+    for column in ['some_id', 'column1', 'column2', 'column3']:
+        features.loc[random.rand(n_rows) < 0.1, column] = np.nan
+    return features
+
+
+# Previous per-column implementation of FeatureTransformer.process, the reference values
+BASELINE_TRANSFORMS = {
+    'column1': lambda f: np.log(f.fillna(1)),
+    'column2': np.log,
+}
+
+
+def process(features):
+    processed = features.copy()
+    for fea in processed.columns.difference(EXCLUDED_COLUMNS):
+        processed[fea] = BASELINE_TRANSFORMS.get(fea, lambda f: f.fillna(0))(processed[fea])
+    return processed
+
+
+def test_process_matches_per_column_transforms():
+    features = make_features()
+    expected = process(features)
+    pd.testing.assert_frame_equal(FeatureTransformer.process(features, dtype=np.float64), expected)
+    # integers and booleans are passed through as is
+    plan = FeatureTransformer.transform_plan(features, dtype=np.float64)
+    assert 'n_races' in plan.fallbacks and 'flag' in plan.fallbacks
+    assert plan.block_columns == ['column1', 'column2', 'column3']
+
+
+def test_plan_fitted_on_train_applies_to_test():
+    train, test = make_features(), make_features(seed=1)
+    plan = FeatureTransformer.transform_plan(train, dtype=np.float64)
+    pd.testing.assert_frame_equal(FeatureTransformer.process(test, plan), process(test))
+    # callable transforms are applied per column
+    transforms = dict(BASELINE_TRANSFORMS, column3=lambda f: f.fillna(0))
+    plan = TransformPlan.fit(train, transforms, excluded=EXCLUDED_COLUMNS)
+    pd.testing.assert_frame_equal(plan.apply(test), process(test))
+
+
+def test_process_inplace():
+    features = make_features()
+    expected = process(features)
+    processed = FeatureTransformer.process(features, inplace=True, dtype=np.float64)
+    assert processed is features
+    pd.testing.assert_frame_equal(processed, expected)
+
+
+def test_process_downcasts_floats():
+    features = make_features()
+    expected = process(features)
+    processed = FeatureTransformer.process(features, dtype=np.float32)
+    assert list(processed.columns) == list(expected.columns)
+    for column in expected.columns:
+        if column in ['column1', 'column2', 'column3']:
+            assert processed[column].dtype == np.float32
+            np.testing.assert_allclose(processed[column].values, expected[column].values, rtol=1e-6, atol=1e-6)
+        else:
+            pd.testing.assert_series_equal(processed[column], expected[column])
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lib.feature_transformer import FeatureTransformer
+from lib.walk_forward import WalkForward
+
+
+def make_features(n_rows=2000, seed=0):
+    """Rows in no particular order, with missing dates, under a filtered index.
+    """
+    random = np.random.RandomState(seed)
+    features = pd.DataFrame({
+        'target': random.rand(n_rows) < 0.3,
+        'date': pd.Timestamp('2015-01-01') + pd.to_timedelta(random.randint(0, 365, n_rows), unit='D'),
+        'some_id': random.randint(0, 100, n_rows),
+        'column1': random.randn(n_rows),
+    }, index=np.arange(n_rows) * 3)
+    features.loc[random.rand(n_rows) < 0.02, 'date'] = pd.NaT
+    return features
+
+
+# Previous mask-based implementation of FeatureTransformer.split, the reference folds
+
+
+def split(features, test_date, test_duration, train_duration=None, gap=0):
+    columns = features.columns.difference(['target'])
+    train_end = test_date - timedelta(gap)
+    train = features['date'] < train_end
+    if train_duration is not None:
+        train &= features['date'] >= train_end - timedelta(train_duration)
+    X_train = features[train].copy()
+    X_test = features[
+        (features['date'] >= test_date) &
+        (features['date'] < test_date + timedelta(test_duration))
+    ].copy()
+    return X_train[columns], X_train['target'], X_test[columns], X_test['target']
+
+
+def assert_same_folds(folds, expected, sort=False):
+    for fold, reference in zip(folds, expected):
+        if sort:
+            # rows in date order rather than in the order of the frame
+            fold = fold.sort_index()
+        if isinstance(reference, pd.DataFrame):
+            pd.testing.assert_frame_equal(fold, reference)
+        else:
+            pd.testing.assert_series_equal(fold, reference)
+
+
+def test_split_matches_masks():
+    features = make_features()
+    test_date = pd.Timestamp('2015-10-01')
+    assert_same_folds(FeatureTransformer.split(features, test_date, 30), split(features, test_date, 30))
+
+
+@pytest.mark.parametrize('train_duration, gap', [(None, 0), (None, 7), (90, 1), (180, 30)])
+def test_walk_forward_matches_masks(train_duration, gap):
+    features = make_features()
+    test_dates = pd.to_datetime(['2015-03-01', '2015-06-15', '2015-12-20'])
+    folds = FeatureTransformer.walk_forward(features, test_dates, 30, train_duration=train_duration, gap=gap)
+    for fold, test_date in zip(folds, test_dates):
+        assert_same_folds(fold, split(features, test_date, 30, train_duration, gap), sort=True)
+    # rows sorted by date: folds are slices, rows come in the order of the frame
+    ordered = features.dropna(subset=['date']).sort_values('date', kind='mergesort')
+    assert WalkForward(ordered['date']).is_sorted
+    folds = FeatureTransformer.walk_forward(ordered, test_dates, 30, train_duration=train_duration, gap=gap)
+    for fold, test_date in zip(folds, test_dates):
+        assert_same_folds(fold, split(ordered, test_date, 30, train_duration, gap))
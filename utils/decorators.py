@@ -4,10 +4,20 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from functools import wraps
 from time import time
 
 import sys
 
+import pandas as pd
+
+from utils import profiling
+from utils.feature_cache import FeatureCache
+
+
+# Parameters of feature methods changing how features are computed, not their values, left out of cache keys
+EXECUTION_PARAMS = ['force', 'n_jobs']
+
 
 def progress_bar(progress, status, bar_length=20):
     """Basic progress bar, compatible with jupyter notebooks.
@@ -24,6 +34,7 @@ def progress_bar(progress, status, bar_length=20):
 
 def log_execution_time(message):
     """Print custome message and target fundtion execution time, use with
+    Calls are also recorded as profiling spans named <message> when profiling is enabled, see utils.profiling.
 
     from utils.decorators import log_execution_time
 
@@ -33,38 +44,97 @@ def log_execution_time(message):
 
     """
     def decorator(function):
+        profiled = profiling.profile(message)(function)
+
+        @wraps(function)
         def wrapper(*args, **kwargs):
             ti = time()
-            result = function(*args, **kwargs)
+            result = profiled(*args, **kwargs)
             print('[INFO] {} - {}s'.format(message, round(time() - ti, 2)))
             return result
         return wrapper
     return decorator
 
 
-def compute_or_skip(feature_names):
+def fresh_index(frame):
+    """<frame> with a RangeIndex from 0, <frame> itself when it has one already.
+    """
+    if frame.index.equals(pd.RangeIndex(len(frame))):
+        return frame
+    return frame.reset_index(drop=True)
+
+
+def compute_or_skip(feature_names, inputs=None, version=None, cost=1.):
     """Skipping computation of list of features <feature_names> unless force=True argument is there.
     Useful when rerunning (part of) the full pipeline to skip features already present, specially when they are costly.
 
+    When the input columns read by the function are declared in <inputs> and a FeatureCache is enabled, computed
+    features are also kept on disk (see utils.feature_cache) and loaded back instead of being computed again, even
+    after a restart. force=True recomputes them and overwrites the cache. Changes in the project modules the function
+    depends on give new cache keys (see FeatureCache.dependencies), bump <version> when code outside of them (e.g. a
+    library upgrade) alters the features. Keyword arguments of EXECUTION_PARAMS (e.g. n_jobs) are not part of the
+    key, a parallel run reusing the features of a serial one.
+    Features are returned with a fresh RangeIndex, computed, loaded from cache or skipped, like the merges of the
+    history features give it.
+    <feature_names> and <inputs> can also be functions of the call arguments (features excluded) returning the lists.
+    They are kept on the decorated function along with <cost>, its relative cost per row, to declare it as a node of
+    a lib.feature_graph.FeatureGraph, and so are its cache lookup and store functions.
+
     from utils.decorators import compute_or_skip
 
-    @compute_or_skip(['feature1', 'feature2'])
+    @compute_or_skip(['feature1', 'feature2'], inputs=['column1'])
     def compute_features_1_and_2(features)
         new_features = do_something(features)
         return new_features
 
     """
     def decorator(function):
+        def lookup(features, *args, **kwargs):
+            """(cache key, cached columns, their meta) of a call, the columns being None when not cached or with
+            force=True, and the key too when no FeatureCache is enabled or <inputs> aren't declared.
+            """
+            cache = FeatureCache.active()
+            if cache is None or inputs is None:
+                return None, None, None
+            params = [args, sorted((k, v) for k, v in kwargs.items() if k not in EXECUTION_PARAMS)]
+            columns = inputs(*args, **kwargs) if callable(inputs) else inputs
+            key = cache.key(function, features, columns, params, version)
+            if kwargs.get('force', False):
+                return key, None, None
+            columns, meta = cache.get(key)
+            return key, columns, meta
+
+        def store(key, columns):
+            """Keeps the computed <columns> under <key>, given by lookup.
+            """
+            FeatureCache.active().put(key, columns, function=function.__name__)
+
+        @wraps(function)
         def wrapper(cls, features, *args, **kwargs):
-            if not kwargs.get('force', False) and all(f in features.columns for f in feature_names):
-                print(
-                    '[INFO] Feature(s) "{}{}{}" found in set, skipping call.'.format(
-                        feature_names[0],
-                        '' if len(feature_names) == 1 else ', ' + feature_names[1],
-                        '' if len(feature_names) <= 2 else ', ...',
-                    )
-                )
-                return features
-            return function(cls, features, *args, **kwargs)
+            force = kwargs.get('force', False)
+            outputs = feature_names(*args, **kwargs) if callable(feature_names) else feature_names
+            names = '{}{}{}'.format(
+                outputs[0],
+                '' if len(outputs) == 1 else ', ' + outputs[1],
+                '' if len(outputs) <= 2 else ', ...',
+            )
+            if not force and all(f in features.columns for f in outputs):
+                print('[INFO] Feature(s) "{}" found in set, skipping call.'.format(names))
+                return fresh_index(features)
+            key, columns, _ = lookup(features, *args, **kwargs)
+            if columns is not None:
+                print('[INFO] Feature(s) "{}" loaded from cache.'.format(names))
+                kept = features[[c for c in features.columns if c not in outputs]].reset_index(drop=True)
+                return pd.concat([kept, columns], axis=1)
+            result = fresh_index(function(cls, features, *args, **kwargs))
+            if key is not None:
+                store(key, result[outputs])
+            return result
+        wrapper.feature_names = feature_names
+        wrapper.inputs = inputs
+        wrapper.cost = cost
+        # cache access for callers computing the features by other means (lib.feature_graph kernels)
+        wrapper.lookup = lookup
+        wrapper.store = store
         return wrapper
     return decorator
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import decimal
+import sys
+from numbers import Integral
+from numbers import Real
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+from pandas.api.types import union_categoricals
+
+
+# Strings columns with at most this ratio of distinct values are stored as categoricals
+CATEGORY_RATIO = 0.5
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+class ChunkConverter:
+    """Converts chunks of DB-API rows (list of tuples) straight to compact numpy columns:
+    int32 integers (int64 when out of range, float64 when null), float32 reals, bool, datetime64 dates and
+    categoricals for low-cardinality strings.
+    The kind of each column is decided on the first chunk and kept for the following ones, so chunks concatenate
+    consistently (see concat). Nulls first met in a later chunk change the dtype of that chunk only (float for ints
+    and booleans), concat promoting the others.
+    """
+
+    def __init__(self, description):
+        self.columns = [c[0] for c in description]
+        # MySQL reports TINYINT(1) (aka BOOLEAN) with a display size of 1
+        self.tiny = [len(c) > 2 and c[2] == 1 for c in description]
+        self.kinds = None
+
+    def convert(self, rows):
+        values = list(zip(*rows))
+        if self.kinds is None:
+            self.kinds = [self.infer_kind(v, tiny) for v, tiny in zip(values, self.tiny)]
+        return pd.DataFrame(
+            {c: self.convert_column(v, kind) for c, v, kind in zip(self.columns, values, self.kinds)},
+            columns=self.columns,
+        )
+
+    def empty(self):
+        return pd.DataFrame(columns=self.columns)
+
+    @staticmethod
+    def infer_kind(values, tiny=False):
+        sample = [v for v in values if v is not None]
+        if not sample:
+            return 'object'
+        if all(isinstance(v, (bool, np.bool_)) for v in sample):
+            return 'bool'
+        if all(isinstance(v, Integral) for v in sample):
+            return 'bool' if tiny and set(sample) <= {0, 1} else 'int'
+        if all(isinstance(v, (Real, decimal.Decimal)) for v in sample):
+            return 'float'
+        if all(isinstance(v, datetime.date) for v in sample):
+            return 'datetime'
+        if len(set(sample)) <= CATEGORY_RATIO * len(values):
+            return 'category'
+        return 'object'
+
+    @staticmethod
+    def convert_column(values, kind):
+        has_null = any(v is None for v in values)
+        if kind == 'int':
+            if has_null:
+                return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            array = np.array(values, dtype=np.int64)
+            if len(array) and INT32_MIN <= array.min() and array.max() <= INT32_MAX:
+                return array.astype(np.int32)
+            return array
+        if kind == 'float':
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+        if kind == 'bool':
+            if has_null:
+                return np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+            return np.array(values, dtype=bool)
+        if kind == 'datetime':
+            return pd.to_datetime(list(values)).values
+        if kind == 'category':
+            return pd.Categorical(values)
+        return np.array(values, dtype=object)
+
+
+def concat(chunks):
+    """Concatenates converted chunks once, unioning categories of categorical columns.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = chunks[0].columns
+    data = {}
+    for column in columns:
+        parts = [chunk[column] for chunk in chunks]
+        kinds = set(p.dtype.kind for p in parts)
+        if all(isinstance(p.dtype, CategoricalDtype) for p in parts):
+            data[column] = union_categoricals(parts)
+        elif kinds == {'b', 'f'}:
+            # booleans with nulls in some chunks only, float32 like a column with nulls in its first chunk
+            data[column] = np.concatenate([p.values.astype(np.float32) for p in parts])
+        else:
+            data[column] = pd.concat(parts, ignore_index=True).values
+    return pd.DataFrame(data, columns=columns)
+
+
+def rows_footprint(rows, sample_size=100):
+    """Estimated memory (bytes) taken per row by raw DB-API tuples, based on a sample of <rows>.
+    """
+    sample = rows[:sample_size]
+    total = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row) for row in sample)
+    return total / max(len(sample), 1)
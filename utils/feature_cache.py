@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from utils.snapshot import load_frame
+from utils.snapshot import save_frame
+
+
+CACHE_DIR = os.path.dirname(os.path.realpath(__file__)) + '/../data/feature_cache'
+DEFAULT_MAX_SIZE = 10 * 2 ** 30
+# Modules under this directory are the code features depend on
+PROJECT_DIR = os.path.realpath(os.path.dirname(os.path.realpath(__file__)) + '/..')
+
+
+class FeatureCache:
+    """Content-addressed on-disk cache of computed feature columns, used by utils.decorators.compute_or_skip.
+
+    An entry is keyed by the function (name, source and version), the source of the project modules it depends on
+    (its module and, transitively, the project modules they import from, e.g. lib.entity_history and utils.grouped),
+    its parameters and a fingerprint of the input columns it reads, so any change in those gives a new key: entries
+    are never stale, only unused. Columns are stored with utils.snapshot.save_frame and memory-mapped on load. Least
+    recently used entries are evicted beyond <max_size> bytes.
+
+    from utils.feature_cache import FeatureCache
+    FeatureCache.enable()                           # once per session, disabled by default
+    FeatureCache.active().stats()                   # hits / misses per function
+    FeatureCache.active().invalidate('add_target')  # drops entries of a function
+
+    """
+
+    _active = None
+    # module name: digest of its source file
+    _module_digests = {}
+
+    def __init__(self, root=CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        self.root = root
+        self.max_size = max_size
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self._lock = threading.Lock()
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    @classmethod
+    def enable(cls, root=CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        cls._active = cls(root, max_size)
+        return cls._active
+
+    @classmethod
+    def disable(cls):
+        cls._active = None
+
+    @classmethod
+    def active(cls):
+        return cls._active
+
+    @staticmethod
+    def fingerprint(values):
+        """Digest of an array content, dtype and length included.
+        """
+        values = np.asarray(values)
+        digest = hashlib.sha1('{}:{}'.format(values.dtype, len(values)).encode('utf-8'))
+        if values.dtype.kind in 'biufmM':
+            digest.update(np.ascontiguousarray(values).view(np.uint8))
+        else:
+            digest.update(pd.util.hash_array(values.astype(object)).view(np.uint8))
+        return digest.hexdigest()
+
+    @staticmethod
+    def source(function):
+        while hasattr(function, '__wrapped__'):
+            function = function.__wrapped__
+        try:
+            return inspect.getsource(function)
+        except (IOError, TypeError):
+            return ''
+
+    @classmethod
+    def dependencies(cls, function):
+        """Digest of the source files of the project modules <function> depends on, found through the modules,
+        classes and functions each module has in its namespace.
+        """
+        seen = set()
+        pending = [function.__module__]
+        while pending:
+            name = pending.pop()
+            module = sys.modules.get(name)
+            path = os.path.realpath(getattr(module, '__file__', None) or '')
+            if name in seen or not path.startswith(PROJECT_DIR + os.sep):
+                continue
+            seen.add(name)
+            for value in vars(module).values():
+                dependency = value.__name__ if inspect.ismodule(value) else getattr(value, '__module__', None)
+                if dependency is not None and dependency not in seen:
+                    pending.append(dependency)
+        digest = hashlib.sha1()
+        for name in sorted(seen):
+            if name not in cls._module_digests:
+                path = sys.modules[name].__file__
+                path = path[:-1] if path.endswith('.pyc') else path
+                with open(path, 'rb') as stream:
+                    cls._module_digests[name] = hashlib.sha1(stream.read()).hexdigest()
+            digest.update('{}:{}'.format(name, cls._module_digests[name]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def key(self, function, features, inputs, params, version=None):
+        signature = json.dumps(
+            [
+                function.__name__,
+                self.source(function),
+                self.dependencies(function),
+                version,
+                repr(params),
+                [(column, self.fingerprint(features[column].values)) for column in inputs],
+            ]
+        )
+        return '{}-{}'.format(function.__name__, hashlib.sha1(signature.encode('utf-8')).hexdigest()[:20])
+
+    def get(self, key):
+        path = os.path.join(self.root, key)
+        name = key.rsplit('-', 1)[0]
+        try:
+            columns = load_frame(path, mmap=True)
+            with open(os.path.join(path, 'meta.json'), 'r') as stream:
+                meta = json.load(stream)
+        except (IOError, OSError, ValueError):
+            self.misses[name] += 1
+            return None, None
+        # access time drives the LRU eviction
+        os.utime(path, None)
+        self.hits[name] += 1
+        return columns, meta
+
+    def put(self, key, columns, **meta):
+        save_frame(os.path.join(self.root, key), columns, **meta)
+        self.evict()
+
+    def entries(self):
+        """(key, size in bytes, last access time) of every entry, least recently used first.
+        """
+        entries = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            try:
+                with open(os.path.join(path, 'meta.json'), 'r') as stream:
+                    entries.append((key, json.load(stream)['n_bytes'], os.path.getmtime(path)))
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+        return sorted(entries, key=lambda e: e[2])
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self):
+        with self._lock:
+            entries = self.entries()
+            total = sum(e[1] for e in entries)
+            for key, n_bytes, _ in entries:
+                if total <= self.max_size:
+                    break
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+                total -= n_bytes
+
+    def invalidate(self, function_name=None):
+        """Removes entries of <function_name>, or all entries.
+        """
+        for key, _, _ in self.entries():
+            if function_name is None or key.rsplit('-', 1)[0] == function_name:
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def stats(self):
+        return {
+            name: {'hits': self.hits[name], 'misses': self.misses[name]}
+            for name in sorted(set(self.hits) | set(self.misses))
+        }
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Vectorized primitives on grouped arrays: rows sorted so that each group is contiguous, groups being delimited by
+a boolean array of group starts. No per-group python call, everything is expressed with cumulative sums and offsets.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+
+def sort_by_keys(*keys):
+    """Positions of rows with no null key, sorted by <keys> (first key is the outermost).
+    Keys are factorized (sorted) first, so any dtype works, including objects. Categorical keys (compact ids, see
+    utils.schema) are sorted in the order of their categories, their codes being used as is.
+    :return: (positions, list of sorted integer codes, one per key)
+    """
+    codes = [
+        np.asarray(k.codes) if isinstance(k, pd.Categorical) else pd.factorize(np.asarray(k), sort=True)[0]
+        for k in keys
+    ]
+    valid = np.flatnonzero(np.logical_and.reduce([c >= 0 for c in codes]))
+    codes = [c[valid] for c in codes]
+    order = np.lexsort(codes[::-1])
+    return valid[order], [c[order] for c in codes]
+
+
+def group_starts(*sorted_codes):
+    """Boolean array flagging the first row of each group of identical (sorted) codes.
+    """
+    n = len(sorted_codes[0])
+    starts = np.zeros(n, dtype=bool)
+    if n:
+        starts[0] = True
+        for codes in sorted_codes:
+            starts[1:] |= codes[1:] != codes[:-1]
+    return starts
+
+
+def group_index(starts):
+    """Group number of each row.
+    """
+    return np.cumsum(starts) - 1
+
+
+def group_first(starts):
+    """Position of the first row of the group of each row.
+    """
+    positions = np.arange(len(starts))
+    return np.maximum.accumulate(np.where(starts, positions, 0))
+
+
+def exclusive_cumsum(values):
+    """prefix[i] = sum(values[:i]), with a trailing total: len(prefix) == len(values) + 1.
+    """
+    prefix = np.zeros(len(values) + 1, dtype=np.float64)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+
+def grouped_cumsum(values, starts, exclusive=False):
+    """Cumulative sum of <values> restarting at each group, excluding the current row if <exclusive>.
+    """
+    prefix = exclusive_cumsum(values)
+    end = np.arange(len(values)) + (0 if exclusive else 1)
+    return prefix[end] - prefix[group_first(starts)]
+
+
+def grouped_shift(values, starts, fill_value=0.):
+    """Value of the previous row of the same group, <fill_value> on the first row of each group.
+    """
+    shifted = np.empty(len(values), dtype=np.float64)
+    shifted[1:] = values[:-1]
+    shifted[starts] = fill_value
+    return shifted
+
+
+def rolling_bounds(starts, length=None, times=None, period=None, exclusive=False):
+    """Window [begin, end) of each row within its group: the row and the rows before it (only the rows before it if
+    <exclusive>), limited to the last <length> rows and/or to rows with times[j] > times[i] - <period>.
+    <times> must be sorted within groups, <period> of a type compatible with times (np.timedelta64 for dates).
+    """
+    positions = np.arange(len(starts))
+    end = positions if exclusive else positions + 1
+    begin = group_first(starts)
+    if length is not None:
+        begin = np.maximum(begin, end - length)
+    if period is not None:
+        # times are replaced by their rank among unique times, so that (group, time) fits in a sortable int64 key
+        uniques = np.unique(times)
+        ranks = np.searchsorted(uniques, times)
+        thresholds = np.searchsorted(uniques, times - period, side='right')
+        offsets = group_index(starts) * (len(uniques) + 1)
+        begin = np.maximum(begin, np.searchsorted(offsets + ranks, offsets + thresholds))
+    return begin, np.maximum(begin, end)
+
+
+def rolling(values, starts, stats=('sum',), length=None, times=None, period=None, exclusive=False):
+    """Rolling statistics over grouped sorted <values>, windows as in rolling_bounds.
+    Supported stats: sum, count, mean, min and max. NaN values are ignored, empty windows have a sum and count of 0
+    and a NaN mean, min and max.
+    :return: dict of arrays, one per stat
+    """
+    begin, end = rolling_bounds(starts, length=length, times=times, period=period, exclusive=exclusive)
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    results = {}
+    if {'sum', 'mean'} & set(stats):
+        prefix = exclusive_cumsum(np.where(present, values, 0.))
+        results['sum'] = prefix[end] - prefix[begin]
+    if {'count', 'mean'} & set(stats):
+        prefix = exclusive_cumsum(present)
+        results['count'] = prefix[end] - prefix[begin]
+    if 'mean' in stats:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            results['mean'] = np.where(results['count'] > 0, results['sum'] / results['count'], np.nan)
+    if 'min' in stats:
+        results['min'] = range_reduce(np.where(present, values, np.inf), begin, end, np.minimum, np.inf)
+    if 'max' in stats:
+        results['max'] = range_reduce(np.where(present, values, -np.inf), begin, end, np.maximum, -np.inf)
+    for stat, missing in [('min', np.inf), ('max', -np.inf)]:
+        if stat in results:
+            results[stat][results[stat] == missing] = np.nan
+    return {stat: results[stat] for stat in stats}
+
+
+def range_reduce(values, begin, end, ufunc, identity):
+    """ufunc (np.minimum, np.maximum) reduction of values[begin:end] for every pair of bounds, using a sparse table:
+    level k holds the reduction of the 2 ** k values starting at each position, any range is covered by two of them.
+    """
+    lengths = end - begin
+    result = np.full(len(begin), identity, dtype=np.float64)
+    if not len(values) or not lengths.max():
+        return result
+    levels = [values]
+    while 2 ** len(levels) <= lengths.max():
+        previous, half = levels[-1], 2 ** (len(levels) - 1)
+        levels.append(ufunc(previous[:-half], previous[half:]))
+    non_empty = lengths > 0
+    k = np.floor(np.log2(lengths[non_empty])).astype(np.int64)
+    b, e = begin[non_empty], end[non_empty]
+    reduced = np.full(len(b), identity, dtype=np.float64)
+    for level in np.unique(k):
+        selected = k == level
+        table = levels[level]
+        reduced[selected] = ufunc(table[b[selected]], table[e[selected] - 2 ** level])
+    result[non_empty] = reduced
+    return result
+
+
+def group_mean(values, starts):
+    """Mean of the group of each row, over the rows of a 1D or 2D (one column per feature) array of grouped sorted
+    <values>. NaN values are ignored, groups with no value have a NaN mean.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    offsets = np.flatnonzero(starts)
+    if not len(offsets):
+        return np.full(values.shape, np.nan)
+    counts = np.add.reduceat(present, offsets, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sums = np.add.reduceat(np.where(present, values, 0.), offsets, axis=0)
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return means[group_index(starts)]
+
+
+def group_rank_pct(values, starts):
+    """Rank of each row within its group divided by the number of values of the group, like pandas
+    groupby(...).rank(pct=True): ties get their average rank, NaN values get a NaN rank.
+    <values> is a 1D or 2D (one column per feature) array of grouped sorted rows, all columns are ranked at once.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.full(values.shape, np.nan)
+    flat = values.ndim == 1
+    # one row per feature, so that sorts run over contiguous memory and flat indices address any cell
+    values = np.ascontiguousarray(values.reshape(len(values), -1).T)
+    k, n = values.shape
+    offsets = (np.arange(k) * n)[:, None]
+    group = group_index(starts)
+
+    # rows ordered by value (NaN last) within each group, groups keeping their positions so that row p of the
+    # ordered array still belongs to group[p]: values are sorted (NaN as inf, comparisons to NaN being slow), then
+    # (group, missing, rank of the value) integer keys
+    missing = np.isnan(values)
+    order = np.argsort(np.where(missing, np.inf, values), axis=1) + offsets
+    keys = np.empty((k, n), dtype=np.int64)
+    keys.put(order, np.arange(n))
+    keys += group * 2 * n + missing * n
+    order = np.argsort(keys, axis=1) + offsets
+    ordered = values.take(order)
+    present = ~missing.take(order)
+
+    positions = np.arange(n)
+    tie_starts = np.empty((k, n), dtype=bool)
+    tie_starts[:, 0] = True
+    tie_starts[:, 1:] = starts[1:] | (ordered[:, 1:] != ordered[:, :-1])
+    tie_ends = np.empty((k, n), dtype=bool)
+    tie_ends[:, -1] = True
+    tie_ends[:, :-1] = tie_starts[:, 1:]
+    first = np.maximum.accumulate(np.where(tie_starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(tie_ends, positions, n)[:, ::-1], axis=1)[:, ::-1]
+    ranks = (first + last) / 2. - group_first(starts) + 1
+    counts = np.add.reduceat(present, np.flatnonzero(starts), axis=1)[:, group]
+
+    ranked = np.empty((k, n), dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ranked.put(order, np.where(present, ranks / counts, np.nan))
+    return ranked[0] if flat else ranked.T
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+
+def stable_hash(*values):
+    """Digest of json serializable values, stable across processes and runs (unlike the built-in hash).
+    """
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode('utf-8')).hexdigest()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Binary classification metrics from a single sort of the predicted probabilities.
+
+Rows are sorted by group then by decreasing probability once: cumulative (weighted) counts of positives and negatives
+at the last row of each distinct probability then give the confusion matrix at every threshold, hence the ROC AUC and
+the precision / recall / F1 / accuracy sweep, for all groups at once. Values match sklearn.metrics.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+
+from utils.grouped import group_starts
+from utils.grouped import grouped_cumsum
+
+
+# Probabilities are clipped to [EPS, 1 - EPS] in log loss, like sklearn.metrics.log_loss
+EPS = 1e-15
+METRICS = [
+    'roc_auc_score',
+    'f1_score',
+    'accuracy_score',
+    'log_loss',
+    'precision_score',
+    'recall_score',
+    'best_f1_score',
+    'best_f1_threshold',
+]
+
+
+class BinaryMetrics:
+    """Metrics of <probas> predicted for binary targets <y>, with optional sample <weights>, overall or per value of
+    <groups> (rows with a missing group are left out).
+
+    metrics = BinaryMetrics(y, probas)
+    metrics.scores()                                        # dict, thresholded metrics at 0.5
+    metrics.curve()                                         # one row per threshold
+    BinaryMetrics(y, probas, groups=x['category_id']).table()    # one row per group
+
+    """
+
+    def __init__(self, y, probas, weights=None, groups=None):
+        y = np.asarray(y, dtype=np.float64)
+        probas = np.asarray(probas, dtype=np.float64)
+        weights = np.ones(len(y)) if weights is None else np.asarray(weights, dtype=np.float64)
+        if groups is None:
+            codes, self.groups = np.zeros(len(y), dtype=np.int64), pd.Index([None])
+        else:
+            codes, self.groups = pd.factorize(np.asarray(groups), sort=True)
+            self.groups = pd.Index(self.groups)
+        valid = np.flatnonzero(codes >= 0)
+        order = valid[np.lexsort((-probas[valid], codes[valid]))]
+        self.codes = codes[order]
+        self.y = y[order]
+        self.probas = probas[order]
+        self.weights = weights[order]
+        self.starts = group_starts(self.codes)
+
+        # cumulative weights of positives and negatives down to each row, within its group
+        positives = self.weights * self.y
+        negatives = self.weights - positives
+        self.tps = grouped_cumsum(positives, self.starts)
+        self.fps = grouped_cumsum(negatives, self.starts)
+        n_groups = len(self.groups)
+        self.total_positives = np.bincount(self.codes, weights=positives, minlength=n_groups)
+        self.total_negatives = np.bincount(self.codes, weights=negatives, minlength=n_groups)
+        # last row of each distinct probability within a group: points of the ROC curve
+        ends = np.ones(len(self.codes), dtype=bool)
+        ends[:-1] = self.starts[1:] | (self.probas[1:] != self.probas[:-1])
+        self.ends = np.flatnonzero(ends)
+
+    def roc_auc_score(self):
+        """Area under the ROC curve of each group, by trapezoids, NaN when a group has a single class.
+        """
+        codes, tps, fps = self.codes[self.ends], self.tps[self.ends], self.fps[self.ends]
+        previous_tps, previous_fps = np.zeros(len(tps)), np.zeros(len(fps))
+        first = group_starts(codes)
+        previous_tps[1:], previous_fps[1:] = tps[:-1], fps[:-1]
+        previous_tps[first], previous_fps[first] = 0., 0.
+        trapezoids = (fps - previous_fps) * (tps + previous_tps) / 2.
+        areas = np.bincount(codes, weights=trapezoids, minlength=len(self.groups))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(
+                (self.total_positives > 0) & (self.total_negatives > 0),
+                areas / (self.total_positives * self.total_negatives),
+                np.nan,
+            )
+
+    def log_loss(self):
+        probas = np.clip(self.probas, EPS, 1 - EPS)
+        losses = -(self.y * np.log(probas) + (1 - self.y) * np.log(1 - probas))
+        return (np.bincount(self.codes, weights=self.weights * losses, minlength=len(self.groups)) /
+                np.bincount(self.codes, weights=self.weights, minlength=len(self.groups)))
+
+    def confusion(self, thresh=0.5):
+        """Weighted true positives, false positives, false negatives and true negatives of each group, predicting
+        positive when probas >= <thresh>.
+        """
+        predicted = self.weights * (self.probas >= thresh)
+        tps = np.bincount(self.codes, weights=predicted * self.y, minlength=len(self.groups))
+        fps = np.bincount(self.codes, weights=predicted * (1 - self.y), minlength=len(self.groups))
+        return tps, fps, self.total_positives - tps, self.total_negatives - fps
+
+    def table(self, thresh=0.5):
+        """All metrics (METRICS) of each group, thresholded ones at <thresh>.
+        """
+        tps, fps, fns, tns = self.confusion(thresh)
+        precision, recall, f1 = _precision_recall_f1(tps, fps, fns)
+        best_f1, best_threshold = self.best_f1()
+        return pd.DataFrame(
+            {
+                'roc_auc_score': self.roc_auc_score(),
+                'f1_score': f1,
+                'accuracy_score': (tps + tns) / (tps + fps + fns + tns),
+                'log_loss': self.log_loss(),
+                'precision_score': precision,
+                'recall_score': recall,
+                'best_f1_score': best_f1,
+                'best_f1_threshold': best_threshold,
+            },
+            index=self.groups,
+            columns=METRICS,
+        )
+
+    def best_f1(self):
+        """Best F1 of each group over all thresholds, and the highest threshold reaching it.
+        """
+        codes = self.codes[self.ends]
+        f1 = _precision_recall_f1(
+            self.tps[self.ends], self.fps[self.ends], self.total_positives[codes] - self.tps[self.ends]
+        )[2]
+        best = np.maximum.reduceat(f1, np.flatnonzero(group_starts(codes))) if len(f1) else f1
+        # thresholds decrease within groups, the first row reaching the best F1 has the highest threshold
+        reached = np.flatnonzero(f1 == best[codes])
+        _, first = np.unique(codes[reached], return_index=True)
+        return best, self.probas[self.ends[reached[first]]]
+
+    def scores(self, thresh=0.5):
+        """Metrics of the first (only, without groups) group, as a dict of floats.
+        """
+        table = self.table(thresh)
+        return {name: float(value) for name, value in zip(table.columns, table.iloc[0].values)}
+
+    def curve(self):
+        """Threshold sweep: confusion matrix and metrics of each group at each distinct probability taken as
+        threshold, thresholds decreasing within groups.
+        """
+        codes = self.codes[self.ends]
+        tps, fps = self.tps[self.ends], self.fps[self.ends]
+        fns, tns = self.total_positives[codes] - tps, self.total_negatives[codes] - fps
+        precision, recall, f1 = _precision_recall_f1(tps, fps, fns)
+        return pd.DataFrame({
+            'group': self.groups.values[codes],
+            'threshold': self.probas[self.ends],
+            'tp': tps,
+            'fp': fps,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+            'accuracy': (tps + tns) / (tps + fps + fns + tns),
+        }, columns=['group', 'threshold', 'tp', 'fp', 'precision', 'recall', 'f1', 'accuracy'])
+
+
+def _precision_recall_f1(tps, fps, fns):
+    """Precision, recall and F1, 0 when undefined like sklearn (zero_division=0).
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = np.where(tps + fps > 0, tps / (tps + fps), 0.)
+        recall = np.where(tps + fns > 0, tps / (tps + fns), 0.)
+        f1 = np.where(2 * tps + fps + fns > 0, 2 * tps / (2 * tps + fps + fns), 0.)
+    return precision, recall, f1
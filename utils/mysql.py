@@ -5,44 +5,225 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
+import threading
 import warnings
+from contextlib import contextmanager
+from time import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
 
-import MySQLdb
 import pandas as pd
 import yaml
 
+from utils import dtypes
+
 
 CREDENTIALS = '/../config/database.yml'
 DEFAULT_ENV = 'development'
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHUNKSIZE = 100000
+PROBE_ROWS = 1000
+
+
+class ConnectionPool:
+    """Bounded pool of reusable DB-API connections, safe to share between threads.
+    At most <size> connections are checked out at once, idle connections are health-checked with <ping> before reuse
+    and replaced when the check fails. Any DB-API connection factory works, e.g. for a local sqlite stand-in:
+
+    ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), 4, ping=lambda db: db.execute('SELECT 1'))
+
+    <cursor_class> is the server-side (unbuffered) cursor class of the driver, if any, used by MySQL.stream.
+    """
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE, ping=lambda db: db.ping(), cursor_class=None):
+        self.connect = connect
+        self.size = size
+        self.ping = ping
+        self.cursor_class = cursor_class
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            db = self._checkout()
+            try:
+                yield db
+            except BaseException:
+                # includes GeneratorExit, a partially consumed result leaves the connection unusable
+                self._close(db)
+                raise
+            self._idle.put(db)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def _checkout(self):
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            try:
+                self.ping(db)
+                return db
+            except Exception:
+                self._close(db)
+
+    @staticmethod
+    def _close(db):
+        try:
+            db.close()
+        except Exception:
+            pass
 
 
 class MySQL:
 
+    _credentials = None
+    _pools = {}
+    _lock = threading.Lock()
+
     @classmethod
-    def query(cls, query, env=DEFAULT_ENV):
+    def query(cls, query, env=DEFAULT_ENV, chunksize=None, max_memory=None):
         """
         Executes a query on our MySQL databases.
         :param string query: query to execute
         :param string env: environment for which we want to query the databases.
+        :param int chunksize: if set (or if max_memory is), streams the result in chunks of compact dtypes, see stream
+        :param int max_memory: peak memory budget (bytes) for the streamed read, MemoryError is raised when exceeded
         :return: table containing the result of the query
         :rtype: pd.DataFrame
         """
-        # loading database credentials
-        with open(os.path.dirname(os.path.realpath(__file__)) + CREDENTIALS, 'r') as stream:
-            credentials = yaml.load(stream)
+        if chunksize is None and max_memory is None:
+            with cls.get_pool(env).connection() as db:
+                return pd.read_sql(query, db)
+
+        chunks = []
+        stored = 0
+        stream = cls.stream(query, env=env, chunksize=chunksize or DEFAULT_CHUNKSIZE, max_memory=max_memory)
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                stored += chunk.memory_usage(index=False).sum()
+                # final concatenation holds chunks and result at once
+                if max_memory is not None and 2 * stored > max_memory:
+                    del chunk, chunks[:]
+                    raise MemoryError(
+                        'Result exceeds memory budget of {} bytes, use MySQL.stream to process it by chunks'.format(
+                            max_memory
+                        )
+                    )
+        finally:
+            # a partially consumed stream releases its connection now, not once the traceback is collected
+            stream.close()
+            del stream
+        return dtypes.concat(chunks)
+
+    @classmethod
+    def stream(cls, query, env=DEFAULT_ENV, chunksize=DEFAULT_CHUNKSIZE, max_memory=None):
+        """
+        Executes a query with a server-side cursor and yields the result by chunks, converted to compact dtypes
+        (see utils.dtypes.ChunkConverter).
+        :param string query: query to execute
+        :param string env: environment for which we want to query the databases.
+        :param int chunksize: maximum number of rows per chunk
+        :param int max_memory: memory budget (bytes), chunks are shrunk so raw rows fetched at once stay within half
+            of it
+        :return: generator of tables, a single empty table for empty results
+        """
+        ti = time()
+        n_rows = 0
+        pool = cls.get_pool(env)
+        with pool.connection() as db:
+            cursor = db.cursor() if pool.cursor_class is None else db.cursor(pool.cursor_class)
+            try:
+                cursor.execute(query)
+                converter = dtypes.ChunkConverter(cursor.description)
+                size = chunksize if max_memory is None else min(chunksize, PROBE_ROWS)
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        break
+                    if max_memory is not None:
+                        size = min(chunksize, max(1, int(max_memory / 2 // dtypes.rows_footprint(rows))))
+                    n_rows += len(rows)
+                    chunk = converter.convert(rows)
+                    del rows
+                    yield chunk
+                if n_rows == 0:
+                    yield converter.empty()
+            finally:
+                cursor.close()
+        duration = time() - ti
+        print(
+            '[INFO] Streamed {} rows - {}s ({} rows/s)'.format(
+                n_rows, round(duration, 2), int(n_rows / max(duration, 1e-6))
+            )
+        )
+
+    @classmethod
+    def credentials(cls):
+        # loading database credentials, once per process
+        if cls._credentials is None:
+            with open(os.path.dirname(os.path.realpath(__file__)) + CREDENTIALS, 'r') as stream:
+                cls._credentials = yaml.load(stream)
+        return cls._credentials
+
+    @classmethod
+    def get_pool(cls, env=DEFAULT_ENV):
+        with cls._lock:
+            if env not in cls._pools:
+                cls._pools[env] = cls.create_pool(env)
+            return cls._pools[env]
+
+    @classmethod
+    def set_pool(cls, env, pool):
+        """Overrides the pool used for <env>, e.g. to plug a local stand-in database.
+        """
+        with cls._lock:
+            if env in cls._pools:
+                cls._pools[env].close()
+            cls._pools[env] = pool
+
+    @classmethod
+    def create_pool(cls, env):
+        # imported here so that the rest of the project (e.g. benchmarks on synthetic data) runs without the driver
+        import MySQLdb
+        import MySQLdb.cursors
+
+        credentials = cls.credentials()
         # verifying if environment passed in argument exists
         if env not in credentials:
             warnings.warn("Invalid environment {}. Defaulting to {}.".format(env, DEFAULT_ENV))
             env = DEFAULT_ENV
-        # querying data
-        db = MySQLdb.connect(
-            host=credentials[env]['host'],
-            user=credentials[env]['username'],
-            passwd=credentials[env]['password'],
-            db=credentials[env]['database'],
-            charset=credentials[env]['encoding'],
-            use_unicode=True
+        config = credentials[env]
+        return ConnectionPool(
+            lambda: MySQLdb.connect(
+                host=config['host'],
+                user=config['username'],
+                passwd=config['password'],
+                db=config['database'],
+                charset=config['encoding'],
+                use_unicode=True
+            ),
+            size=config.get('pool', DEFAULT_POOL_SIZE),
+            cursor_class=MySQLdb.cursors.SSCursor,
         )
-        df = pd.read_sql(query, db)
-        db.close()
-        return df
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            for pool in cls._pools.values():
+                pool.close()
+            cls._pools = {}
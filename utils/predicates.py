@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Row predicates evaluated the same way on a DataFrame (mask) and in a query (sql), so that filters can be pushed
+down to the database (lib.data_set.DataSet) and still be applied in pandas with identical results.
+
+predicates = [Equals('col', 1), Range('column1', 1, 5e5, fill=0), Range('date', '2015-01-01', None)]
+DataSet(filters=predicates)                           # WHERE col = 1 AND COALESCE(column1, 0) >= 1 AND ...
+features[mask(features, predicates)]
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from numbers import Number
+
+import numpy as np
+import pandas as pd
+
+
+def sql_literal(value):
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    elif isinstance(value, np.generic):
+        # numpy scalars (e.g. values taken from frames) as Python ones, whose repr is a plain literal
+        value = value.item()
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, Number):
+        return repr(value) if isinstance(value, float) else str(value)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+class Equals:
+    """Rows where <column> equals <value>, missing values excluded.
+    """
+
+    def __init__(self, column, value, table=None):
+        self.column = column
+        self.value = value
+        # table of the column when several queried tables have it
+        self.table = table
+
+    def sql(self):
+        return '{} = {}'.format(self.column, sql_literal(self.value))
+
+    def mask(self, features):
+        return (features[self.column] == self.value).values
+
+
+class Range:
+    """Rows where <low> <= <column> < <high>, either bound being optional. Missing values are replaced by <fill>
+    first, or excluded when <fill> is None.
+    """
+
+    def __init__(self, column, low=None, high=None, fill=None, table=None):
+        self.column = column
+        self.low = low
+        self.high = high
+        self.fill = fill
+        self.table = table
+
+    def sql(self):
+        column = self.column if self.fill is None else 'COALESCE({}, {})'.format(self.column, sql_literal(self.fill))
+        bounds = []
+        if self.low is not None:
+            bounds.append('{} >= {}'.format(column, sql_literal(self.low)))
+        if self.high is not None:
+            bounds.append('{} < {}'.format(column, sql_literal(self.high)))
+        return ' AND '.join(bounds) if bounds else '{} IS NOT NULL'.format(column)
+
+    def mask(self, features):
+        values = features[self.column]
+        if self.fill is not None:
+            values = values.fillna(self.fill)
+        mask = values.notnull().values.copy()
+        # dates bounds given as strings are compared as timestamps
+        convert = pd.Timestamp if values.dtype.kind == 'M' else (lambda bound: bound)
+        if self.low is not None:
+            mask &= (values >= convert(self.low)).values
+        if self.high is not None:
+            mask &= (values < convert(self.high)).values
+        return mask
+
+
+def where(predicates):
+    """SQL condition of all <predicates>, None when there is none.
+    """
+    if not predicates:
+        return None
+    return ' AND '.join('({})'.format(predicate.sql()) for predicate in predicates)
+
+
+def mask(features, predicates):
+    """Boolean array of the rows of <features> matching all <predicates>.
+    """
+    selected = np.ones(len(features), dtype=bool)
+    for predicate in predicates:
+        selected &= predicate.mask(features)
+    return selected
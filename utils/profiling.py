@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Nested profiling spans for pipeline stages: wall time, CPU time, peak and delta memory, DataFrame shapes in and out.
+
+Disabled by default, decorated functions then only pay a flag check. Typical use:
+
+from utils import profiling
+profiling.enable()                          # memory=False to skip tracemalloc (and its overhead)
+run_pipeline()
+profiling.summary()                         # top stages by time and by memory
+profiling.to_chrome_trace('trace.json')     # open in chrome://tracing
+profiling.to_json('spans.json')
+
+Spans are created by utils.decorators.log_execution_time, the profile decorator or the span context manager.
+
+Traced memory and CPU time are process-wide, they can't be told apart between threads: they are only recorded for
+spans of the thread profiling was enabled in, and include the work of the threads it waits for. Spans opened in other
+threads (e.g. DataSet.query fetches) only get their wall time, their memory and CPU being counted in the enclosing
+span of the profiling thread.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import atexit
+import json
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from time import time
+
+try:
+    from time import process_time
+except ImportError:  # Python 2
+    from time import clock as process_time
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+import pandas as pd
+
+
+_state = {
+    'enabled': False,
+    'memory': False,
+    'roots': [],
+    # ident of the thread profiling was enabled in, the only one whose spans record memory and CPU time
+    'thread': None,
+}
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Span:
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.thread = threading.current_thread().ident
+        self.start = None
+        self.wall = None
+        self.cpu = None
+        self.memory_start = None
+        self.memory_delta = None
+        self.memory_peak = None
+        self._traced_peak = None
+        self.shape_in = None
+        self.shape_out = None
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'thread': self.thread,
+            'start': self.start,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'memory_delta': self.memory_delta,
+            'memory_peak': self.memory_peak,
+            'shape_in': self.shape_in,
+            'shape_out': self.shape_out,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            for span in child.walk():
+                yield span
+
+
+def enable(memory=True, summary_at_exit=False):
+    _state['enabled'] = True
+    _state['thread'] = threading.current_thread().ident
+    _state['memory'] = memory and tracemalloc is not None
+    if _state['memory'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if summary_at_exit:
+        atexit.register(summary)
+
+
+def disable():
+    _state['enabled'] = False
+    if _state['memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state['memory'] = False
+
+
+def enabled():
+    return _state['enabled']
+
+
+def reset():
+    with _lock:
+        _state['roots'] = []
+
+
+def current():
+    """Innermost open span of the current thread, to be passed as parent to spans opened in worker threads.
+    """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def _close_peak(record):
+    """Folds the traced peak since the last reset into <record> running peak (absolute bytes), then resets it.
+    Without reset_peak (Python < 3.9) the peak is the one since tracing started.
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    if record is not None and record._traced_peak is not None:
+        record._traced_peak = max(record._traced_peak, peak)
+
+
+@contextmanager
+def span(name, parent=None, data_in=None):
+    """Records the enclosed block as a span, child of the innermost open span of the thread (or of <parent>).
+    Yields the span, set span.shape_out to record an output shape.
+    """
+    if not _state['enabled']:
+        yield None
+        return
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    parent = parent if parent is not None else current()
+    record = Span(name, parent)
+    record.shape_in = _shape(data_in)
+    with _lock:
+        (parent.children if parent is not None else _state['roots']).append(record)
+    # process-wide counters, a span of another thread would read and reset those of concurrent spans
+    measured = record.thread == _state['thread']
+    memory = _state['memory'] and measured
+    if memory:
+        # peak so far belongs to the enclosing span, the counter then restarts for this one
+        _close_peak(parent)
+        record.memory_start = record._traced_peak = tracemalloc.get_traced_memory()[0]
+    _local.stack.append(record)
+    record.start = time()
+    cpu = process_time() if measured else None
+    try:
+        yield record
+    finally:
+        record.wall = time() - record.start
+        record.cpu = process_time() - cpu if measured else None
+        _local.stack.pop()
+        if memory and tracemalloc.is_tracing():
+            record.memory_delta = tracemalloc.get_traced_memory()[0] - record.memory_start
+            _close_peak(record)
+            if parent is not None and parent._traced_peak is not None:
+                parent._traced_peak = max(parent._traced_peak, record._traced_peak)
+            record.memory_peak = record._traced_peak - record.memory_start
+
+
+def profile(name=None):
+    """Decorator recording each call as a span named <name> (defaults to the function name), with the shape of the
+    first DataFrame argument and of the DataFrame returned.
+    """
+    def decorator(function):
+        label = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return function(*args, **kwargs)
+            with span(label, data_in=_first_frame(args)) as record:
+                result = function(*args, **kwargs)
+                record.shape_out = _shape(_first_frame(result if isinstance(result, tuple) else (result,)))
+                return result
+        return wrapper
+    return decorator
+
+
+def _first_frame(values):
+    for value in values:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value
+    return None
+
+
+def _shape(data):
+    if data is None:
+        return None
+    return list(data.shape) if isinstance(data, pd.DataFrame) else [len(data), 1]
+
+
+def spans():
+    return list(_state['roots'])
+
+
+def to_json(path):
+    with open(path, 'w') as stream:
+        json.dump([root.to_dict() for root in spans()], stream, indent=2)
+
+
+def to_chrome_trace(path):
+    """Writes spans in the Trace Event Format of chrome://tracing (and Perfetto).
+    """
+    events = []
+    for root in spans():
+        for record in root.walk():
+            if record.wall is None:
+                continue
+            events.append({
+                'name': record.name,
+                'ph': 'X',
+                'ts': record.start * 1e6,
+                'dur': record.wall * 1e6,
+                'pid': os.getpid(),
+                'tid': record.thread,
+                'args': {
+                    'cpu': record.cpu,
+                    'memory_delta': record.memory_delta,
+                    'memory_peak': record.memory_peak,
+                    'shape_in': record.shape_in,
+                    'shape_out': record.shape_out,
+                },
+            })
+    with open(path, 'w') as stream:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, stream)
+
+
+def stats():
+    """One row per span name: number of calls, total wall and CPU time, largest peak and total delta memory. CPU and
+    memory are NaN for spans of worker threads, which don't record them.
+    """
+    rows = {}
+    for root in spans():
+        for record in root.walk():
+            if record.wall is None:
+                continue
+            row = rows.setdefault(
+                record.name, {'calls': 0, 'wall': 0., 'cpu': None, 'memory_peak': None, 'memory_delta': None}
+            )
+            row['calls'] += 1
+            row['wall'] += record.wall
+            if record.cpu is not None:
+                row['cpu'] = (row['cpu'] or 0.) + record.cpu
+            if record.memory_peak is not None:
+                row['memory_peak'] = max(row['memory_peak'] or 0, record.memory_peak)
+                row['memory_delta'] = (row['memory_delta'] or 0) + record.memory_delta
+    columns = ['calls', 'wall', 'cpu', 'memory_peak', 'memory_delta']
+    return pd.DataFrame([rows[name] for name in rows], index=list(rows), columns=columns).astype(
+        {c: float for c in columns[1:]}
+    )
+
+
+def summary(top=10):
+    table = stats()
+    if table.empty:
+        print('[INFO] No profiling span recorded.')
+        return
+    table['memory_peak'] = (table['memory_peak'] / 2 ** 20).round(1)
+    table['memory_delta'] = (table['memory_delta'] / 2 ** 20).round(1)
+    table = table.rename(columns={'wall': 'wall (s)', 'cpu': 'cpu (s)', 'memory_peak': 'peak (MB)',
+                                  'memory_delta': 'delta (MB)'})
+    print('[INFO] Top stages by time:')
+    print(table.sort_values('wall (s)', ascending=False).head(top).round(2).to_string())
+    print('[INFO] Top stages by memory:')
+    print(table.sort_values('peak (MB)', ascending=False).head(top).round(2).to_string())
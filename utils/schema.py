@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Logical types of table columns (see DataSet.get_schema) and the compact physical dtypes enforced at load:
+
+id       int32 when integers without nulls in range, else categorical; tables sharing an id column share its
+         dictionary (categories), so joins on it compare integer codes
+date     datetime64
+measure  float32
+count    int32, float32 when nulls
+flag     int8 (0 / 1, unlike bool usable in arithmetic), float32 when nulls
+
+Disabled by default, the toggle also makes feature builders (EntityHistory, FeatureTransformer) produce float32
+columns instead of float64. Typical use:
+
+from utils import schema
+schema.enable()
+dataset = DataSet()            # logs the footprint of each table before > after
+schema.memory_report({'features': features}, 'add_all_features')
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+
+LOGICAL_TYPES = ['id', 'date', 'measure', 'count', 'flag']
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+_state = {
+    'enabled': False,
+}
+
+
+def enable():
+    _state['enabled'] = True
+
+
+def disable():
+    _state['enabled'] = False
+
+
+def enabled():
+    return _state['enabled']
+
+
+def float_dtype():
+    """Dtype of float features built from compact tables.
+    """
+    return np.float32 if _state['enabled'] else np.float64
+
+
+class Schema:
+    """Logical type of columns by name, a column having the same type in every table it is in.
+    """
+
+    def __init__(self, types):
+        unknown = set(types.values()).difference(LOGICAL_TYPES)
+        if unknown:
+            raise ValueError('Unknown logical types {}, use one of {}'.format(sorted(unknown), LOGICAL_TYPES))
+        self.types = dict(types)
+
+    def enforce(self, tables):
+        """Casts the columns of <tables> ({name: frame}, replaced in place) to their compact dtypes.
+        """
+        dictionaries = self.dictionaries(tables)
+        for name in list(tables):
+            tables[name] = self.cast(tables[name], dictionaries)
+        return tables
+
+    def dictionaries(self, tables):
+        """Categories of each id column stored as categorical, the union of its values in all <tables>.
+        """
+        dictionaries = {}
+        for column, logical in self.types.items():
+            if logical != 'id':
+                continue
+            parts = [df[column] for df in tables.values() if column in df.columns]
+            if not parts or all(_fits_int32(part) for part in parts):
+                continue
+            values = pd.concat([pd.Series(part.dropna().unique()) for part in parts], ignore_index=True)
+            dictionaries[column] = CategoricalDtype(np.sort(values.unique()))
+        return dictionaries
+
+    def cast(self, df, dictionaries=None):
+        """<df> with the columns of the schema cast, without copying columns already compact.
+        """
+        dictionaries = dictionaries or {}
+        data = {}
+        for column in df.columns:
+            values = df[column]
+            logical = self.types.get(column)
+            if logical == 'id':
+                values = values.astype(dictionaries[column] if column in dictionaries else np.int32)
+            elif logical == 'date':
+                values = pd.to_datetime(values)
+            elif logical == 'measure':
+                values = values.astype(np.float32)
+            elif logical == 'count':
+                values = values.astype(np.int32 if _fits_int32(values) else np.float32)
+            elif logical == 'flag':
+                values = values.astype(np.int8 if not values.isnull().any() else np.float32)
+            data[column] = values
+        return pd.DataFrame(data, index=df.index, columns=df.columns)
+
+
+def _fits_int32(values):
+    if values.dtype.kind not in 'biuf' or values.isnull().any():
+        return False
+    if not len(values):
+        return True
+    if values.dtype.kind == 'f' and not (np.floor(values) == values).all():
+        return False
+    return INT32_MIN <= values.min() and values.max() <= INT32_MAX
+
+
+def footprint(df):
+    """Bytes taken by <df>, object values included.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(frames, stage=None, before=None):
+    """Prints the footprint of each of <frames> ({name: frame}), and its change against <before> ({name: bytes}).
+    :return: {name: bytes}
+    """
+    sizes = {name: footprint(df) for name, df in frames.items()}
+    for name in sorted(sizes):
+        change = ''
+        if before is not None and name in before:
+            change = ' ({}MB before, -{}%)'.format(
+                round(before[name] / 2 ** 20, 1), int(round(100 - sizes[name] / max(before[name], 1) * 100))
+            )
+        print('[INFO] Memory{} - {}: {}MB{}'.format(
+            '' if stage is None else ' after ' + stage, name, round(sizes[name] / 2 ** 20, 1), change
+        ))
+    return sizes
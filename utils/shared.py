@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# RAM-backed filesystem when available, so shared arrays never hit the disk
+SHM_DIR = '/dev/shm'
+
+
+class SharedArrays:
+    """Arrays written once to a temporary directory and memory-mapped by worker processes instead of being pickled
+    to each of them. Object arrays (e.g. string ids) can't be memory-mapped, they are pickled in the file instead.
+
+    with SharedArrays() as shared:
+        handle = shared.share('ids', ids)
+        pool.map(worker, [handle, ...])    # worker calls attach(handle)
+
+    """
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='mlshell-', dir=SHM_DIR if os.path.isdir(SHM_DIR) else None)
+
+    def share(self, name, array):
+        array = np.asarray(array)
+        path = os.path.join(self.path, '{}.npy'.format(name))
+        np.save(path, array)
+        return path, array.dtype == object
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach(handle):
+    path, is_object = handle
+    if is_object:
+        return np.load(path, allow_pickle=True)
+    return np.load(path, mmap_mode='r')
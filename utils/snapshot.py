@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+SNAPSHOT_DIR = os.path.dirname(os.path.realpath(__file__)) + '/../data/snapshots'
+
+
+class Snapshot:
+    """On-disk columnar copy of a queried table, one .npy file per column.
+
+    Numeric, boolean and datetime columns are stored as-is, and loaded in memory or, with mmap, memory-mapped
+    read-only. Object columns (strings, dates) can't be memory-mapped, they are stored as int32 codes plus a (pickled)
+    array of categories and rebuilt on load.
+    The high-water mark (max value of <watermark> column) is kept in the metadata to fetch only newer rows later on.
+    Snapshots of rows filtered by a WHERE <condition> are kept apart from unfiltered ones.
+    """
+
+    def __init__(self, table, columns, env, watermark=None, root=SNAPSHOT_DIR, condition=None):
+        self.table = table
+        self.columns = list(columns)
+        self.env = env
+        self.watermark = watermark
+        self.condition = condition
+        self.path = os.path.join(root, '{}-{}'.format(table, self.key(table, columns, env, condition)))
+
+    @staticmethod
+    def key(table, columns, env, condition=None):
+        signature = [table, list(columns), env] + ([condition] if condition is not None else [])
+        return hashlib.sha1(json.dumps(signature).encode('utf-8')).hexdigest()[:16]
+
+    def exists(self):
+        return os.path.isfile(os.path.join(self.path, 'meta.json'))
+
+    def meta(self):
+        with open(os.path.join(self.path, 'meta.json'), 'r') as stream:
+            return json.load(stream)
+
+    def high_water_mark(self):
+        """Last value of the watermark column in the snapshot, None when there is no watermark or no rows.
+        """
+        if not self.exists():
+            return None
+        meta = self.meta()
+        hwm = meta['high_water_mark']
+        if hwm is not None and meta['dtypes'][self.watermark].startswith('datetime64'):
+            return pd.Timestamp(hwm)
+        return hwm
+
+    def load(self, mmap=False):
+        return load_frame(self.path, mmap)
+
+    def save(self, df):
+        save_frame(
+            self.path,
+            df,
+            table=self.table,
+            env=self.env,
+            watermark=self.watermark,
+            condition=self.condition,
+            high_water_mark=self._compute_high_water_mark(df),
+        )
+
+    def append(self, df):
+        if not self.exists():
+            return self.save(df)
+        if df.empty:
+            return
+        self.save(pd.concat([self.load(mmap=True), df[self.meta()['columns']]], ignore_index=True))
+
+    def _compute_high_water_mark(self, df):
+        if self.watermark is None or df.empty:
+            return None
+        hwm = df[self.watermark].max()
+        if hasattr(hwm, 'isoformat'):
+            return hwm.isoformat()
+        return hwm.item() if hasattr(hwm, 'item') else hwm
+
+
+def open_frame(path):
+    """Meta of a frame stored with save_frame, and its columns as (memory-mapped values or codes, categories or None),
+    nothing being read in memory yet.
+    """
+    with open(os.path.join(path, 'meta.json'), 'r') as stream:
+        meta = json.load(stream)
+    columns = {}
+    for i, column in enumerate(meta['columns']):
+        values = np.load(os.path.join(path, '{}.npy'.format(i)), mmap_mode='r')
+        categories = None
+        if column in meta['categorical']:
+            categories = np.load(os.path.join(path, '{}.categories.npy'.format(i)), allow_pickle=True)
+        columns[column] = values, categories
+    return meta, columns
+
+
+def decode(values, categories):
+    """Values of a stored column (or of a slice of it), categorical codes being mapped back to objects.
+    """
+    if categories is None:
+        return values
+    return np.asarray(pd.Categorical.from_codes(values, categories), dtype=object)
+
+
+def load_frame(path, mmap=False):
+    """DataFrame stored with save_frame, read in memory. With <mmap>, numeric columns are memory-mapped instead: pages
+    are only read when accessed, but values are read-only and in-place writes fail.
+    """
+    meta, columns = open_frame(path)
+    data = {}
+    for column in meta['columns']:
+        values, categories = columns[column]
+        data[column] = decode(values if mmap or categories is not None else np.array(values), categories)
+    return pd.DataFrame(data, columns=meta['columns'], copy=False)
+
+
+def save_frame(path, df, **meta):
+    """Writes <df> in directory <path>, one .npy file per column, along with a meta.json including <meta>.
+    Files are written in a temporary directory swapped in place at the end, a crashed write never leaves a
+    half-written directory behind.
+    """
+    tmp_path = '{}.{}.tmp'.format(path, uuid.uuid4().hex[:8])
+    os.makedirs(tmp_path)
+    categorical = []
+    n_bytes = 0
+    for i, column in enumerate(df.columns):
+        values = df[column].values
+        if values.dtype.kind not in 'biufmM':
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+            np.save(os.path.join(tmp_path, '{}.categories.npy'.format(i)), uniques.astype(object))
+            categorical.append(column)
+            values = codes.astype(np.int32)
+        np.save(os.path.join(tmp_path, '{}.npy'.format(i)), values)
+        n_bytes += values.nbytes
+    meta.update({
+        'columns': list(df.columns),
+        'dtypes': {c: str(df[c].dtype) for c in df.columns},
+        'categorical': categorical,
+        'n_rows': len(df),
+        'n_bytes': n_bytes,
+    })
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as stream:
+        json.dump(meta, stream)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)